@@ -5,10 +5,11 @@ import shutil
 import subprocess
 import sys
 import tempfile
-import time
 from typing import Any, List, Optional, Tuple
 
+from tools import backoff
 from . import client_output
+from .estimate_cache import EstimateCache
 
 
 def format_command(cmd: List[str]) -> str:
@@ -108,6 +109,11 @@ class Client:
         self._client = client
         self._admin_client = admin_client
         self.rpc_port = rpc_port
+        self.endpoint = endpoint
+        self.mode = 'client' if mode is None else mode
+        # if set, limits of manager operations are memoized, see
+        # `EstimateCache`
+        self.estimate_cache = None  # type: Optional[EstimateCache]
 
     def run_generic(self,
                     params: List[str],
@@ -339,8 +345,9 @@ class Client:
                str(amount), 'from', sender, 'running', contract]
         if args is None:
             args = []
-        cmd += args
-        return client_output.OriginationResult(self.run(cmd))
+        code = contract if os.path.isfile(contract) else None
+        res = self._run_manager_operation(cmd, args, code=code)
+        return client_output.OriginationResult(res)
 
     def hash(self, data: str, typ: str) -> client_output.HashResult:
         cmd = ['hash', 'data', data, 'of', 'type', typ]
@@ -380,8 +387,7 @@ class Client:
 
         if args is None:
             args = []
-        cmd += args
-        res = self.run(cmd)
+        res = self._run_manager_operation(cmd, args, destination=receiver)
         return client_output.TransferResult(res)
 
     def call(self,
@@ -391,10 +397,19 @@ class Client:
         cmd = ['call', destination, 'from', source]
         if args is None:
             args = []
-        cmd += args
-        res = self.run(cmd)
+        res = self._run_manager_operation(cmd, args, destination=destination)
         return client_output.TransferResult(res)
 
+    def _run_manager_operation(self,
+                               cmd: List[str],
+                               args: List[str],
+                               destination: str = None,
+                               code: str = None) -> str:
+        """Run `cmd + args`, with cached limits if `estimate_cache` is set"""
+        if self.estimate_cache is None:
+            return self.run(cmd + args)
+        return self.estimate_cache.run(self, cmd, args, destination, code)
+
     def set_delegate(self,
                      account1: str,
                      account2: str,
@@ -808,10 +823,10 @@ class Client:
         return self.run(cmd)
 
     def msig_run_transaction(self, msig_name: str,
-                             transaction: bytes,
+                             transaction: str,
                              src: str,
                              signatures: List[str]) -> str:
-        cmd = ['run', 'transaction', str(transaction), 'on',
+        cmd = ['run', 'transaction', transaction, 'on',
                'multisig', 'contract', msig_name,
                'on', 'behalf', 'of', src, 'with',
                'signatures'] + signatures
@@ -821,24 +836,25 @@ class Client:
                              timeout: float = 1,
                              attempts: int = 20) -> bool:
         """ Checks whether the node is responsive, by polling it
-        using the `version` rpc.
+        using the `version` rpc, with an exponential backoff.
 
         Args:
-            timeout (float): time (sec) to wait between retries
-            attempts (int): maximal number of attempts
+            timeout (float): max time (sec) to wait between retries
+            attempts (int): the node is polled for at most
+                            `timeout * attempts` seconds
         Returns:
             True iff the node is running, and successfully answered the
             `version` rpc.
         """
-        for _ in range(attempts):
+        def probe() -> bool:
             try:
-                time.sleep(timeout)
                 # any shell RPC will do, this one is light-weight
                 self.rpc('get', '/network/version')
                 return True
             except Exception:  # pylint: disable=broad-except
-                pass
-        return False
+                return False
+        return backoff.wait_until(probe, lambda: True, timeout * attempts,
+                                  max_delay=timeout)
 
     def expand_macros(self, src: str) -> str:
         cmd = ['expand', 'macros', 'in', src]
@@ -1015,13 +1031,13 @@ class Client:
                        dest: str,
                        contract: str,
                        args: List[str] = None
-                       ) -> None:
+                       ) -> client_output.TransferResult:
         cmd = ['sapling', 'shield',
                str(amount), 'from', src, 'to', dest,
                'using', contract]
         args = args or []
         cmd += args
-        self.run(cmd)
+        return client_output.TransferResult(self.run(cmd))
 
     def sapling_unshield(self,
                          amount: float,
@@ -1055,13 +1071,14 @@ class Client:
                        file: str,
                        fee_payer: str,
                        contract: str,
-                       args: List[str] = None) -> None:
+                       args: List[str] = None
+                       ) -> client_output.TransferResult:
         cmd = ['sapling', 'submit', file,
                'from', fee_payer,
                'using', contract]
         args = args or []
         cmd += args
-        self.run(cmd)
+        return client_output.TransferResult(self.run(cmd))
 
     def sapling_list_keys(self) -> List[str]:
         cmd = ['sapling', 'list', 'keys']
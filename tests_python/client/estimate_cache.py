@@ -0,0 +1,213 @@
+"""Memoization of the limits estimated by the client for manager operations.
+
+Without explicit `--gas-limit`, `--storage-limit` and `--fee`, each
+`transfer`, `call` or `originate` makes the client simulate the operation
+before injecting it. An `EstimateCache` records the limits chosen by the
+client, keyed by
+
+    (destination code hash, entrypoint, parameter shape, storage hash)
+
+and provides them directly (along with a matching `--burn-cap`) to later
+calls with the same key, which are then injected without simulation.
+
+The parameter shape abstracts literals by their kind and size, so calls
+whose gas consumption depends on the actual values (and not only on the
+storage and the shape of the parameter) shouldn't use the cache.
+
+Typical use.
+
+    client.estimate_cache = EstimateCache()
+    client.transfer(1, 'bootstrap1', 'contract', ['--arg', '42'])
+"""
+import hashlib
+import json
+import re
+import subprocess
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+
+from tools import micheline
+
+# Options which make the client skip the cache
+LIMIT_OPTIONS = {'--gas-limit', '-G', '--storage-limit', '-S'}
+
+
+class Estimate(NamedTuple):
+    """Limits chosen by the client after a simulation"""
+    gas_limit: int
+    storage_limit: int
+    fee: str
+    time: float
+
+
+def _hash(data: Any) -> str:
+    encoded = json.dumps(data, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _shape(expr: Any) -> Any:
+    if isinstance(expr, list):
+        return [_shape(item) for item in expr]
+    if 'prim' in expr:
+        return [expr['prim'], expr.get('annots', []),
+                [_shape(arg) for arg in expr.get('args', [])]]
+    (kind, value), = expr.items()
+    return [kind, len(value)]
+
+
+def parameter_shape(parameter: str) -> str:
+    """Hash of `parameter` where literals are replaced by their kind and
+    size"""
+    try:
+        return _hash(_shape(micheline.parse_expression(parameter)))
+    except micheline.MichelineParseError:
+        return _hash(parameter)
+
+
+def _option(args: List[str], names: List[str]) -> Optional[str]:
+    for i, arg in enumerate(args[:-1]):
+        if arg in names:
+            return args[i + 1]
+    return None
+
+
+def extract_estimate(client_output: str) -> Optional[Estimate]:
+    """Limits of the single manager operation in `client_output`.
+
+    Returns None if the output doesn't contain exactly one manager
+    operation (e.g. if a reveal was added by the client)."""
+    gas = re.findall(r"Gas limit: (\d+)", client_output)
+    storage = re.findall(r"Storage limit: (\d+) bytes", client_output)
+    fee = re.findall(r"Fee to the baker: \D*([\d.]+)", client_output)
+    if len(gas) != 1 or len(storage) != 1 or len(fee) != 1:
+        return None
+    return Estimate(int(gas[0]), int(storage[0]), fee[0], time.time())
+
+
+class EstimateCache:
+    """Estimates of manager operation limits, shared by clients.
+
+    Estimates older than `max_age` seconds are discarded. A call using a
+    cached estimate which fails is run again with a simulation.
+    """
+
+    def __init__(self, max_age: float = 60.):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self._estimates = {}  # type: Dict[Tuple, Estimate]
+        self._addresses = {}  # type: Dict[str, str]
+        self._cost_per_byte = None  # type: Optional[int]
+        self._session = requests.Session()
+
+    def _get(self, client, path: str) -> Any:
+        res = self._session.get(f'{client.endpoint}/chains/main/blocks/head/'
+                                f'{path}')
+        res.raise_for_status()
+        return res.json()
+
+    def _address(self, client, destination: str) -> str:
+        if re.match(r'(tz[1-3]|KT1|SG1)\w{33}$', destination):
+            return destination
+        if destination not in self._addresses:
+            self._addresses[destination] = \
+                client.get_contract_address(destination)
+        return self._addresses[destination]
+
+    def key(self,
+            client,
+            destination: str = None,
+            code: str = None,
+            entrypoint: str = None,
+            parameter: str = None) -> Tuple:
+        """Cache key of an operation.
+
+        Args:
+            client (Client): client used to resolve aliases
+            destination (str): destination of a transfer (alias or address)
+            code (str): path to the script of an origination
+            entrypoint (str): entrypoint of a transfer
+            parameter (str): parameter of a transfer, initial storage of an
+                             origination
+        """
+        code_hash = None
+        storage_hash = None
+        if code is not None:
+            with open(code, 'rb') as stream:
+                code_hash = hashlib.sha256(stream.read()).hexdigest()
+        elif destination is not None:
+            address = self._address(client, destination)
+            if address.startswith('KT1'):
+                script = self._get(client,
+                                   f'context/contracts/{address}/script')
+                code_hash = _hash(script['code'])
+                storage_hash = _hash(script['storage'])
+            else:
+                # implicit accounts have no code, but allocating them
+                # costs storage
+                code_hash = address
+        shape = None if parameter is None else parameter_shape(parameter)
+        return (code_hash, entrypoint, shape, storage_hash)
+
+    def _burn_cap(self, client, storage_limit: int) -> str:
+        if self._cost_per_byte is None:
+            constants = self._get(client, 'context/constants')
+            self._cost_per_byte = int(constants['cost_per_byte'])
+        return '%.6f' % (storage_limit * self._cost_per_byte / 1000000)
+
+    def lookup(self, key: Tuple) -> Optional[Estimate]:
+        """Fresh estimate for `key`, if any"""
+        estimate = self._estimates.get(key)
+        if estimate is None or time.time() - estimate.time > self.max_age:
+            return None
+        return estimate
+
+    def run(self,
+            client,
+            cmd: List[str],
+            args: List[str],
+            destination: str = None,
+            code: str = None) -> str:
+        """Run `cmd + args` with `client`, using a cached estimate if any.
+
+        Args:
+            client (Client): client running the command
+            cmd (list): manager operation command, without options
+            args (list): options of the command
+            destination (str): destination of a transfer
+            code (str): path to the script of an origination
+
+        Returns:
+            The client output.
+        """
+        if (client.mode != 'client' or client.endpoint is None or
+                LIMIT_OPTIONS & set(args)):
+            return client.run(cmd + args)
+        parameter = _option(args, ['--arg', '-arg', '--init', '-init'])
+        entrypoint = _option(args, ['--entrypoint'])
+        key = self.key(client, destination, code, entrypoint, parameter)
+        estimate = self.lookup(key)
+        if estimate is not None:
+            limits = ['--gas-limit', str(estimate.gas_limit),
+                      '--storage-limit', str(estimate.storage_limit)]
+            if _option(args, ['--fee', '-f']) is None:
+                limits += ['--fee', estimate.fee]
+            if _option(args, ['--burn-cap']) is None:
+                limits += ['--burn-cap',
+                           self._burn_cap(client, estimate.storage_limit)]
+            try:
+                res = client.run(cmd + args + limits)
+                self.hits += 1
+                return res
+            except subprocess.CalledProcessError:
+                self.fallbacks += 1
+                del self._estimates[key]
+        self.misses += 1
+        res = client.run(cmd + args)
+        estimate = extract_estimate(res)
+        if estimate is not None:
+            self._estimates[key] = estimate
+        return res
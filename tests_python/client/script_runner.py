@@ -0,0 +1,274 @@
+"""Run many Michelson scripts concurrently through the node RPCs.
+
+`Client.run_script` forks one `tezos-client` process per call, which parses
+and typechecks the script again each time. `ScriptRunner` instead parses each
+script once, and posts cases to `helpers/scripts/run_code` (or `trace_code`)
+over a pool of HTTP connections, with many requests in flight.
+
+Results are `RunScriptResult` instances, built from the same text as the
+client output. Scripts or data using macros (or that the parser of
+`tools.micheline` doesn't accept) can't be sent to the node as is, these
+cases are run with `Client.run_script` instead, as are cases emitting
+internal operations, whose printing isn't reproduced.
+
+Typical use.
+
+    runner = ScriptRunner(client)
+    cases = [ScriptCase(contract, storage, inp) for ...]
+    for result in runner.run_many(cases):
+        print(result.storage)
+    runner.close()
+"""
+import json
+import os
+import subprocess
+from concurrent import futures
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import requests
+
+from tools import micheline
+from .client import Client
+from .client_output import RunScriptResult
+
+# Same defaults as `tezos-client run script`
+DEFAULT_AMOUNT = 0.05
+DEFAULT_BALANCE = 4000000
+
+
+class ScriptCase(NamedTuple):
+    """Arguments of a single `run script` call, see `Client.run_script`"""
+    contract: str
+    storage: str
+    inp: str
+    amount: Optional[float] = None
+    balance: Optional[float] = None
+    trace_stack: bool = False
+    file: bool = True
+
+
+class RunCodeError(subprocess.CalledProcessError):
+    """Raised when the node refused to run a script.
+
+    Like the `CalledProcessError` raised by `Client.run_script`, with the
+    HTTP status as `returncode` and the answer of the node as `output`.
+    `errors` is the error trace returned by the node (e.g. `script_rejected`
+    for a script reaching FAILWITH), or the raw answer if it isn't JSON."""
+
+    def __init__(self, case: ScriptCase, url: str, status: int, text: str):
+        super().__init__(status, ['POST', url], output=text)
+        self.case = case
+        try:
+            self.errors = json.loads(text)  # type: Any
+        except ValueError:
+            self.errors = text
+
+    def __str__(self) -> str:
+        return f'{self.case.contract} failed: {self.output}'
+
+
+def _mutez(tez: float) -> str:
+    return str(int(round(tez * 1000000)))
+
+
+def _pp_map(big_map: str) -> str:
+    if big_map.startswith('-'):
+        return f'temp({big_map[1:]})'
+    return f'map({big_map})'
+
+
+def _big_map_diff_lines(diff: List[dict]) -> List[str]:
+    lines = []
+    for item in diff:
+        action = item['action']
+        if action == 'update':
+            key = micheline.print_expr(item['key'])
+            big_map = _pp_map(item['big_map'])
+            if 'value' in item:
+                value = micheline.print_expr(item['value'])
+                lines.append(f'Set {big_map}[{key}] to {value}')
+            else:
+                lines.append(f'Unset {big_map}[{key}]')
+        elif action == 'remove':
+            lines.append(f'Clear {_pp_map(item["big_map"])}')
+        elif action == 'copy':
+            lines.append(f'Copy {_pp_map(item["source_big_map"])} to '
+                         f'{_pp_map(item["destination_big_map"])}')
+        else:
+            key_type = micheline.print_expr(item['key_type'])
+            value_type = micheline.print_expr(item['value_type'])
+            lines.append(f'New {_pp_map(item["big_map"])} of type '
+                         f'(big_map {key_type} {value_type})')
+    return lines
+
+
+def _trace_lines(trace: List[dict]) -> List[str]:
+    lines = []
+    for entry in trace:
+        gas = entry['gas']
+        if gas != 'unaccounted':
+            gas = f'{gas} units remaining'
+        lines.append(f'- location: {entry["location"]} '
+                     f'(remaining gas: {gas})')
+        items = [micheline.print_expr(item['item'], 6) +
+                 '  \t' + item.get('annot', '')
+                 for item in entry['stack']]
+        lines.append('  [ ' + '\n      '.join(items) + ' ]')
+    return lines
+
+
+def format_run_result(answer: dict) -> str:
+    """Output of `tezos-client run script` for a `run_code` RPC answer
+    without internal operations"""
+    def block(title: str, lines: List[str]) -> str:
+        return '\n  '.join([title] + (lines or ['']))
+
+    assert not answer['operations'], 'internal operations are not printed'
+    storage = micheline.print_expr(answer['storage'], 2)
+    diff = _big_map_diff_lines(answer.get('big_map_diff', []))
+    blocks = [block('storage', [storage]),
+              block('emitted operations', []),
+              block('big_map diff', diff)]
+    if 'trace' in answer:
+        blocks.append(block('trace', _trace_lines(answer['trace'])))
+    return '\n'.join(blocks) + '\n'
+
+
+class ScriptRunner:
+    """Run scripts through the RPCs of the node `client` is connected to.
+
+    Scripts are read and parsed once per runner, and cases are executed by
+    a pool of `max_workers` threads sharing keep-alive HTTP connections.
+    """
+
+    def __init__(self,
+                 client: Client,
+                 max_workers: int = 16,
+                 chain: str = 'main',
+                 block: str = 'head'):
+        """
+        Args:
+            client (Client): client connected to a node, also used to run
+                             cases with macros
+            max_workers (int): max number of requests in flight
+            chain (str): chain used to run the scripts
+            block (str): block used to run the scripts
+        """
+        assert client.mode == 'client' and client.endpoint is not None, \
+            'ScriptRunner requires a client connected to a node'
+        self._client = client
+        self._url = (f'{client.endpoint}/chains/{chain}/blocks/{block}/'
+                     'helpers/scripts')
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=max_workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        chain_id_url = f'{client.endpoint}/chains/{chain}/chain_id'
+        self._chain_id = self._session.get(chain_id_url).json()
+        # contract -> parsed script, None if the script uses macros
+        self._scripts = {}  # type: Dict[str, Optional[Any]]
+
+    def _load(self, contract: str, file: bool) -> Optional[Any]:
+        if contract not in self._scripts:
+            source = contract
+            if file:
+                assert os.path.isfile(contract), f'{contract} is not a file'
+                with open(contract) as stream:
+                    source = stream.read()
+            try:
+                script = micheline.parse_toplevel(source)
+            except micheline.MichelineParseError:
+                # left to the parser of the client
+                script = None
+            if script is None or micheline.contains_macros(script):
+                self._scripts[contract] = None
+            else:
+                self._scripts[contract] = script
+        return self._scripts[contract]
+
+    def _run(self, case: ScriptCase) -> RunScriptResult:
+        script = self._scripts[case.contract]
+        if script is None:
+            return self._client.run_script(*case)
+        try:
+            storage = micheline.parse_expression(case.storage)
+            inp = micheline.parse_expression(case.inp)
+        except micheline.MichelineParseError:
+            return self._client.run_script(*case)
+        if micheline.contains_macros([storage, inp]):
+            return self._client.run_script(*case)
+        amount = DEFAULT_AMOUNT if case.amount is None else case.amount
+        balance = DEFAULT_BALANCE if case.balance is None else case.balance
+        data = {'script': script,
+                'storage': storage,
+                'input': inp,
+                'amount': _mutez(amount),
+                'balance': _mutez(balance),
+                'chain_id': self._chain_id}
+        service = 'trace_code' if case.trace_stack else 'run_code'
+        url = f'{self._url}/{service}'
+        res = self._session.post(url, json=data)
+        if res.status_code != 200:
+            raise RunCodeError(case, url, res.status_code, res.text)
+        answer = res.json()
+        if answer['operations']:
+            return self._client.run_script(*case)
+        return RunScriptResult(format_run_result(answer))
+
+    def run_many(self,
+                 cases: List[ScriptCase],
+                 return_exceptions: bool = False) -> List[Any]:
+        """Run all cases concurrently and return results in the same order.
+
+        Cases are grouped by contract, so that each script is read and
+        parsed once before its cases are submitted.
+
+        Args:
+            cases (list): cases to run
+            return_exceptions (bool): if True, the exception raised by a
+                failing case is returned in place of its result, otherwise
+                the first failure is raised
+        """
+        by_contract = {}  # type: Dict[str, List[int]]
+        for i, case in enumerate(cases):
+            by_contract.setdefault(case.contract, []).append(i)
+        pending = {}  # type: Dict[int, futures.Future]
+        for contract, indices in by_contract.items():
+            self._load(contract, cases[indices[0]].file)
+            for i in indices:
+                pending[i] = self._executor.submit(self._run, cases[i])
+        results = []  # type: List[Any]
+        for i in range(len(cases)):
+            try:
+                results.append(pending[i].result())
+            except Exception as exc:  # pylint: disable=broad-except
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
+
+    def run_script(self,
+                   contract: str,
+                   storage: str,
+                   inp: str,
+                   amount: float = None,
+                   balance: float = None,
+                   trace_stack: bool = False,
+                   file: bool = True) -> RunScriptResult:
+        """Same as `Client.run_script`, through the RPCs"""
+        case = ScriptCase(contract, storage, inp, amount, balance,
+                          trace_stack, file)
+        return self.run_many([case])[0]
+
+    def close(self) -> None:
+        """Wait for pending cases and release HTTP connections"""
+        self._executor.shutdown()
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
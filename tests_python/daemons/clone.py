@@ -0,0 +1,119 @@
+"""Copy-on-write cloning of node data directories.
+
+Importing the same snapshot in many nodes is slow. Instead, a node
+directory can be prepared once (e.g. by importing a snapshot in it, or by
+stopping a node), and cloned for each new node.
+
+Files are cloned with reflinks (`cp --reflink`) where the filesystem
+supports it (btrfs, xfs, APFS...), which is instantaneous and copy-on-write.
+Otherwise, files are hardlinked, except files written in place by the node,
+which are copied ("copied up"). As the node writes in place all the files
+of its store and context, the default patterns match every file below
+`store/` and `context/` (`fnmatch`'s `*` matches `/`): this fallback is
+then a plain copy of the chain data. Narrower `copy_up` patterns can be
+given for sources whose stores are known not to be modified.
+
+Files specific to a node (identity, configuration, peers, lock, version)
+are not cloned, they are generated by `Node.init_id` and
+`Node.init_config`. More generally, files already in the destination are
+kept.
+"""
+import fnmatch
+import os
+import shutil
+import subprocess
+import sys
+from typing import List
+
+# Files of the source dir which aren't cloned
+EXCLUDED = ['identity.json', 'config.json', 'peers.json', 'lock',
+            'tezos.crt', 'tezos.key', 'version.json']
+
+# Files copied rather than hardlinked, since the node writes them in place,
+# at any depth
+COPY_UP = ['store/*', 'context/*']
+
+REFLINK = 'reflink'
+HARDLINK = 'hardlink'
+
+
+def _reflink(source: str, dest: str) -> bool:
+    if sys.platform == 'darwin':
+        cmd = ['cp', '-c', '-R', source, dest]
+    else:
+        cmd = ['cp', '-R', '--reflink=always', source, dest]
+    completed = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, check=False)
+    return completed.returncode == 0
+
+
+def _copy_up(rel_path: str, copy_up: List[str]) -> bool:
+    return any(fnmatch.fnmatch(rel_path, pattern) for pattern in copy_up)
+
+
+def _hardlink(source: str,
+              dest: str,
+              entries: List[str],
+              copy_up: List[str]) -> None:
+    files = []  # type: List[str]
+    for name in entries:
+        if not os.path.isdir(os.path.join(source, name)):
+            files.append(name)
+            continue
+        for root, _, names in os.walk(os.path.join(source, name)):
+            rel_root = os.path.relpath(root, source)
+            os.makedirs(os.path.join(dest, rel_root), exist_ok=True)
+            files += [os.path.join(rel_root, file) for file in names]
+    for rel_path in files:
+        src_file = os.path.join(source, rel_path)
+        dest_file = os.path.join(dest, rel_path)
+        if os.path.lexists(dest_file):
+            continue
+        if _copy_up(rel_path, copy_up):
+            shutil.copy2(src_file, dest_file)
+        else:
+            os.link(src_file, dest_file)
+
+
+def clone_dir(source: str,
+              dest: str,
+              copy_up: List[str] = None,
+              reflink: bool = True) -> str:
+    """Clone the content of node directory `source` into `dest`.
+
+    Args:
+        source (str): prepared node directory, must not be used by a
+                      running node
+        dest (str): existing directory, whose files are kept
+        copy_up (list): glob patterns (relative to `source`) of the files
+                        copied when hardlinking, defaults to `COPY_UP`
+        reflink (bool): try reflinks first
+
+    Returns:
+        The method used, `REFLINK` or `HARDLINK`.
+    """
+    assert os.path.isdir(source), f'{source} not a dir'
+    assert os.path.isdir(dest), f'{dest} not a dir'
+    if copy_up is None:
+        copy_up = COPY_UP
+    entries = [name for name in os.listdir(source)
+               if name not in EXCLUDED and
+               not os.path.lexists(os.path.join(dest, name))]
+    if reflink:
+        cloned = []  # type: List[str]
+        for name in entries:
+            if not _reflink(os.path.join(source, name),
+                            os.path.join(dest, name)):
+                break
+            cloned.append(name)
+        else:
+            return REFLINK
+        # not supported by the filesystem, undo partial clones
+        for name in cloned + [name]:
+            path = os.path.join(dest, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+    _hardlink(source, dest, entries, copy_up)
+    return HARDLINK
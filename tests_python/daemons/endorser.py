@@ -1,12 +1,20 @@
-from typing import List
+from typing import Any, List, Optional
 import os
 import subprocess
-from . import utils
+import time
+from . import readiness, utils
+from .log_store import Writer
 
 
 # Timeout before killing an endorser which doesn't react to SIGTERM
 TERM_TIMEOUT = 10
 
+# Printed by the endorser once connected to the node
+READY_LINE = 'Endorser started.'
+
+# Default time (in seconds) given to the endorser to become ready
+READY_TIMEOUT = 10.
+
 
 class Endorser(subprocess.Popen):
     """Fork an endorser linked to a client"""
@@ -16,7 +24,9 @@ class Endorser(subprocess.Popen):
                  rpc_port: int,
                  base_dir: str,
                  params: List[str] = None,
-                 log_file: str = None):
+                 log_file: str = None,
+                 log_writer: Writer = None,
+                 overwrite_log: bool = True):
         """Create a new Popen instance for the endorser process.
 
         Args:
@@ -25,6 +35,11 @@ class Endorser(subprocess.Popen):
             base_dir (str): client directory
             params (list): additional parameters to be added to the command
             log_file (str): log file name (optional)
+            log_writer (Writer): if set, the output of the endorser is
+                                 appended to a log store instead of
+                                 `log_file`
+            overwrite_log (bool): False to append to `log_file`, e.g.
+                                  when the endorser is restarted
 
         Returns:
             A Popen instance
@@ -39,9 +54,48 @@ class Endorser(subprocess.Popen):
         cmd.extend(params)
         cmd_string = utils.format_command(cmd)
         print(cmd_string)
-        stdout, stderr = utils.prepare_log(cmd, log_file)
-        subprocess.Popen.__init__(self, cmd, stdout=stdout,
-                                  stderr=stderr)  # type: ignore
+        log = None  # type: Any
+        if log_writer is not None:
+            log = log_writer
+            log.write(utils.format_command(cmd, color=False) + '\n')
+        elif log_file:
+            log, _ = utils.prepare_log(cmd, log_file, overwrite_log)
+        self.started_at = time.time()
+        # whether the endorser was terminated or killed on purpose
+        self.stopped = False
+        subprocess.Popen.__init__(self, cmd, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT)  # type: ignore
+        assert self.stdout is not None
+        # copies the output to the log file, and watches READY_LINE
+        self._watcher = readiness.LineWatcher(
+            self.stdout, log, [READY_LINE])
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> Optional[float]:
+        """Wait until the endorser prints READY_LINE.
+
+        Returns:
+            The time (sec) between the start of the endorser and readiness,
+            None on timeout. Fails if the endorser exited before.
+        """
+        ready = self._watcher.wait(lambda: self.poll() is None, timeout)
+        assert ready or self.poll() is None, \
+            'seems endorser failed at startup'
+        return self.ready_latency
+
+    @property
+    def ready_latency(self) -> Optional[float]:
+        """Time (sec) between the start of the endorser and readiness, None
+        if not ready yet"""
+        matched_at = self._watcher.matched_at
+        return None if matched_at is None else matched_at - self.started_at
+
+    def terminate(self):
+        self.stopped = True
+        super().terminate()
+
+    def kill(self):
+        self.stopped = True
+        super().kill()
 
     def terminate_or_kill(self):
         self.terminate()
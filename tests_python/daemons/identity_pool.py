@@ -0,0 +1,174 @@
+"""A persistent pool of pre-generated node identities.
+
+`tezos-node identity generate` solves a proof-of-work puzzle, which is
+repeated for every node of every test. An `IdentityPool` stores generated
+`identity.json` files in a directory, by node binary (its path, size and
+modification time, so that identities generated by a branch or a previous
+build aren't used by another one) and expected proof-of-work, so that they
+survive test sessions:
+
+    POOL_DIR/<binary key>/<expected_pow>/<uuid>.json
+
+`take` moves an identity out of the pool, so that an identity is never used
+by two nodes (even by concurrent test sessions sharing the pool).
+`refill` generates identities in background threads until the pool holds
+`size` identities for a given proof-of-work. `stop` kills the generators
+still running, at the end of the session.
+
+Typical use.
+
+    pool = IdentityPool()
+    node = Node(node_bin, identity_pool=pool)
+    node.init_id()  # uses a pooled identity if any, refills the pool
+    ...
+    pool.stop()
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Set
+
+# Default location of the pool, shared by test sessions
+POOL_DIR = os.environ.get(
+    'TEZOS_IDENTITY_POOL',
+    os.path.join(tempfile.gettempdir(), 'tezos-identity-pool'))
+
+# Generation dirs older than this (in seconds) were left by a killed
+# session
+_STALE_AGE = 3600
+
+
+def binary_key(node_bin: str) -> str:
+    """Key of a version of a node binary"""
+    path = os.path.realpath(node_bin)
+    stat = os.stat(path)
+    version = f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+    return hashlib.sha256(version.encode()).hexdigest()[:16]
+
+
+class IdentityPool:
+    """Pre-generated identities, by expected proof-of-work."""
+
+    def __init__(self,
+                 pool_dir: str = POOL_DIR,
+                 size: int = 8,
+                 max_generators: int = 2):
+        """
+        Args:
+            pool_dir (str): directory of the pool, created if needed
+            size (int): number of identities kept for each proof-of-work
+            max_generators (int): max number of identities generated
+                                  concurrently in background
+        """
+        os.makedirs(pool_dir, exist_ok=True)
+        self.pool_dir = pool_dir
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._generators = threading.Semaphore(max_generators)
+        self._lock = threading.Lock()
+        # identities being generated, by proof-of-work
+        self._pending = {}  # type: Dict[str, int]
+        # running generators
+        self._processes = set()  # type: Set[subprocess.Popen]
+        self._stopped = threading.Event()
+        for name in os.listdir(pool_dir):
+            path = os.path.join(pool_dir, name)
+            if (name.startswith('generating.') and
+                    time.time() - os.path.getmtime(path) > _STALE_AGE):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _dir(self, node_bin: str, expected_pow: float) -> str:
+        path = os.path.join(self.pool_dir, binary_key(node_bin),
+                            str(float(expected_pow)))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def available(self, node_bin: str, expected_pow: float) -> int:
+        """Number of identities in the pool for `node_bin` and
+        `expected_pow`"""
+        return sum(name.endswith('.json')
+                   for name in os.listdir(self._dir(node_bin, expected_pow)))
+
+    def take(self, node_bin: str, expected_pow: float, dest: str) -> bool:
+        """Move an identity generated by `node_bin` for `expected_pow` to
+        file `dest`.
+
+        Returns False if the pool has no such identity."""
+        pow_dir = self._dir(node_bin, expected_pow)
+        for name in os.listdir(pow_dir):
+            if not name.endswith('.json'):
+                continue
+            claimed = os.path.join(pow_dir, f'{name}.{uuid.uuid4().hex}')
+            try:
+                # atomic, only one process can claim a given identity
+                os.rename(os.path.join(pow_dir, name), claimed)
+            except FileNotFoundError:
+                continue
+            shutil.move(claimed, dest)
+            with self._lock:
+                self.hits += 1
+            return True
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def _generate(self, node_bin: str, expected_pow: float) -> None:
+        key = f'{binary_key(node_bin)}/{float(expected_pow)}'
+        try:
+            with self._generators:
+                tmp_dir = tempfile.mkdtemp(prefix='generating.',
+                                           dir=self.pool_dir)
+                try:
+                    with self._lock:
+                        # `stop` kills the processes started before it
+                        if self._stopped.is_set():
+                            return
+                        process = subprocess.Popen(
+                            [node_bin, 'identity', 'generate',
+                             str(expected_pow), '--data-dir', tmp_dir],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+                        self._processes.add(process)
+                    returncode = process.wait()
+                    with self._lock:
+                        self._processes.discard(process)
+                    if returncode == 0:
+                        os.rename(os.path.join(tmp_dir, 'identity.json'),
+                                  os.path.join(
+                                      self._dir(node_bin, expected_pow),
+                                      f'{uuid.uuid4().hex}.json'))
+                finally:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+        finally:
+            with self._lock:
+                self._pending[key] -= 1
+
+    def refill(self, node_bin: str, expected_pow: float) -> None:
+        """Generate identities with `node_bin` for `expected_pow` in
+        background threads, until the pool holds `size` of them"""
+        key = f'{binary_key(node_bin)}/{float(expected_pow)}'
+        if self._stopped.is_set():
+            return
+        with self._lock:
+            missing = (self.size - self.available(node_bin, expected_pow) -
+                       self._pending.get(key, 0))
+            self._pending[key] = self._pending.get(key, 0) + max(missing, 0)
+        for _ in range(missing):
+            # daemon threads don't delay the end of the test session
+            threading.Thread(target=self._generate,
+                             args=(node_bin, expected_pow),
+                             daemon=True).start()
+
+    def stop(self) -> None:
+        """Kill running generators, and don't start new ones"""
+        self._stopped.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            process.kill()
@@ -0,0 +1,413 @@
+"""One indexed, compressed store for the output of many daemons.
+
+With a `LogStore`, the output of each node and daemon is read from a pipe
+and appended, line by line and timestamped, to a single store instead of
+one file per process. Each line is tagged with its source (e.g.
+`'node 0'`, `'baker alpha 1'`).
+
+Lines are written to segment files. When a segment exceeds `segment_size`
+bytes, a new segment is started, and the closed one is compressed (gzip,
+or zstd if the `zstandard` module is available) by a background thread,
+so that writers (the threads reading the outputs of processes) aren't
+blocked. A closed segment stays queryable while it is compressed. The
+oldest segments are dropped beyond `max_segments`, for long runs.
+
+The index (`index.json`) gives, for each segment, its time range and the
+number of lines of each source. Queries by source and time range only
+read the matching segments. The store can be reopened after a run, e.g. to
+analyze the logs of a failed test. If the store wasn't closed (e.g. the
+test process was killed), segments missing from the index are indexed
+again when it is reopened.
+
+Typical use.
+
+    store = LogStore(f'{log_dir}/store', compression='zstd')
+    with Sandbox(..., log_store=store) as sandbox:
+        ...
+        for record in store.query('baker alpha 0', pattern='Injected'):
+            print(record.time, record.line)
+    store.close()
+"""
+import contextlib
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size (bytes) above which a segment is compressed and a new one started
+SEGMENT_SIZE = 16 * 1024 * 1024
+
+INDEX = 'index.json'
+
+_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# segment-<number>.log, possibly compressed
+_SEGMENT_FILE = re.compile(r'segment-(\d+)\.log(\.gz|\.zst)?$')
+
+
+class Record(NamedTuple):
+    """A line of a source"""
+    time: float
+    source: str
+    line: str
+
+
+def _open_segment(path: str) -> IO[str]:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', errors='replace')
+    if path.endswith('.zst'):
+        assert zstandard is not None, 'zstandard module required'
+        return zstandard.open(path, 'rt', errors='replace')
+    return open(path, 'r', errors='replace')
+
+
+def _compress(path: str, compression: str) -> str:
+    """Compress segment `path`, which is kept. Returns the compressed
+    file."""
+    dest = path + _EXTENSIONS[compression]
+    with open(path, 'rb') as raw:
+        if compression == 'gzip':
+            with gzip.open(dest, 'wb') as file:
+                file.write(raw.read())
+        else:
+            compressor = zstandard.ZstdCompressor()
+            with open(dest, 'wb') as file:
+                compressor.copy_stream(raw, file)
+    return dest
+
+
+def _scan(path: str, number: int) -> Dict[str, Any]:
+    """Index entry of segment file `path`, see `LogStore`"""
+    segment = {'number': number, 'file': path, 'first': None,
+               'last': None, 'lines': {}}  # type: Dict[str, Any]
+    with _open_segment(path) as file:
+        for raw in file:
+            timestamp, sep, rest = raw.partition('\t')
+            if not sep or not rest.endswith('\n'):
+                # interrupted write
+                continue
+            moment = float(timestamp)
+            if segment['first'] is None:
+                segment['first'] = segment['last'] = moment
+            segment['first'] = min(segment['first'], moment)
+            segment['last'] = max(segment['last'], moment)
+            key = rest.partition('\t')[0]
+            segment['lines'][key] = segment['lines'].get(key, 0) + 1
+    return segment
+
+
+class Writer:
+    """File-like object appending the lines written to it to a source of
+    a store. It can be passed as a log to `readiness.LineWatcher`."""
+
+    def __init__(self, store: 'LogStore', source: str):
+        self.store = store
+        self.source = source
+        self._partial = ''
+
+    def write(self, text: str) -> None:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        timestamp = time.time()
+        for line in lines:
+            self.store.append(self.source, line, timestamp)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """Write the last unterminated line. The writer can still be used,
+        e.g. when its process is restarted."""
+        if self._partial:
+            self.store.append(self.source, self._partial)
+            self._partial = ''
+
+
+class LogStore:
+    """Timestamped lines of many sources, see module documentation."""
+
+    def __init__(self,
+                 directory: str,
+                 segment_size: int = SEGMENT_SIZE,
+                 compression: Optional[str] = 'gzip',
+                 max_segments: int = None):
+        """
+        Args:
+            directory (str): store directory, created if needed. If it
+                             holds a store, lines are appended to it.
+            segment_size (int): size (bytes) of uncompressed segments
+            compression (str): 'gzip', 'zstd' or None
+            max_segments (int): if set, the oldest segments are removed
+                                beyond this number
+        """
+        assert compression in _EXTENSIONS, f'unknown {compression}'
+        assert compression != 'zstd' or zstandard is not None, \
+            'zstandard module required'
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compression = compression
+        self.max_segments = max_segments
+        self._sources = []  # type: List[str]
+        self._source_ids = {}  # type: Dict[str, int]
+        # closed segments: file, first and last time, lines by source id
+        self._segments = []  # type: List[Dict[str, Any]]
+        index = os.path.join(directory, INDEX)
+        if os.path.isfile(index):
+            with open(index) as file:
+                saved = json.load(file)
+            self._sources = saved['sources']
+            self._segments = saved['segments']
+            self._source_ids = {source: source_id for source_id, source
+                                in enumerate(self._sources)}
+        self._number = 0
+        self._recover()
+        self._lock = threading.Lock()
+        self._file = None  # type: Optional[IO[str]]
+        # size (chars) of the current segment
+        self._size = 0
+        self._current = {}  # type: Dict[str, Any]
+        self._new_segment()
+        # closed segments to compress, None to stop
+        self._pending = queue.Queue()  # type: queue.Queue
+        self._compressor = None  # type: Optional[threading.Thread]
+        if compression is not None:
+            self._compressor = threading.Thread(
+                target=self._compress_segments, daemon=True)
+            self._compressor.start()
+        for segment in self._segments:
+            if segment['file'].endswith('.log'):
+                self._close_segment(segment)
+
+    def _close_segment(self, segment: Dict[str, Any]) -> None:
+        """Queue closed `segment` for compression"""
+        if self._compressor is not None:
+            self._pending.put(segment)
+
+    def _compress_segments(self) -> None:
+        """Compress queued segments, the compressed file replaces the
+        segment file in the index once complete"""
+        assert self.compression is not None
+        while True:
+            segment = self._pending.get()
+            if segment is None:
+                return
+            path = segment['file']
+            try:
+                dest = _compress(path, self.compression)
+            except FileNotFoundError:
+                # dropped meanwhile
+                continue
+            with self._lock:
+                dropped = not any(segment is kept for kept in self._segments)
+                if not dropped:
+                    segment['file'] = dest
+                    self._save_index()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(dest if dropped else path)
+
+    def _recover(self) -> None:
+        """Index the segment files missing from the index, left by a
+        store which wasn't closed, and remove the other copies of
+        segments (compressed while the store was killed). New segments
+        are numbered after all files."""
+        files = {}  # type: Dict[int, List[str]]
+        for name in sorted(os.listdir(self.directory)):
+            match = _SEGMENT_FILE.match(name)
+            if match is not None:
+                files.setdefault(int(match.group(1)), []).append(name)
+        self._number = max(list(files) +
+                           [segment['number'] for segment in self._segments],
+                           default=0)
+        indexed = {segment['number']: os.path.basename(segment['file'])
+                   for segment in self._segments}
+        for number, names in files.items():
+            # the uncompressed file is complete, if any
+            keep = indexed.get(number, names[0])
+            if keep not in names:
+                continue
+            for name in names:
+                if name != keep:
+                    os.remove(os.path.join(self.directory, name))
+            if number in indexed:
+                continue
+            segment = _scan(os.path.join(self.directory, keep), number)
+            if segment['first'] is None:
+                os.remove(segment['file'])
+            else:
+                self._segments.append(segment)
+        self._segments.sort(key=lambda segment: segment['number'])
+
+    def _new_segment(self) -> None:
+        self._number += 1
+        path = os.path.join(self.directory, f'segment-{self._number:06}.log')
+        self._file = open(path, 'w')
+        self._size = 0
+        self._current = {'number': self._number, 'file': path,
+                         'first': None, 'last': None, 'lines': {}}
+
+    def writer(self, source: str) -> Writer:
+        """File-like object appending to `source`"""
+        return Writer(self, source)
+
+    def append(self, source: str, line: str, timestamp: float = None) -> None:
+        """Append `line` (without newline) to `source`"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            assert self._file is not None, 'store is closed'
+            source_id = self._source_ids.get(source)
+            if source_id is None:
+                source_id = len(self._sources)
+                self._sources.append(source)
+                self._source_ids[source] = source_id
+                # lines of unindexed segments can be recovered
+                self._save_index()
+            record = f'{timestamp:.6f}\t{source_id}\t{line}\n'
+            self._file.write(record)
+            self._size += len(record)
+            current = self._current
+            if current['first'] is None:
+                current['first'] = current['last'] = timestamp
+            current['first'] = min(current['first'], timestamp)
+            current['last'] = max(current['last'], timestamp)
+            key = str(source_id)
+            current['lines'][key] = current['lines'].get(key, 0) + 1
+            if self._size < self.segment_size:
+                return
+            closed = self._current
+            self._file.close()
+            self._new_segment()
+            self._segments.append(closed)
+            self._drop_old_segments()
+            self._save_index()
+        # compression doesn't block writers
+        self._close_segment(closed)
+
+    def _drop_old_segments(self) -> None:
+        if self.max_segments is None:
+            return
+        while len(self._segments) > self.max_segments:
+            # maybe being compressed, see `_compress_segments`
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._segments.pop(0)['file'])
+
+    def _save_index(self) -> None:
+        path = os.path.join(self.directory, INDEX)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'sources': self._sources,
+                       'segments': self._segments}, file)
+        os.replace(path + '.tmp', path)
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return list(self._sources)
+
+    def flush(self) -> None:
+        """Make appended lines visible to readers of the segment files"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def query(self,
+              source: str = None,
+              since: float = 0.,
+              until: float = None,
+              pattern: str = None) -> Iterator[Record]:
+        """Lines appended between `since` and `until`, in order.
+
+        Args:
+            source (str): if set, lines of this source only
+            since (float): min time (sec since epoch)
+            until (float): max time
+            pattern (str): if set, lines matching this regexp only
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            # segment files are replaced once compressed
+            segments = [dict(segment) for segment in self._segments]
+            if self._current['first'] is not None:
+                segments.append(dict(self._current,
+                                     lines=dict(self._current['lines'])))
+            sources = list(self._sources)
+            source_id = self._source_ids.get(source) if source else None
+        if source is not None and source_id is None:
+            return
+        regexp = re.compile(pattern) if pattern is not None else None
+        for segment in segments:
+            if (segment['last'] < since or
+                    (until is not None and segment['first'] > until)):
+                continue
+            if (source_id is not None and
+                    str(source_id) not in segment['lines']):
+                continue
+            yield from self._read(segment, source_id, since, until, regexp,
+                                  sources)
+
+    def _read(self,
+              segment: Dict[str, Any],
+              source_id: Optional[int],
+              since: float,
+              until: Optional[float],
+              regexp: Optional[re.Pattern],
+              sources: List[str]) -> Iterator[Record]:
+        prefix = None if source_id is None else f'{source_id}\t'
+        # the segment may have been compressed or dropped since the query
+        # started
+        paths = [segment['file'],
+                 segment['file'] + _EXTENSIONS[self.compression]]
+        for path in paths:
+            try:
+                segment_file = _open_segment(path)
+                break
+            except FileNotFoundError:
+                pass
+        else:
+            return
+        with segment_file as file:
+            for raw in file:
+                timestamp, sep, rest = raw.partition('\t')
+                if not sep or not rest.endswith('\n'):
+                    # last line of the current segment, being written
+                    continue
+                if prefix is not None and not rest.startswith(prefix):
+                    continue
+                record_source, _, line = rest[:-1].partition('\t')
+                moment = float(timestamp)
+                # concurrent writers may append slightly out of order
+                if moment < since or (until is not None and moment > until):
+                    continue
+                if regexp is not None and not regexp.search(line):
+                    continue
+                yield Record(moment, sources[int(record_source)], line)
+
+    def close(self) -> None:
+        """Compress the current segment (waiting for the compression of
+        all segments), and save the index"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            current = self._current
+            if current['first'] is None:
+                os.remove(current['file'])
+            else:
+                self._segments.append(current)
+                self._drop_old_segments()
+            self._save_index()
+        if current['first'] is not None:
+            self._close_segment(current)
+        if self._compressor is not None:
+            self._pending.put(None)
+            self._compressor.join()
@@ -4,13 +4,20 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
 from typing import Dict, List, Optional, Tuple
 
-from . import utils
+from tools import backoff
+from . import clone, readiness, utils
+from .identity_pool import IdentityPool
+from .log_store import Writer
 
 # Timeout before killing a node which doesn't react to SIGTERM
 TERM_TIMEOUT = 10
 
+# Default time (in seconds) given to the node to answer RPCs
+READY_TIMEOUT = 20.
+
 
 def _run_and_print(cmd):
     cmd_str = utils.format_command(cmd)
@@ -53,6 +60,7 @@ class Node:
     node.init_id() # generate node id
     node.init_config() # generate config file based on parameters
     node.run() # run tezos-node process
+    node.wait_ready() # wait until the node answers RPCs
     node.terminate() # terminate process
     node.run() # re-run using same process
     node.terminate() # or node.kill()
@@ -72,13 +80,20 @@ class Node:
                  peers: List[int] = None,
                  log_levels: Dict[str, str] = None,
                  singleprocess: bool = False,
-                 env: Dict[str, str] = None):
+                 env: Dict[str, str] = None,
+                 identity_pool: IdentityPool = None,
+                 log_writer: Writer = None):
 
         """Creates a new Popen instance for a tezos-node, and manages context.
 
         args:
             use_tls (tuple): None if no tls, else couple of strings
                             (certificate, key)
+            identity_pool (IdentityPool): if set, `init_id` uses identities
+                            generated in advance
+            log_writer (Writer): if set, the output of the node is read
+                            from a pipe and appended to a log store,
+                            instead of `log_file`
 
         Creates a temporary node directory unless provided  by caller.
         Generate node identity.
@@ -95,6 +110,7 @@ class Node:
         # the given config will be applied in :func:`init_config`
         self.config = config
         self.log_file = log_file
+        self.log_writer = log_writer
         self._temp_dir = node_dir is None
         if node_dir is None:
             node_dir = tempfile.mkdtemp(prefix='tezos-node.')
@@ -102,6 +118,7 @@ class Node:
         self.p2p_port = p2p_port
         self.rpc_port = rpc_port
         self.expected_pow = expected_pow
+        self.identity_pool = identity_pool
         self.node = node
         self._params = params
         self._run_called_before = False
@@ -130,19 +147,61 @@ class Node:
         self._new_env = new_env
         self._node_run = node_run
         self._process = None  # type: Optional[subprocess.Popen]
+        self._watcher = None  # type: Optional[readiness.LineWatcher]
+        self.started_at = None  # type: Optional[float]
+        # whether the node was terminated or killed on purpose
+        self.stopped = False
+        # time (sec) between the last run and the first RPC answer
+        self.ready_latency = None  # type: Optional[float]
 
     def run(self):
         node_run_str = utils.format_command(self._node_run)
         print(node_run_str)
-        # overwrite old log on on first invocation only
-        overwrite_log = not self._run_called_before
-        stdout, stderr = utils.prepare_log(self._node_run,
-                                           self.log_file,
-                                           overwrite_log)
-        self._process = subprocess.Popen(self._node_run, stdout=stdout,
-                                         stderr=stderr, env=self._new_env)
+        self.started_at = time.time()
+        self.ready_latency = None
+        self.stopped = False
+        if self.log_writer is not None:
+            self.log_writer.write(
+                utils.format_command(self._node_run, color=False) + '\n')
+            self._process = subprocess.Popen(self._node_run,
+                                             stdout=subprocess.PIPE,
+                                             stderr=subprocess.STDOUT,
+                                             env=self._new_env)
+            assert self._process.stdout is not None
+            self._watcher = readiness.LineWatcher(self._process.stdout,
+                                                  self.log_writer, [])
+        else:
+            # overwrite old log on on first invocation only
+            overwrite_log = not self._run_called_before
+            stdout, stderr = utils.prepare_log(self._node_run,
+                                               self.log_file,
+                                               overwrite_log)
+            self._process = subprocess.Popen(self._node_run, stdout=stdout,
+                                             stderr=stderr, env=self._new_env)
+            if self.log_file:
+                # the node has its own copy
+                stdout.close()
         self._run_called_before = True
 
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        """Wait until the node answers RPCs, and set `ready_latency`.
+
+        Returns:
+            True iff the node answered before `timeout` (sec), False if it
+            exited or didn't answer in time.
+        """
+        assert self._process is not None and self.started_at is not None
+        scheme = 'https' if self.use_tls else 'http'
+        probe = readiness.http_probe(
+            f'{scheme}://127.0.0.1:{self.rpc_port}/network/version')
+        process = self._process
+        if not backoff.wait_until(probe, lambda: process.poll() is None,
+                                  timeout):
+            return False
+        if self.ready_latency is None:
+            self.ready_latency = time.time() - self.started_at
+        return True
+
     def init_config(self):
         node_config = [self.node,
                        'config',
@@ -175,18 +234,39 @@ class Node:
                 file.truncate()
 
     def init_id(self):
-        node_identity = [self.node,
-                         'identity',
-                         'generate',
-                         str(self.expected_pow),
-                         '--data-dir', self.node_dir]
-        _run_and_print(node_identity)
+        identity_file = os.path.join(self.node_dir, 'identity.json')
+        pool = self.identity_pool
+        if (pool is not None and
+                pool.take(self.node, self.expected_pow, identity_file)):
+            print(f'# identity {identity_file} taken from {pool.pool_dir}')
+        else:
+            node_identity = [self.node,
+                             'identity',
+                             'generate',
+                             str(self.expected_pow),
+                             '--data-dir', self.node_dir]
+            _run_and_print(node_identity)
+        if pool is not None:
+            pool.refill(self.node, self.expected_pow)
         if self.use_tls:
             with open(f'{self.node_dir}/tezos.crt', 'w+') as file:
                 file.write(self.use_tls[0])
             with open(f'{self.node_dir}/tezos.key', 'w+') as file:
                 file.write(self.use_tls[1])
 
+    def clone_from(self, source_dir: str) -> str:
+        """Clone the chain data of node directory `source_dir`.
+
+        Identity and configuration aren't cloned, they are generated by
+        `init_id` and `init_config`. See `daemons.clone` for details.
+
+        Returns:
+            The cloning method, `clone.REFLINK` or `clone.HARDLINK`.
+        """
+        method = clone.clone_dir(source_dir, self.node_dir)
+        print(f'# {self.node_dir} cloned from {source_dir} ({method})')
+        return method
+
     def upgrade_storage(self):
         node_upgrade = [self.node, 'upgrade', 'storage', '--data-dir',
                         self.node_dir]
@@ -223,11 +303,13 @@ class Node:
     def terminate(self) -> None:
         """Send SIGTERM to node, do nothing if node hasn't been run yet"""
         if self._process is not None:
+            self.stopped = True
             self._process.terminate()
 
     def kill(self) -> None:
         """Send SIGKILL to node, do nothing if node hasn't been run yet"""
         if self._process is not None:
+            self.stopped = True
             self._process.kill()
 
     def terminate_or_kill(self) -> None:
@@ -238,6 +320,7 @@ class Node:
         """
         if self._process is None:
             return
+        self.stopped = True
         self._process.terminate()
         try:
             self._process.wait(timeout=TERM_TIMEOUT)
@@ -247,3 +330,8 @@ class Node:
     def poll(self):
         assert self._process
         return self._process.poll()
+
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        """The last node process, None if the node hasn't been run yet"""
+        return self._process
@@ -0,0 +1,105 @@
+"""Readiness of nodes and daemons, without fixed sleeps.
+
+A daemon is ready when
+
+- (node) its RPC server answers, checked by `http_probe`,
+- (baker, endorser) it printed its start message (e.g. "Baker started."),
+  signaled by a `LineWatcher` reading its output.
+
+`backoff.wait_until` (in `tools`) checks readiness with an exponential
+backoff, so that startup blocks about as long as needed, and fails as soon
+as the process exits. `LineWatcher.wait` returns as soon as the line is
+printed.
+
+Typical use.
+
+    probe = http_probe('http://127.0.0.1:18730/network/version')
+    start = time.time()
+    if backoff.wait_until(probe, lambda: process.poll() is None, timeout=10):
+        print(f'ready after {time.time() - start}s')
+"""
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import IO, Any, Callable, List, Optional
+
+from tools.backoff import MAX_DELAY
+
+# Timeout of a single probe
+PROBE_TIMEOUT = 1.
+
+
+def http_probe(url: str) -> Callable[[], bool]:
+    """Probe returning True iff a GET on `url` succeeds.
+
+    Certificates aren't checked, sandbox nodes use self-signed ones."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    def probe() -> bool:
+        try:
+            with urllib.request.urlopen(url, timeout=PROBE_TIMEOUT,
+                                        context=context):
+                return True
+        except (OSError, urllib.error.URLError):
+            return False
+    return probe
+
+
+class LineWatcher(threading.Thread):
+    """Copy the output of a process to its log (if any), and record when
+    a line containing one of `patterns` is first printed.
+
+    The thread ends with the output of the process, and closes the log.
+    """
+
+    def __init__(self,
+                 stream: IO[bytes],
+                 log: Any,
+                 patterns: List[str]):
+        """
+        Args:
+            stream (IO): output of the process (opened with stdout=PIPE)
+            log (IO): opened log file (or `log_store.Writer`), or None to
+                      discard the output
+            patterns (list): substrings of lines signaling readiness
+        """
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.log = log
+        self.patterns = patterns
+        self.matched = threading.Event()
+        self.matched_at = None  # type: Optional[float]
+        self.start()
+
+    def run(self) -> None:
+        try:
+            for raw in self.stream:
+                line = raw.decode(errors='replace')
+                if self.log is not None:
+                    self.log.write(line)
+                    self.log.flush()
+                if (not self.matched.is_set() and
+                        any(pattern in line for pattern in self.patterns)):
+                    self.matched_at = time.time()
+                    self.matched.set()
+        finally:
+            if self.log is not None:
+                self.log.close()
+
+    def wait(self, alive: Callable[[], bool], timeout: float) -> bool:
+        """Wait for a matching line, False if the process exited (and
+        printed no matching line) or on timeout"""
+        deadline = time.time() + timeout
+        while not self.matched.wait(min(MAX_DELAY,
+                                        max(deadline - time.time(), 0))):
+            if not alive():
+                # the watcher may still be reading the last lines
+                self.join(PROBE_TIMEOUT)
+                return self.matched.is_set()
+            if time.time() >= deadline:
+                return False
+        return True
@@ -0,0 +1,232 @@
+"""A persistent cache of chains baked from genesis.
+
+Snapshot and reconstruction tests start by baking the same early chain in
+every run. A `ChainCache` bakes such a chain once, and stores the chain
+data of the node (store and context, see `daemons.clone`) in a directory
+shared by test sessions:
+
+    CACHE_DIR/<key>/data       chain data
+    CACHE_DIR/<key>/meta.json  how the chain was built
+
+The key is a hash of everything the chain depends on: the node binary
+(its content hash, so that rebuilt binaries invalidate the cache), the
+protocol and its parameters, the node parameters, the level, the name
+of the baking recipe. Later sessions clone the cached data in a new
+node (`Sandbox.add_node(clone_from=...)`) instead of baking. Entries
+built by other versions of a node binary are removed when a new entry is
+stored.
+
+The activation block can't be dated by an absolute timestamp, which
+would be ignored when cloning. It is dated relative to the time the chain
+is baked (`activation_offset` seconds before, part of the key), so that a
+cached chain is always activated at least that long in the past.
+
+Typical use.
+
+    cache = ChainCache()
+    cache.add_node(sandbox, 0, level=16, params=constants.NODE_PARAMS)
+    sandbox.client(0).bake('baker1', ['--minimal-timestamp'])
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from client.client import Client
+from daemons import clone
+from tools import constants, utils
+from .sandbox import NODE, Sandbox
+
+# Default location of the cache, shared by test sessions
+CACHE_DIR = os.environ.get(
+    'TEZOS_CHAIN_CACHE',
+    os.path.join(tempfile.gettempdir(), 'tezos-chain-cache'))
+
+# Changed when the layout of the cache changes
+CACHE_VERSION = 1
+
+BAKE_ARGS = ['--minimal-timestamp']
+
+# content hashes of binaries, by (path, size, mtime)
+_HASHES = {}  # type: Dict[Tuple[str, int, float], str]
+_HASHES_LOCK = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of file `path`, computed once per version of the file"""
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime)
+    with _HASHES_LOCK:
+        if memo_key in _HASHES:
+            return _HASHES[memo_key]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    with _HASHES_LOCK:
+        _HASHES[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def _default_bake(client: Client) -> None:
+    client.bake('baker1', BAKE_ARGS)
+
+
+class ChainCache:
+    """Chains baked to a given level, see module documentation."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        """
+        Args:
+            cache_dir (str): directory of the cache, created if needed
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def key(self,
+            node_bin: str,
+            level: int,
+            recipe: str,
+            protocol: str = constants.ALPHA,
+            parameters: dict = None,
+            params: List[str] = None,
+            activation_offset: int = 0) -> Tuple[str, Dict[str, Any]]:
+        """Key of a chain, and its description stored with the chain.
+
+        Args:
+            node_bin (str): path to the node binary
+            level (int): level of the head
+            recipe (str): name of the baking function, to be changed when
+                          it is changed
+            protocol (str): protocol activated at level 1
+            parameters (dict): protocol parameters
+            params (list): node parameters
+            activation_offset (int): see `add_node`
+        """
+        if parameters is None:
+            parameters = constants.PARAMETERS
+        meta = {'version': CACHE_VERSION,
+                'node': node_bin,
+                'node_hash': file_hash(node_bin),
+                'protocol': protocol,
+                'parameters': parameters,
+                'params': params or [],
+                'level': level,
+                'recipe': recipe,
+                'activation_offset': activation_offset}
+        serialized = json.dumps(meta, sort_keys=True).encode()
+        return hashlib.sha256(serialized).hexdigest()[:32], meta
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Chain data dir of `key`, None if not cached"""
+        data = os.path.join(self.cache_dir, key, 'data')
+        return data if os.path.isdir(data) else None
+
+    def store(self, key: str, node_dir: str, meta: Dict[str, Any]) -> str:
+        """Store the chain data of `node_dir` (not used by a running node)
+        under `key`. Returns the chain data dir."""
+        building = os.path.join(self.cache_dir,
+                                f'building.{uuid.uuid4().hex}')
+        os.makedirs(os.path.join(building, 'data'))
+        clone.clone_dir(node_dir, os.path.join(building, 'data'))
+        with open(os.path.join(building, 'meta.json'), 'w') as file:
+            json.dump(dict(meta, built_at=time.time()), file)
+        try:
+            os.rename(building, os.path.join(self.cache_dir, key))
+        except OSError:
+            # stored concurrently by another session
+            shutil.rmtree(building, ignore_errors=True)
+        self.prune(meta['node'], meta['node_hash'])
+        data = self.lookup(key)
+        assert data is not None
+        return data
+
+    def prune(self, node_bin: str, node_hash: str) -> List[str]:
+        """Remove chains built by other versions of `node_bin`. Returns
+        their keys."""
+        removed = []
+        for key in os.listdir(self.cache_dir):
+            try:
+                with open(os.path.join(self.cache_dir, key,
+                                       'meta.json')) as file:
+                    meta = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if meta['node'] == node_bin and meta['node_hash'] != node_hash:
+                shutil.rmtree(os.path.join(self.cache_dir, key),
+                              ignore_errors=True)
+                removed.append(key)
+        return removed
+
+    def add_node(self,
+                 sandbox: Sandbox,
+                 node_id: int,
+                 level: int,
+                 params: List[str] = None,
+                 parameters: dict = None,
+                 activation_offset: int = 0,
+                 bake: Callable[[Client], Any] = _default_bake,
+                 recipe: str = 'baker1 ' + ' '.join(BAKE_ARGS),
+                 branch: str = "") -> bool:
+        """Add node `node_id` to `sandbox`, with protocol alpha activated
+        and a chain of `level` blocks.
+
+        The chain is cloned from the cache if there, and otherwise baked
+        by calling `bake` with the client of the node until `level`, and
+        stored (the node is stopped while stored).
+
+        Args:
+            sandbox (Sandbox): the sandbox
+            node_id (int): id of the node
+            level (int): level of the head
+            params (list): node parameters
+            parameters (dict): protocol parameters
+            activation_offset (int): the activation block is dated
+                                     `activation_offset` seconds before the
+                                     chain is baked (e.g. to bake many
+                                     blocks with `--minimal-timestamp`
+                                     without reaching the future)
+            bake (Callable): bakes one block
+            recipe (str): name of `bake`, part of the key
+            branch (str): see `Sandbox.add_node`
+        Returns:
+            True iff the chain was cached.
+        """
+        node_bin = sandbox._wrap_path(  # pylint: disable=protected-access
+            NODE, branch)
+        key, meta = self.key(node_bin, level, recipe, parameters=parameters,
+                             params=params,
+                             activation_offset=activation_offset)
+        cached = self.lookup(key)
+        if cached is not None:
+            self.hits += 1
+            sandbox.add_node(node_id, params=params, branch=branch,
+                             clone_from=cached)
+            utils.remember_baker_contracts(sandbox.client(node_id))
+            assert utils.check_level(sandbox.client(node_id), level)
+            return True
+        self.misses += 1
+        sandbox.add_node(node_id, params=params, branch=branch)
+        client = sandbox.client(node_id)
+        timestamp = None
+        if activation_offset:
+            timestamp = time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ',
+                time.gmtime(time.time() - activation_offset))
+        utils.activate_alpha(client, parameters, timestamp=timestamp)
+        while client.get_level() < level:
+            bake(client)
+        assert client.get_level() == level, f'baked above level {level}'
+        node = sandbox.node(node_id)
+        node.terminate_or_kill()
+        self.store(key, node.node_dir, meta)
+        node.run()
+        assert node.wait_ready(), f'node {node_id} not ready'
+        return False
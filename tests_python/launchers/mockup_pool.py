@@ -0,0 +1,148 @@
+"""A pool of processes running scripts with mockup clients.
+
+Tests that only call `run_script` don't need a node. A `MockupPool` runs
+such calls in a pool of worker processes, each worker owning a mockup
+client with its own base dir. No node is started, and independent cases
+are spread over all cores.
+
+Typical use.
+
+    with MockupPool(client_path, admin_client_path) as pool:
+        results = pool.run_many([ScriptCase(contract, storage, inp), ...])
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent import futures
+from typing import Any, List, Optional
+
+from client.client import Client
+from client.client_output import CreateMockupResult, RunScriptResult
+from client.script_runner import ScriptCase
+from tools import constants
+
+# Mockup client of the current worker process
+_WORKER_CLIENT = None  # type: Optional[Client]
+
+
+def _init_worker(base_dirs: Any,
+                 client_path: str,
+                 admin_client_path: str) -> None:
+    global _WORKER_CLIENT  # pylint: disable=global-statement
+    _WORKER_CLIENT = Client(client_path, admin_client_path,
+                            base_dir=base_dirs.get(), mode='mockup')
+
+
+def _run_case(case: ScriptCase) -> RunScriptResult:
+    assert _WORKER_CLIENT is not None
+    return _WORKER_CLIENT.run_script(*case)
+
+
+class MockupPool:
+    """Pool of `num_workers` processes running scripts in mockup mode.
+
+    Mockup base dirs are created by the constructor, and removed by
+    `cleanup()`. The pool is a context manager.
+    """
+
+    def __init__(self,
+                 client_path: str,
+                 admin_client_path: str,
+                 protocol: str = constants.ALPHA,
+                 num_workers: int = None):
+        """
+        Args:
+            client_path (str): path to the client executable file
+            admin_client_path (str): path to the admin-client executable file
+            protocol (str): protocol of the mockups
+            num_workers (int): number of worker processes, defaults to the
+                               number of CPUs
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        base_dirs = multiprocessing.Queue()  # type: Any
+        with futures.ThreadPoolExecutor(max_workers=num_workers) as creators:
+            creations = [creators.submit(self._create_mockup, client_path,
+                                         admin_client_path, protocol)
+                         for _ in range(num_workers)]
+        errors = [error for error in map(futures.Future.exception, creations)
+                  if error is not None]
+        self.base_dirs = [creation.result() for creation in creations
+                          if creation.exception() is None]
+        if errors:
+            # don't leak the mockups already created
+            for base_dir in self.base_dirs:
+                shutil.rmtree(base_dir, ignore_errors=True)
+            raise errors[0]
+        for base_dir in self.base_dirs:
+            base_dirs.put(base_dir)
+        self._executor = futures.ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(base_dirs, client_path, admin_client_path))
+
+    @staticmethod
+    def _create_mockup(client_path: str,
+                       admin_client_path: str,
+                       protocol: str) -> str:
+        base_dir = tempfile.mkdtemp(prefix='tezos-client.')
+        # mockups are created by a client not in mockup mode, see the
+        # `mockup_client` fixture
+        try:
+            client = Client(client_path, admin_client_path,
+                            base_dir=base_dir)
+            res = client.create_mockup(protocol=protocol).create_mockup_result
+            assert res == CreateMockupResult.OK, \
+                f'mockup creation failed: {res}'
+        except BaseException:
+            shutil.rmtree(base_dir, ignore_errors=True)
+            raise
+        return base_dir
+
+    def run_many(self,
+                 cases: List[ScriptCase],
+                 return_exceptions: bool = False) -> List[Any]:
+        """Run cases in the pool and return results in the same order.
+
+        Args:
+            cases (list): cases to run, see `Client.run_script`
+            return_exceptions (bool): if True, the exception raised by a
+                failing case is returned in place of its result, otherwise
+                the first failure is raised
+        """
+        pending = [self._executor.submit(_run_case, case) for case in cases]
+        results = []  # type: List[Any]
+        for future in pending:
+            try:
+                results.append(future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
+
+    def run_script(self,
+                   contract: str,
+                   storage: str,
+                   inp: str,
+                   amount: float = None,
+                   balance: float = None,
+                   trace_stack: bool = False,
+                   file: bool = True) -> RunScriptResult:
+        """Same as `Client.run_script`, in a worker of the pool"""
+        case = ScriptCase(contract, storage, inp, amount, balance,
+                          trace_stack, file)
+        return self.run_many([case])[0]
+
+    def cleanup(self) -> None:
+        """Stop workers and remove mockup base dirs."""
+        self._executor.shutdown()
+        for base_dir in self.base_dirs:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
@@ -0,0 +1,249 @@
+"""Recording the P2P traffic of a syncing node, and replaying its bootstrap.
+
+Bootstrap measurements with live peers are noisy: peers keep baking, and
+serve blocks at their own pace. A `Capture`, set as the `capture` of the
+`ProxyNetwork` of a sandbox (see `launchers.p2p_proxy`), records the bytes
+that nodes `dests` receive from their peers, one stream per direction of
+a connection:
+
+    <directory>/streams/<connection>-<source>-<dest>.bin  received bytes
+    <directory>/peers/<node_id>/                         chain data
+    <directory>/index.json  chunks of streams, levels of nodes
+
+The recorded bytes can't be fed again to another node: the P2P layer
+encrypts each connection with keys derived from nonces chosen at random
+by both ends. `Capture.save_peers` also stores the chain data of the
+peers (see `daemons.clone`), so that `replay` can start them again, in
+the same state and without bakers, and bootstrap a fresh node from them
+as fast as possible. The recorded streams are the reference of the
+replay: bytes received, and throughput over time.
+
+Typical use.
+
+    sandbox = Sandbox(..., link_conditions=LinkConditions())
+    ...  # node 0 bakes
+    sandbox.proxy.capture = Capture(directory, dests=[1])
+    sandbox.add_node(1, params=params)
+    sandbox.client(1).bootstrapped()
+    sandbox.proxy.capture.save_peers(sandbox, [0])
+    sandbox.proxy.capture.close()
+
+    # later, in another sandbox
+    print(replay(sandbox, directory, 1, params=params))
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, IO, List, NamedTuple, Optional, Tuple
+
+from daemons import clone
+from .sandbox import Sandbox
+
+# Max time (sec) of a replay
+REPLAY_TIMEOUT = 300.
+
+# Polling period (sec) of the level of the replaying node
+POLL_PERIOD = 0.05
+
+
+class Chunk(NamedTuple):
+    """Bytes of a stream read by the proxy at `time` (sec since the start
+    of the capture)"""
+    time: float
+    offset: int
+    size: int
+
+
+class Stream(NamedTuple):
+    """Bytes sent by `source` to `dest` on one connection"""
+    connection: int
+    source: int
+    dest: int
+    file: str
+    chunks: List[Chunk]
+
+    @property
+    def size(self) -> int:
+        return sum(chunk.size for chunk in self.chunks)
+
+
+class ReplayReport(NamedTuple):
+    """Bootstrap of `level` blocks, replayed and as recorded"""
+    level: int
+    duration: float
+    received: Optional[int]
+    recorded_duration: float
+    recorded_received: int
+
+    @property
+    def throughput(self) -> float:
+        """Blocks per second of the replay"""
+        return self.level / self.duration if self.duration else 0.
+
+
+def _stream_file(connection: int, source: int, dest: int) -> str:
+    return os.path.join('streams', f'{connection:06d}-{source}-{dest}.bin')
+
+
+class Capture:
+    """Record streams received by nodes, see module documentation."""
+
+    def __init__(self, directory: str, dests: List[int] = None):
+        """
+        Args:
+            directory (str): directory of the recording, created if needed
+            dests (list): ids of the nodes whose received streams are
+                          recorded, by default all nodes
+        """
+        os.makedirs(os.path.join(directory, 'streams'), exist_ok=True)
+        self.directory = directory
+        self.dests = dests
+        self.start = time.time()
+        self._streams = {}  # type: Dict[Tuple[int, int, int], Stream]
+        self._files = {}  # type: Dict[Tuple[int, int, int], IO[bytes]]
+        # levels of nodes at the end of the capture
+        self.levels = {}  # type: Dict[int, int]
+        self._lock = threading.Lock()
+
+    def record(self,
+               connection: int,
+               direction: Tuple[int, int],
+               data: bytes) -> None:
+        """Append `data`, sent on `connection` in `direction` (source,
+        dest), called by the proxy"""
+        source, dest = direction
+        if self.dests is not None and dest not in self.dests:
+            return
+        key = (connection, source, dest)
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                path = _stream_file(*key)
+                stream = self._streams[key] = Stream(*key, path, [])
+                self._files[key] = open(os.path.join(self.directory, path),
+                                        'wb')
+            file = self._files[key]
+            stream.chunks.append(Chunk(time.time() - self.start,
+                                       file.tell(), len(data)))
+            file.write(data)
+
+    def save_peers(self, sandbox: Sandbox, peers: List[int]) -> None:
+        """Store the chain data of `peers`, and the current levels of the
+        peers and of `dests`. Peers are stopped while stored, and run
+        again."""
+        dests = self.dests if self.dests is not None else []
+        for node_id in dests:
+            self.levels[node_id] = sandbox.client(node_id).get_level()
+        for node_id in peers:
+            self.levels[node_id] = sandbox.client(node_id).get_level()
+            node = sandbox.node(node_id)
+            node.terminate_or_kill()
+            data = os.path.join(self.directory, 'peers', str(node_id))
+            os.makedirs(data)
+            clone.clone_dir(node.node_dir, data)
+            node.run()
+            assert node.wait_ready(), f'node {node_id} not ready'
+
+    def close(self) -> None:
+        """Close streams and write the index of the recording"""
+        with self._lock:
+            for stream_file in self._files.values():
+                stream_file.close()
+            self._files.clear()
+            streams = [stream._asdict() for stream in self._streams.values()]
+        index = {'start': self.start,
+                 'duration': time.time() - self.start,
+                 'levels': self.levels,
+                 'streams': streams}
+        with open(os.path.join(self.directory, 'index.json'), 'w') as file:
+            json.dump(index, file)
+
+
+class Recording:
+    """A closed `Capture`"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'index.json')) as file:
+            index = json.load(file)
+        self.duration = index['duration']  # type: float
+        self.levels = {int(node_id): level
+                       for node_id, level in index['levels'].items()}
+        self.streams = [
+            Stream(stream['connection'], stream['source'], stream['dest'],
+                   stream['file'],
+                   [Chunk(*chunk) for chunk in stream['chunks']])
+            for stream in index['streams']]
+
+    def peers(self) -> List[int]:
+        """Nodes whose chain data is stored"""
+        path = os.path.join(self.directory, 'peers')
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(node_id) for node_id in os.listdir(path))
+
+    def select(self, dest: int = None, source: int = None) -> List[Stream]:
+        return [stream for stream in self.streams
+                if (dest is None or stream.dest == dest) and
+                (source is None or stream.source == source)]
+
+    def received(self, dest: int) -> int:
+        """Bytes received by `dest`"""
+        return sum(stream.size for stream in self.select(dest))
+
+    def read(self, stream: Stream) -> bytes:
+        with open(os.path.join(self.directory, stream.file), 'rb') as file:
+            return file.read()
+
+    def throughput(self, dest: int, interval: float = 1.) -> List[float]:
+        """Bytes per second received by `dest`, in each `interval`"""
+        buckets = [0.] * (int(self.duration / interval) + 1)
+        for stream in self.select(dest):
+            for chunk in stream.chunks:
+                bucket = min(int(chunk.time / interval), len(buckets) - 1)
+                buckets[bucket] += chunk.size / interval
+        return buckets
+
+    def bootstrap_duration(self, dest: int) -> float:
+        """Time between the first and the last bytes received by `dest`"""
+        times = [chunk.time for stream in self.select(dest)
+                 for chunk in stream.chunks]
+        return max(times) - min(times) if times else 0.
+
+
+def replay(sandbox: Sandbox,
+           directory: str,
+           node_id: int,
+           params: List[str] = None,
+           timeout: float = REPLAY_TIMEOUT) -> ReplayReport:
+    """Bootstrap fresh node `node_id` from the peers stored in recording
+    `directory`, until it reaches the level recorded for `node_id`.
+
+    The peers are added to `sandbox` (under their recorded ids, with
+    `params`) from their stored chain data, and don't bake. If `sandbox`
+    has a proxy, the bytes received by `node_id` are counted (give it
+    default `LinkConditions` to replay as fast as possible).
+    """
+    recording = Recording(directory)
+    peers = recording.peers()
+    assert peers, f'no peers stored in {directory}'
+    assert node_id in recording.levels, f'no level recorded for {node_id}'
+    level = recording.levels[node_id]
+    for peer in peers:
+        sandbox.add_node(peer, params=params, clone_from=os.path.join(
+            directory, 'peers', str(peer)))
+    start = time.time()
+    sandbox.add_node(node_id, params=params, peers=peers)
+    client = sandbox.client(node_id)
+    while client.get_level() < level:
+        assert time.time() - start < timeout, f'level {level} not reached'
+        time.sleep(POLL_PERIOD)
+    duration = time.time() - start
+    received = None
+    if sandbox.proxy is not None:
+        received = sum(sandbox.proxy.bytes.get((peer, node_id), 0)
+                       for peer in peers)
+    return ReplayReport(level, duration, received,
+                        recording.bootstrap_duration(node_id),
+                        recording.received(node_id))
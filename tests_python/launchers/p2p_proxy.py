@@ -0,0 +1,228 @@
+"""Proxies shaping the P2P traffic between sandbox nodes.
+
+Sandbox nodes talk over the loopback, without latency nor bandwidth
+limit. A `ProxyNetwork` runs TCP proxies (in an asyncio event loop, in a
+background thread): `add_link(source, dest, port)` opens a proxy port
+through which node `source` connects to node `dest` (listening on `port`).
+The bytes of each direction of a link are delayed according to the
+`LinkConditions` of this direction:
+
+- `latency`: one-way delay (sec), plus a random `jitter` (sec),
+- `bandwidth`: max throughput (bytes/sec), the sender is slowed down
+  (through TCP flow control) as by a real bottleneck,
+- `stall_rate`, `stall`: probability that a chunk of bytes is stalled
+  for `stall` seconds, as after a packet loss.
+
+Bytes are never reordered nor dropped. Conditions can be changed at any
+time, e.g. to partition the network (with a very long stall).
+
+A `capture` (see `launchers.p2p_capture`) records the forwarded bytes.
+
+Sandbox nodes run in private mode by default: they only open connections
+to their `--peer` points, the proxy ports. A proxied connection advertises
+the real P2P port of the connecting node, which the other end doesn't
+trust, so the `Sandbox` makes nodes trust the peer ids of their peers
+instead. Nodes which aren't private learn the real ports of other nodes,
+and may connect to them without the proxies.
+
+Typical use.
+
+    sandbox = Sandbox(..., link_conditions=LinkConditions(latency=0.05))
+    sandbox.add_nodes(range(4), params=constants.NODE_PARAMS)
+    sandbox.proxy.set_conditions(0, 1, LinkConditions(bandwidth=1e5))
+"""
+import asyncio
+import random
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+HOST = '127.0.0.1'
+
+# Max size of the chunks read from a connection
+CHUNK_SIZE = 16 * 1024
+
+
+class LinkConditions(NamedTuple):
+    """Conditions of one direction of a link"""
+    latency: float = 0.
+    jitter: float = 0.
+    bandwidth: Optional[float] = None
+    stall_rate: float = 0.
+    stall: float = 0.2
+
+
+Direction = Tuple[int, int]
+
+
+class ProxyNetwork:
+    """TCP proxies between nodes, see module documentation."""
+
+    def __init__(self,
+                 conditions: LinkConditions = LinkConditions(),
+                 seed: int = None,
+                 capture: Any = None):
+        """
+        Args:
+            conditions (LinkConditions): default conditions of all links
+            seed (int): seed of jitter and stalls
+            capture (Capture): if set, records forwarded bytes, can be set
+                               at any time
+        """
+        self.default = conditions
+        # conditions of directions (source, dest), by default `default`
+        self._conditions = {}  # type: Dict[Direction, LinkConditions]
+        # bytes forwarded in each direction
+        self.bytes = {}  # type: Dict[Direction, int]
+        self.ports = {}  # type: Dict[Direction, int]
+        self.capture = capture
+        # number of connections accepted by proxies
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._servers = []  # type: list
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def conditions(self, source: int, dest: int) -> LinkConditions:
+        return self._conditions.get((source, dest), self.default)
+
+    def set_conditions(self,
+                       source: int,
+                       dest: int,
+                       conditions: LinkConditions,
+                       symmetric: bool = True) -> None:
+        """Set the conditions of bytes sent by `source` to `dest` (and by
+        `dest` to `source` if `symmetric`), from now on"""
+        self._conditions[(source, dest)] = conditions
+        if symmetric:
+            self._conditions[(dest, source)] = conditions
+
+    def set_default(self, conditions: LinkConditions) -> None:
+        """Set the conditions of all links"""
+        self._conditions.clear()
+        self.default = conditions
+
+    def add_link(self, source: int, dest: int, port: int) -> int:
+        """Open a proxy port for connections of `source` to `dest`, which
+        listens on `port`. Returns the proxy port."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._serve(source, dest, port), self._loop)
+        proxy_port = future.result()
+        self.ports[(source, dest)] = proxy_port
+        return proxy_port
+
+    async def _serve(self, source: int, dest: int, port: int) -> int:
+        async def handle(reader, writer):
+            try:
+                await self._handle(source, dest, port, reader, writer)
+            except asyncio.CancelledError:
+                # closed by `stop`
+                writer.close()
+        server = await asyncio.start_server(handle, HOST, 0)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def _handle(self,
+                      source: int,
+                      dest: int,
+                      port: int,
+                      reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        try:
+            dest_reader, dest_writer = await asyncio.open_connection(HOST,
+                                                                     port)
+        except OSError:
+            # dest isn't running
+            writer.close()
+            return
+        self.connections += 1
+        connection = self.connections
+        pipes = [asyncio.ensure_future(self._pipe(reader, dest_writer,
+                                                  (source, dest), connection)),
+                 asyncio.ensure_future(self._pipe(dest_reader, writer,
+                                                  (dest, source), connection))]
+        try:
+            done, pending = await asyncio.wait(
+                pipes, return_when=asyncio.FIRST_COMPLETED)
+            if all(pipe.result() for pipe in done):
+                # half-closed, the other direction may still send bytes
+                await asyncio.wait(pending)
+        finally:
+            for pipe in pipes:
+                pipe.cancel()
+            writer.close()
+            dest_writer.close()
+
+    async def _pipe(self,
+                    reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter,
+                    direction: Direction,
+                    connection: int) -> bool:
+        """Forward bytes of one direction of a connection. Returns True
+        if all bytes were delivered until the end of the stream."""
+        queue = asyncio.Queue()  # type: asyncio.Queue
+        delivery = asyncio.ensure_future(self._deliver(queue, writer))
+        loop = asyncio.get_event_loop()
+        # when the last read bytes will be sent, and delivered
+        sent = delivered = loop.time()
+        try:
+            while not delivery.done():
+                data = await reader.read(CHUNK_SIZE)
+                if not data:
+                    break
+                conditions = self.conditions(*direction)
+                start = max(loop.time(), sent)
+                if self._random.random() < conditions.stall_rate:
+                    start += conditions.stall
+                sent = start
+                if conditions.bandwidth:
+                    sent += len(data) / conditions.bandwidth
+                delivered = max(delivered, sent + conditions.latency +
+                                self._random.uniform(0, conditions.jitter))
+                self.bytes[direction] = (self.bytes.get(direction, 0) +
+                                         len(data))
+                if self.capture is not None:
+                    self.capture.record(connection, direction, data)
+                queue.put_nowait((delivered, data))
+                # don't read faster than the bandwidth
+                await asyncio.sleep(max(sent - loop.time(), 0))
+        except ConnectionError:
+            return False
+        finally:
+            queue.put_nowait((None, b''))
+            await delivery
+        return delivery.result()
+
+    @staticmethod
+    async def _deliver(queue: asyncio.Queue,
+                       writer: asyncio.StreamWriter) -> bool:
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                deliver_at, data = await queue.get()
+                if deliver_at is None:
+                    if writer.can_write_eof():
+                        writer.write_eof()
+                    return True
+                await asyncio.sleep(max(deliver_at - loop.time(), 0))
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            return False
+
+    def stop(self) -> None:
+        """Close all proxies and their connections"""
+        async def close():
+            for server in self._servers:
+                server.close()
+            tasks = [task for task in asyncio.all_tasks()
+                     if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            # the finally blocks of the cancelled tasks close connections
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
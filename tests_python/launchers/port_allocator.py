@@ -0,0 +1,127 @@
+"""Allocation of port blocks, shared by processes of a host.
+
+A `Sandbox` uses ports ``rpc + node_id`` and ``p2p + node_id``. With fixed
+bases, two sandboxes of the same host (e.g. two pytest processes) use the
+same ports. A `PortAllocator` hands out blocks of consecutive ports
+instead.
+
+The port range is divided in slots of `SLOT_SIZE` ports. A slot is owned by
+the process holding an exclusive lock (`flock`) on its lock file in
+`LOCK_DIR`. Locks are released by `release`, or by the system when the
+owning process dies, so that a killed test session doesn't leak ports.
+Before being handed out, every port of a block is checked to be free.
+
+The default range is below the Linux ephemeral range (32768-60999), so
+that outgoing connections don't take ports of a block. Slots overlapping
+`RESERVED` are never handed out: these are the ports of sandboxes with
+fixed bases (the default `rpc` and `p2p` of `Sandbox`, up to 100 nodes),
+which may run on the same host.
+
+Typical use.
+
+    allocator = PortAllocator()
+    base = allocator.allocate(90)  # ports base, ..., base + 89
+    ...
+    allocator.release(base)
+"""
+import fcntl
+import os
+import socket
+import tempfile
+import threading
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+# Directory of the lock files, shared by all processes of a host
+LOCK_DIR = os.environ.get(
+    'TEZOS_PORT_LOCKS',
+    os.path.join(tempfile.gettempdir(), 'tezos-port-locks'))
+
+SLOT_SIZE = 200
+LOW_PORT = 10000
+HIGH_PORT = 32000
+
+# Ranges [first, end) of ports used with fixed bases
+RESERVED = [(18730, 18830), (19730, 19830)]
+
+
+def is_free(port: int) -> bool:
+    """True iff TCP `port` can be bound on localhost"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('127.0.0.1', port))
+            return True
+        except OSError:
+            return False
+
+
+class PortAllocator:
+    """Blocks of at most `SLOT_SIZE` free consecutive ports."""
+
+    def __init__(self,
+                 lock_dir: str = LOCK_DIR,
+                 low: int = LOW_PORT,
+                 high: int = HIGH_PORT,
+                 reserved: List[Tuple[int, int]] = None):
+        """
+        Args:
+            lock_dir (str): directory of the lock files, created if needed
+            low (int): first port of the range
+            high (int): end of the range (excluded)
+            reserved (list): ranges [first, end) of ports never allocated,
+                             `RESERVED` by default
+        """
+        assert 0 < low and low + SLOT_SIZE <= high <= 65536
+        os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self.low = low
+        self.high = high
+        self.reserved = RESERVED if reserved is None else reserved
+        self._lock = threading.Lock()
+        # lock files of allocated slots, by first port
+        self._slots = {}  # type: Dict[int, IO[Any]]
+
+    def _try_lock(self, base: int) -> Optional[IO[Any]]:
+        path = os.path.join(self.lock_dir, f'ports-{base}.lock')
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _is_reserved(self, base: int) -> bool:
+        return any(base < end and first < base + SLOT_SIZE
+                   for first, end in self.reserved)
+
+    def allocate(self, size: int) -> int:
+        """Allocate `size` free consecutive ports, return the first one"""
+        assert 1 <= size <= SLOT_SIZE, f'cannot allocate {size} ports'
+        with self._lock:
+            for base in range(self.low, self.high - SLOT_SIZE + 1,
+                              SLOT_SIZE):
+                if base in self._slots or self._is_reserved(base):
+                    continue
+                lock_file = self._try_lock(base)
+                if lock_file is None:
+                    continue
+                if all(is_free(port) for port in range(base, base + size)):
+                    self._slots[base] = lock_file
+                    return base
+                # used by another program
+                lock_file.close()
+        assert False, f'no {size} free ports in [{self.low}, {self.high})'
+
+    def release(self, base: int) -> None:
+        """Release the block starting at `base`"""
+        with self._lock:
+            lock_file = self._slots.pop(base)
+        # closing the file releases the lock
+        lock_file.close()
+
+    def release_all(self) -> None:
+        with self._lock:
+            slots = list(self._slots.values())
+            self._slots = {}
+        for lock_file in slots:
+            lock_file.close()
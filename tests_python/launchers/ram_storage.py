@@ -0,0 +1,119 @@
+"""Temp dirs of nodes and clients in RAM, within a memory budget.
+
+Short tests spend much of their time writing (and syncing) node stores
+and client dirs to disk. A `RamStorage` creates these dirs on a tmpfs
+(by default `/dev/shm`) instead, as long as the RAM they use stays within
+`budget` bytes: a dir is created on the tmpfs if the current usage of all
+its dirs plus the expected size of the new dir (`reserve`) fits in the
+budget and in the free space of the tmpfs, and on disk otherwise. Dirs
+aren't moved once created, a node filling the tmpfs fails as on a full
+disk.
+
+Typical use.
+
+    storage = RamStorage(budget=2 * 1024 ** 3)
+    with Sandbox(..., storage=storage) as sandbox:
+        ...
+    print(storage.report())
+"""
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from .resource_monitor import dir_size
+
+# Default tmpfs, on Linux
+RAM_ROOT = '/dev/shm'
+
+# Default RAM budget (bytes)
+BUDGET = 1024 ** 3
+
+# Expected size (bytes) of new dirs
+NODE_RESERVE = 64 * 1024 ** 2
+CLIENT_RESERVE = 1024 ** 2
+
+
+class StorageReport(NamedTuple):
+    """Dirs created in RAM and on disk, and peak RAM usage (bytes) when
+    dirs were created"""
+    ram_dirs: int
+    disk_dirs: int
+    peak_bytes: int
+
+
+class RamStorage:
+    """Create temp dirs in RAM, see module documentation."""
+
+    def __init__(self,
+                 budget: int = BUDGET,
+                 root: str = None,
+                 disk_root: str = None):
+        """
+        Args:
+            budget (int): max RAM (bytes) used by dirs
+            root (str): tmpfs mount (by default `/dev/shm` if it exists),
+                        None if not found: all dirs are on disk
+            disk_root (str): parent of dirs on disk (by default, the
+                             default temp dir)
+        """
+        if root is None and os.access(RAM_ROOT, os.W_OK):
+            root = RAM_ROOT
+        self.budget = budget
+        self.root = root
+        self.disk_root = disk_root
+        # dirs created and not removed, reserve of dirs in RAM
+        self._dirs = {}  # type: Dict[str, Optional[int]]
+        self._ram_dirs = 0
+        self._disk_dirs = 0
+        self._peak = 0
+        self._lock = threading.Lock()
+
+    def used(self) -> int:
+        """RAM (bytes) used by dirs, at least their reserve"""
+        with self._lock:
+            dirs = dict(self._dirs)
+        return sum(max(dir_size(path), reserve)
+                   for path, reserve in dirs.items() if reserve is not None)
+
+    def _fits(self, reserve: int) -> bool:
+        if self.root is None:
+            return False
+        used = self.used() + reserve
+        if used > self.budget:
+            return False
+        stat = os.statvfs(self.root)
+        return stat.f_bavail * stat.f_frsize >= reserve
+
+    def mkdtemp(self, prefix: str, reserve: int) -> str:
+        """New temp dir, in RAM if `reserve` bytes fit in the budget, and on
+        disk otherwise"""
+        in_ram = self._fits(reserve)
+        path = tempfile.mkdtemp(prefix=prefix,
+                                dir=self.root if in_ram else self.disk_root)
+        with self._lock:
+            self._dirs[path] = reserve if in_ram else None
+            if in_ram:
+                self._ram_dirs += 1
+            else:
+                self._disk_dirs += 1
+        if in_ram:
+            self._peak = max(self._peak, self.used())
+        return path
+
+    def in_ram(self, path: str) -> bool:
+        with self._lock:
+            return self._dirs.get(path) is not None
+
+    def remove(self, path: str) -> None:
+        """Remove dir `path`, if created by `mkdtemp`"""
+        with self._lock:
+            if path not in self._dirs:
+                return
+            del self._dirs[path]
+        shutil.rmtree(path, ignore_errors=True)
+
+    def report(self) -> StorageReport:
+        with self._lock:
+            return StorageReport(self._ram_dirs, self._disk_dirs, self._peak)
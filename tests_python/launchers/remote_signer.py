@@ -0,0 +1,178 @@
+"""A local stand-in for `tezos-signer`, answering over HTTP.
+
+Daemons of the sandbox sign with keys stored in the client base dir. In
+production, they usually sign through a remote signer instead. A
+`RemoteSigner` serves the HTTP protocol of `tezos-signer launch http
+signer` (public keys, authorized keys and signing requests), signs in a
+pool of worker processes, and records the latency of each signing request.
+An optional delay is added before answering, to simulate a slow signer.
+
+Use `Sandbox.add_baker(..., signer=...)` or `Sandbox.add_endorser(...,
+signer=...)` to make a daemon sign through the stand-in.
+
+Typical use.
+
+    with RemoteSigner(constants.IDENTITIES, delay=0.05) as signer:
+        sandbox.add_baker(0, 'baker1', proto, signer=signer)
+        ...
+        print(signer.latency_stats())
+"""
+import http.server
+import json
+import statistics
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List, NamedTuple
+
+from tools import multisig
+
+# first byte of the signed data, for operations signed by daemons
+WATERMARKS = {1: 'block', 2: 'endorsement', 3: 'generic'}
+
+
+class SignRequest(NamedTuple):
+    """A signing request answered by the signer"""
+    pkh: str
+    kind: str
+    received: float
+    latency: float
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    server: '_Server'
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, code: int, answer) -> None:
+        body = json.dumps(answer).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _pkh(self) -> str:
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'keys':
+            return parts[1]
+        return ''
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path.split('?')[0] == '/authorized_keys':
+            self._reply(200, {})
+            return
+        signer = self.server.signer
+        pkh = self._pkh()
+        if pkh not in signer.keys:
+            self._reply(404, [])
+            return
+        self._reply(200, {'public_key': signer.keys[pkh]['public']})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        received = time.time()
+        signer = self.server.signer
+        length = int(self.headers.get('Content-Length', 0))
+        data = bytes.fromhex(json.loads(self.rfile.read(length)))
+        pkh = self._pkh()
+        if pkh not in signer.keys:
+            self._reply(404, [])
+            return
+        if signer.delay:
+            time.sleep(signer.delay)
+        signature = signer.pool.submit(multisig.local_sign, data,
+                                       signer.keys[pkh]['secret']).result()
+        if signature is None:
+            self._reply(500, [{'kind': 'temporary',
+                               'id': 'unsupported_key', 'pkh': pkh}])
+            return
+        kind = WATERMARKS.get(data[0], 'other') if data else 'other'
+        signer.record(SignRequest(pkh, kind, received,
+                                  time.time() - received))
+        self._reply(200, {'signature': signature})
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+    signer: 'RemoteSigner'
+
+
+class RemoteSigner:
+    """HTTP signer holding unencrypted ed25519 and secp256k1 keys.
+
+    The signer listens on `localhost:port` as soon as it is created, and
+    is stopped by `stop()`. It is a context manager.
+    """
+
+    def __init__(self,
+                 identities: Dict[str, Dict[str, str]],
+                 port: int = 0,
+                 num_workers: int = 4,
+                 delay: float = 0.):
+        """
+        Args:
+            identities (dict): keys of the signer, same format as the
+                               identities of a `Sandbox`, identities
+                               without public key are ignored
+            port (int): listening port, a free port is chosen if 0
+            num_workers (int): number of signing processes
+            delay (float): delay (in seconds) added to each signing
+                           request, can be changed at any time
+        """
+        # consensus keys (e.g. `baker1_key`) have no `identity`, their
+        # hash is computed from their public key
+        self.aliases = {multisig.public_key_hash(iden['public']): alias
+                        for alias, iden in identities.items()
+                        if 'public' in iden}
+        self.keys = {pkh: identities[alias]
+                     for pkh, alias in self.aliases.items()}
+        self.delay = delay
+        self.requests = []  # type: List[SignRequest]
+        self._lock = threading.Lock()
+        self.pool = futures.ProcessPoolExecutor(max_workers=num_workers)
+        self._server = _Server(('localhost', port), _Handler)
+        self._server.signer = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def uri(self, pkh: str) -> str:
+        """Secret key URI of `pkh` for the client"""
+        return f'http://localhost:{self.port}/{pkh}'
+
+    def record(self, request: SignRequest) -> None:
+        with self._lock:
+            self.requests.append(request)
+
+    def latency_stats(self, kind: str = None) -> Dict[str, float]:
+        """Count, mean, median, 95th percentile and max of the latencies
+        (in seconds) of signing requests, optionally of a given kind (e.g.
+        'block' or 'endorsement')"""
+        with self._lock:
+            latencies = sorted(req.latency for req in self.requests
+                               if kind is None or req.kind == kind)
+        if not latencies:
+            return {'count': 0}
+        return {'count': len(latencies),
+                'mean': statistics.mean(latencies),
+                'median': statistics.median(latencies),
+                'p95': latencies[int(0.95 * (len(latencies) - 1))],
+                'max': latencies[-1]}
+
+    def stop(self) -> None:
+        """Stop listening and stop the signing workers"""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,208 @@
+"""Resource usage of sandbox processes, sampled from `/proc`.
+
+A `ResourceMonitor` samples, every `interval` seconds, for each process
+given by its `targets` callback
+
+- `cpu`: CPU time (user + system, in seconds),
+- `rss`: resident memory (bytes),
+- `fds`: number of open file descriptors,
+- `read_bytes`, `write_bytes`: storage I/O (bytes),
+- `threads`: number of threads,
+- `dir_size`: size of the process data dir (bytes), e.g. a node dir.
+
+Samples are stored as compact arrays, one per metric and process. Series
+and summaries (peak and mean of each metric, mean CPU usage) can be
+exported for a time window, e.g. the duration of a test.
+
+Sampling requires Linux `/proc`, elsewhere nothing is recorded.
+
+Typical use.
+
+    sandbox = Sandbox(..., monitor_interval=0.5)
+    ...
+    start = time.time()
+    run_test()
+    sandbox.monitor.export('resources.json', since=start)
+"""
+import array
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+METRICS = ('cpu', 'rss', 'fds', 'read_bytes', 'write_bytes', 'threads',
+           'dir_size')
+
+_CLOCK_TICKS = (os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf')
+                else 100)
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# name -> (pid, data dir or None)
+Targets = Dict[str, Tuple[int, Optional[str]]]
+
+
+def dir_size(path: str) -> int:
+    """Disk usage (bytes) of the files of `path`"""
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += dir_size(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_blocks * 512
+        except OSError:
+            # removed while scanning
+            pass
+    return total
+
+
+def read_process(pid: int) -> Optional[Dict[str, float]]:
+    """Current metrics of process `pid` (but `dir_size`), None if the
+    process doesn't exist or `/proc` isn't available"""
+    proc = f'/proc/{pid}'
+    try:
+        with open(f'{proc}/stat') as file:
+            # the command name (2nd field) may contain spaces
+            fields = file.read().rsplit(')', 1)[1].split()
+        sample = {'cpu': (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+                  'threads': float(fields[17]),
+                  'rss': float(int(fields[21]) * _PAGE_SIZE),
+                  'fds': float(len(os.listdir(f'{proc}/fd'))),
+                  'read_bytes': 0.,
+                  'write_bytes': 0.}
+    except (OSError, IndexError, ValueError):
+        return None
+    try:
+        with open(f'{proc}/io') as file:
+            for line in file:
+                key, value = line.split(':')
+                if key in ('read_bytes', 'write_bytes'):
+                    sample[key] = float(value)
+    except OSError:
+        # not readable on some systems
+        pass
+    return sample
+
+
+class Series:
+    """Samples of one process"""
+
+    def __init__(self):
+        self.times = array.array('d')
+        self.values = {metric: array.array('d') for metric in METRICS}
+
+    def append(self, timestamp: float, sample: Dict[str, float]) -> None:
+        self.times.append(timestamp)
+        for metric in METRICS:
+            self.values[metric].append(sample.get(metric, 0.))
+
+    def window(self, since: float = 0., until: float = None) -> 'Series':
+        """Samples taken between `since` and `until`"""
+        result = Series()
+        for index, timestamp in enumerate(self.times):
+            if since <= timestamp and (until is None or timestamp <= until):
+                result.times.append(timestamp)
+                for metric in METRICS:
+                    result.values[metric].append(
+                        self.values[metric][index])
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """Peak and mean of each metric, and mean CPU usage (in % of a
+        core) between the first and the last sample"""
+        if not self.times:
+            return {'samples': 0}
+        result = {'samples': float(len(self.times))}
+        for metric, values in self.values.items():
+            result[f'{metric}_peak'] = max(values)
+            result[f'{metric}_mean'] = sum(values) / len(values)
+        elapsed = self.times[-1] - self.times[0]
+        cpu = self.values['cpu']
+        result['cpu_percent'] = (100 * (cpu[-1] - cpu[0]) / elapsed
+                                 if elapsed else 0.)
+        return result
+
+    def to_json(self) -> dict:
+        return {'times': list(self.times),
+                **{metric: list(values)
+                   for metric, values in self.values.items()}}
+
+
+class ResourceMonitor:
+    """Sample processes returned by `targets` in a background thread."""
+
+    def __init__(self,
+                 targets: Callable[[], Targets],
+                 interval: float = 1.):
+        """
+        Args:
+            targets (Callable): returns the processes to sample, by name,
+                                called at each sampling
+            interval (float): time (sec) between two samplings
+        """
+        assert interval > 0
+        self.targets = targets
+        self.interval = interval
+        self.series = {}  # type: Dict[str, Series]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def sample(self) -> None:
+        """Sample all targets now"""
+        for name, (pid, data_dir) in self.targets().items():
+            timestamp = time.time()
+            sample = read_process(pid)
+            if sample is None:
+                continue
+            if data_dir is not None:
+                sample['dir_size'] = float(dir_size(data_dir))
+            with self._lock:
+                self.series.setdefault(name, Series()).append(timestamp,
+                                                              sample)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except RuntimeError:
+                # targets changed while iterating, e.g. a node was added
+                pass
+
+    def window(self,
+               since: float = 0.,
+               until: float = None) -> Dict[str, Series]:
+        with self._lock:
+            return {name: series.window(since, until)
+                    for name, series in self.series.items()}
+
+    def summary(self,
+                since: float = 0.,
+                until: float = None) -> Dict[str, Dict[str, float]]:
+        """Summary of each process, see `Series.summary`"""
+        return {name: series.summary()
+                for name, series in self.window(since, until).items()
+                if series.times}
+
+    def export(self,
+               path: str,
+               since: float = 0.,
+               until: float = None) -> None:
+        """Write series and summaries between `since` and `until` to JSON
+        file `path`"""
+        window = self.window(since, until)
+        with open(path, 'w') as file:
+            json.dump({name: {'summary': series.summary(),
+                              'series': series.to_json()}
+                       for name, series in window.items() if series.times},
+                      file)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
@@ -1,11 +1,28 @@
+import functools
 import os
+import shutil
+import subprocess
+import tempfile
 import time
-from typing import Callable, Dict, List, Tuple
+import threading
+from concurrent import futures
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional, Set,
+                    Tuple)
 
 from client.client import Client
 from daemons.baker import Baker
 from daemons.endorser import Endorser
+from daemons.identity_pool import IdentityPool
+from daemons.log_store import LogStore, Writer
 from daemons.node import Node
+from . import teardown
+from .p2p_proxy import LinkConditions, ProxyNetwork
+from .port_allocator import PortAllocator
+from .ram_storage import CLIENT_RESERVE, NODE_RESERVE, RamStorage
+from .remote_signer import RemoteSigner
+from .resource_monitor import ResourceMonitor, Targets
+from .supervisor import RestartPolicy, Supervisor
+from .topology import Topology
 
 NODE = 'tezos-node'
 CLIENT = 'tezos-client'
@@ -13,6 +30,17 @@ CLIENT_ADMIN = 'tezos-admin-client'
 BAKER = 'tezos-baker'
 ENDORSER = 'tezos-endorser'
 
+# Time given to processes to terminate when cleaning up a sandbox
+TERM_TIMEOUT = 10.
+
+
+class TeardownReport(NamedTuple):
+    """Outcome of `Sandbox.cleanup`"""
+    stopped: int
+    killed: List[str]
+    stop_time: float
+    cleanup_time: float
+
 
 class Sandbox:
     """A Sandbox manages a set of clients, nodes and daemons running in
@@ -55,7 +83,14 @@ class Sandbox:
                  p2p: int = 19730,
                  num_peers: int = 45,
                  log_dir: str = None,
-                 singleprocess: bool = False):
+                 singleprocess: bool = False,
+                 identity_pool: IdentityPool = None,
+                 ports: PortAllocator = None,
+                 monitor_interval: float = None,
+                 restart_policy: RestartPolicy = None,
+                 log_store: LogStore = None,
+                 storage: RamStorage = None,
+                 link_conditions: LinkConditions = None):
         """
         Args:
             binaries_path (str): path to the binaries (client, node, baker,
@@ -65,6 +100,27 @@ class Sandbox:
             p2p (int): base P2P port
             num_peers (int): max number of peers
             log_dir (str): optional log directory for node/daemons logs
+            identity_pool (IdentityPool): optional pool of node identities
+                generated in advance
+            ports (PortAllocator): if set, `rpc` and `p2p` are ignored, the
+                RPC and P2P ports are a block of free ports allocated by
+                `ports`, and released by `cleanup`. Several sandboxes can
+                then run on the same host.
+            monitor_interval (float): if set, resources used by nodes and
+                daemons are sampled every `monitor_interval` seconds by
+                `monitor`, see `launchers.resource_monitor`
+            restart_policy (RestartPolicy): if set, nodes and daemons which
+                die are restarted under this policy by `supervisor`
+            log_store (LogStore): if set, the outputs of nodes and daemons
+                are appended to this store (with sources named as in
+                `supervisor`), and `log_dir` isn't used for their logs.
+                The store is flushed, but not closed, by `cleanup`.
+            storage (RamStorage): if set, temp node and client dirs are
+                created by `storage`, in RAM while its budget allows it
+            link_conditions (LinkConditions): if set, nodes connect to their
+                peers through `proxy`, shaping P2P traffic under these
+                conditions (changed with `proxy.set_conditions`), see
+                `launchers.p2p_proxy`
 
         Binaries contained in `binaries_path` are supposed to follow the
         naming conventions used in the Tezos codebase. For instance,
@@ -81,6 +137,12 @@ class Sandbox:
         self.binaries_path = binaries_path
         self.log_dir = log_dir
         self.identities = dict(identities)
+        self.ports = ports
+        self._ports_base = None  # type: Optional[int]
+        if ports is not None:
+            self._ports_base = ports.allocate(2 * num_peers)
+            rpc = self._ports_base
+            p2p = self._ports_base + num_peers
         self.rpc = rpc
         self.p2p = p2p
         self.num_peers = num_peers
@@ -91,7 +153,28 @@ class Sandbox:
         self.endorsers = {}  # type: Dict[str, Dict[int, Endorser]]
         self.counter = 0
         self.logs = []  # type: List[str]
+        self.log_store = log_store
+        self.storage = storage
         self.singleprocess = singleprocess
+        self.identity_pool = identity_pool
+        # client dirs of daemons signing with a remote signer
+        self.daemon_dirs = []  # type: List[str]
+        self.teardown_report = None  # type: Optional[TeardownReport]
+        # publishes deaths of nodes and daemons, see `launchers.supervisor`
+        self.supervisor = Supervisor()
+        self.restart_policy = restart_policy
+        self.monitor = None  # type: Optional[ResourceMonitor]
+        self.proxy = None  # type: Optional[ProxyNetwork]
+        if link_conditions is not None:
+            self.proxy = ProxyNetwork(link_conditions)
+        # peers of nodes connecting through `proxy`, and running nodes
+        # among them, see `_trust_proxied_peers`
+        self._proxied_peers = {}  # type: Dict[int, List[int]]
+        self._trusting = set()  # type: Set[int]
+        if monitor_interval is not None:
+            self.monitor = ResourceMonitor(self._monitored, monitor_interval)
+        # protects registrations when nodes are added concurrently
+        self._lock = threading.RLock()
 
     def __enter__(self):
         return self
@@ -126,8 +209,11 @@ class Sandbox:
             peers = list(range(self.num_peers))
         assert all(0 <= peer < self.num_peers for peer in peers)
 
+        if node_dir is None and self.storage is not None:
+            node_dir = self.storage.mkdtemp('tezos-node.', NODE_RESERVE)
         log_file = None
-        if self.log_dir:
+        log_writer = self._log_writer(f'node {node_id}')
+        if self.log_dir and log_writer is None:
             log_file = f'{self.log_dir}/node{node_id}_{self.counter}.txt'
             self.logs.append(log_file)
             self.counter += 1
@@ -135,26 +221,72 @@ class Sandbox:
         params = [] if params is None else params
         if private:
             params = params + ['--private-mode']
-        peers_rpc = [self.p2p + p for p in peers]
+        if self.proxy is not None:
+            self._proxied_peers[node_id] = peers
+        peers_rpc = [self._peer_port(node_id, p) for p in peers]
         node_bin = self._wrap_path(NODE, branch)
         node = Node(node_bin, config=node_config, node_dir=node_dir,
                     p2p_port=p2p_node, rpc_port=rpc_node, peers=peers_rpc,
                     log_file=log_file, params=params, log_levels=log_levels,
-                    use_tls=use_tls, singleprocess=self.singleprocess)
+                    use_tls=use_tls, singleprocess=self.singleprocess,
+                    identity_pool=self.identity_pool, log_writer=log_writer)
 
         self.nodes[node_id] = node
         return node
 
+    def _trust_proxied_peers(self, node_id: int) -> None:
+        """Make node `node_id` and its running peers trust each other's
+        peer id, when they connect through `proxy`.
+
+        A node connecting through a proxy advertises its own P2P port, not
+        the proxy port trusted (as a `--peer`) by the other end, so that
+        the connection would be rejected in private mode."""
+        peers = self._proxied_peers.get(node_id)
+        if peers is None:
+            return
+        with self._lock:
+            # nodes added concurrently trust each other once
+            others = [other for other in self._trusting
+                      if other in peers or
+                      node_id in self._proxied_peers.get(other, [])]
+            self._trusting.add(node_id)
+        client = self.client(node_id)
+        peer_id = client.rpc('get', '/network/self')
+        for other in others:
+            other_client = self.client(other)
+            other_id = other_client.rpc('get', '/network/self')
+            other_client.rpc('get', f'/network/peers/{peer_id}/trust')
+            client.rpc('get', f'/network/peers/{other_id}/trust')
+
+    def _peer_port(self, node_id: int, peer: int) -> int:
+        """P2P port through which `node_id` connects to `peer`"""
+        port = self.p2p + peer
+        if self.proxy is None or peer == node_id:
+            return port
+        proxy_port = self.proxy.ports.get((node_id, peer))
+        if proxy_port is None:
+            proxy_port = self.proxy.add_link(node_id, peer, port)
+        return proxy_port
+
+    def _log_writer(self, source: str) -> Optional[Writer]:
+        if self.log_store is None:
+            return None
+        return self.log_store.writer(source)
+
     def _instanciate_client(self,
                             rpc_port: int,
                             use_tls: Tuple[str, str] = None,
                             branch: str = "",
-                            client_factory: Callable = Client):
+                            client_factory: Callable = Client,
+                            base_dir: str = None):
         scheme = 'https' if use_tls else 'http'
         endpoint = f'{scheme}://localhost:{rpc_port}'
+        kwargs = {}  # type: Dict[str, Any]
+        if base_dir is not None:
+            kwargs['base_dir'] = base_dir
         return self.create_client(branch=branch,
                                   client_factory=client_factory,
-                                  endpoint=endpoint)
+                                  endpoint=endpoint, **kwargs)
 
     def create_client(self,
                       branch: str = "",
@@ -221,20 +353,28 @@ class Sandbox:
         """Instantiate a Client and add it to the sandbox manager"""
         error_msg = f'Already a client for id={node_id}'
         assert node_id not in self.clients, error_msg
+        base_dir = None
+        if self.storage is not None:
+            base_dir = self.storage.mkdtemp('tezos-client.', CLIENT_RESERVE)
         client = self._instanciate_client(rpc_port,
                                           use_tls,
                                           branch,
-                                          client_factory)
+                                          client_factory,
+                                          base_dir)
         self.clients[node_id] = client
         return client
 
-    def init_node(self, node, snapshot, reconstruct):
-        """Generate node id and import snapshot """
+    def init_node(self, node, snapshot, reconstruct, clone_from=None):
+        """Generate node id and import snapshot or clone a node dir"""
+        assert snapshot is None or clone_from is None, \
+            'import a snapshot or clone a node dir, not both'
         node.init_id()
         node.init_config()
         if snapshot is not None:
             params = ['--reconstruct'] if reconstruct else []
             node.snapshot_import(snapshot, params)
+        if clone_from is not None:
+            node.clone_from(clone_from)
 
     def init_client(self,
                     client,
@@ -243,9 +383,9 @@ class Sandbox:
         """Initialize client with bootstrap keys. If node object is provided,
            check whether the node is running and responsive """
 
-        if node is not None and not client.check_node_listening():
+        if node is not None and not node.wait_ready():
             node_id = node.rpc_port - self.rpc
-            assert node.poll() is None, "# Node {node_id} isn't running"
+            assert node.poll() is None, f"# Node {node_id} isn't running"
             node.kill()
             assert False, f"# Node {node_id} isn't responding to RPC"
 
@@ -267,7 +407,8 @@ class Sandbox:
                  reconstruct: bool = False,
                  branch: str = "",
                  node_config: dict = None,
-                 client_factory: Callable = Client) -> None:
+                 client_factory: Callable = Client,
+                 clone_from: str = None) -> None:
         """ Launches new node with given node_id and initializes client
 
         Args:
@@ -288,6 +429,9 @@ class Sandbox:
                           versions of nodes.
             client_factory (Callable): the constructor of clients. Defaults to
                                        Client. Allows e.g. regression testing.
+            clone_from (str): node directory (not used by a running node)
+                              whose chain data is cloned before running
+                              the node, instead of importing a snapshot
 
         This registers a node and a client for the given id. It initializes
         both the client and the node, and run the node.
@@ -301,28 +445,160 @@ class Sandbox:
         Whenever a node has been added with `add_node()`, we can access a
         corresponding client object `client()` to interact with this node.
         """
-        node = self.register_node(node_id, node_dir, peers, params,
-                                  log_levels, private, use_tls, branch,
-                                  node_config)
+        with self._lock:
+            node = self.register_node(node_id, node_dir, peers, params,
+                                      log_levels, private, use_tls, branch,
+                                      node_config)
 
-        self.init_node(node, snapshot, reconstruct)
+        self.init_node(node, snapshot, reconstruct, clone_from)
 
         node.run()
+        self.supervisor.watch(f'node {node_id}', lambda: node.process,
+                              restart=node.run, policy=self.restart_policy,
+                              stopped=lambda: node.stopped)
 
         rpc_port = node.rpc_port
-        client = self.register_client(node_id,
-                                      rpc_port, use_tls,
-                                      branch,
-                                      client_factory)
+        with self._lock:
+            client = self.register_client(node_id,
+                                          rpc_port, use_tls,
+                                          branch,
+                                          client_factory)
 
         self.init_client(client, node, config_client)
+        self._trust_proxied_peers(node_id)
+
+    def add_nodes(self,
+                  node_ids: List[int],
+                  max_workers: int = None,
+                  **kwargs) -> None:
+        """Same as `add_node` for each id of `node_ids`, concurrently.
+
+        Identity generation, configuration, startup, RPC readiness check
+        and client initialization of all nodes run in parallel, so that
+        adding n nodes takes about as long as adding one.
+
+        Args:
+            node_ids (list): ids of the nodes to add
+            max_workers (int): max number of nodes provisioned at the same
+                               time, defaults to all of them
+            **kwargs: arguments passed to `add_node` for every node
+
+        As soon as a node fails, nodes not started yet are skipped. Nodes
+        already started are still registered (and cleaned up with the
+        sandbox), and an AssertionError reports the error of each failed
+        node.
+        """
+        assert len(set(node_ids)) == len(node_ids), 'duplicate node ids'
+        self._add_nodes({node_id: kwargs for node_id in node_ids},
+                        max_workers)
+
+    def add_topology(self,
+                     topology: Topology,
+                     max_workers: int = None,
+                     params: List[str] = None,
+                     **kwargs) -> None:
+        """Add the nodes of `topology` concurrently (see `add_nodes`).
+
+        Args:
+            topology (dict): neighbors of each node id, see
+                             `launchers.topology`
+            max_workers (int): see `add_nodes`
+            params (list): see `add_node`, the `--connections` parameter
+                           is replaced by the degree of each node
+            **kwargs: arguments passed to `add_node` for every node, except
+                      `peers`
+
+        Each node is given its neighbors as (trusted) peers. Unless
+        `private=False`, nodes only connect to their neighbors. The expected
+        number of connections of a node (`--connections`) is its degree, its
+        min and max connections are half and 1.5 times its degree.
+        """
+        assert 'peers' not in kwargs, 'peers are defined by the topology'
+        assert all(node_id in topology[peer]
+                   for node_id, peers in topology.items()
+                   for peer in peers), 'topology is not symmetric'
+        params = [] if params is None else list(params)
+        if '--connections' in params:
+            index = params.index('--connections')
+            del params[index:index + 2]
+        node_kwargs = {node_id: dict(kwargs, peers=peers,
+                                     params=params + [
+                                         '--connections',
+                                         str(max(len(peers), 1))])
+                       for node_id, peers in topology.items()}
+        self._add_nodes(node_kwargs, max_workers)
+
+    def _add_nodes(self,
+                   node_kwargs: Dict[int, dict],
+                   max_workers: int = None) -> None:
+        """Call `add_node(node_id, **kwargs)` for each node id, kwargs of
+        `node_kwargs`, concurrently"""
+        if max_workers is None:
+            max_workers = max(len(node_kwargs), 1)
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {pool.submit(self.add_node, node_id, **kwargs): node_id
+                       for node_id, kwargs in node_kwargs.items()}
+            _, not_done = futures.wait(
+                pending, return_when=futures.FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+        errors = {pending[future]: future.exception()
+                  for future in pending
+                  if not future.cancelled() and future.exception()}
+        report = '\n'.join(f'# node {node_id}: {error!r}'
+                           for node_id, error in sorted(errors.items()))
+        assert not errors, f'failed to add nodes:\n{report}'
+
+    def _remote_signer_base_dir(self,
+                                client: Client,
+                                signer: RemoteSigner,
+                                branch: str) -> str:
+        """Copy of the base dir of `client` where the keys held by `signer`
+        are replaced by their remote counterpart"""
+        base_dir = tempfile.mkdtemp(prefix='tezos-client.')
+        self.daemon_dirs.append(base_dir)
+        for name in os.listdir(client.base_dir):
+            path = os.path.join(client.base_dir, name)
+            if os.path.isfile(path):
+                shutil.copy(path, base_dir)
+        daemon_client = self.create_client(branch=branch, base_dir=base_dir,
+                                           endpoint=client.endpoint)
+        for pkh, alias in signer.aliases.items():
+            daemon_client.run(['import', 'secret', 'key', alias,
+                               signer.uri(pkh), '--force'])
+        return base_dir
+
+    @staticmethod
+    def _wait_daemon_ready(daemon, name: str) -> None:
+        # a daemon waits for its node to be bootstrapped before starting,
+        # it isn't an error if it isn't ready yet
+        if daemon.wait_ready() is None:
+            print(f'# {name} not ready yet')
+
+    def _supervise(self,
+                   name: str,
+                   daemons: Dict[int, Any],
+                   node_id: int,
+                   start: Callable[..., Any]) -> None:
+        """Watch the daemon `daemons[node_id]`, restarted with `start`"""
+        def restart() -> None:
+            # the log of the crashed daemon is kept
+            daemons[node_id] = start(overwrite_log=False)
+
+        def stopped() -> bool:
+            return node_id not in daemons or daemons[node_id].stopped
+        self.supervisor.watch(name, lambda: daemons.get(node_id),
+                              restart=restart, policy=self.restart_policy,
+                              stopped=stopped)
 
     def add_baker(self,
                   node_id: int,
                   account: str,
                   proto: str,
                   params: List[str] = None,
-                  branch: str = "") -> None:
+                  branch: str = "",
+                  signer: RemoteSigner = None,
+                  wait_ready: bool = False) -> None:
         """
         Add a baker associated to a node.
 
@@ -333,6 +609,12 @@ class Sandbox:
                          use. E.g. 'alpha` for `tezos-baker-alpha`.
             params (list): additional parameters
             branch (str): see branch parameter for `add_node()`
+            signer (RemoteSigner): if set, the baker signs with the keys of
+                                   this signer, over HTTP
+            wait_ready (bool): wait (up to `baker.READY_TIMEOUT`) until the
+                               baker is ready, i.e. its node is bootstrapped
+                               (otherwise, only check that it didn't exit
+                               at startup)
         """
         assert node_id in self.nodes, f'No node running with id={node_id}'
         if proto not in self.bakers:
@@ -345,24 +627,37 @@ class Sandbox:
         rpc_node = node.rpc_port
 
         log_file = None
-        if self.log_dir:
+        log_writer = self._log_writer(f'baker {proto} {node_id}')
+        if self.log_dir and log_writer is None:
             log_file = (f'{self.log_dir}/baker-{proto}_{node_id}_#'
                         f'{self.counter}.txt')
             self.logs.append(log_file)
             self.counter += 1
 
-        baker = Baker(baker_path, rpc_node, client.base_dir, node.node_dir,
-                      account, params=params, log_file=log_file)
-        time.sleep(0.1)
-        assert baker.poll() is None, 'seems baker failed at startup'
+        base_dir = client.base_dir
+        if signer is not None:
+            base_dir = self._remote_signer_base_dir(client, signer, branch)
+        start = functools.partial(Baker, baker_path, rpc_node, base_dir,
+                                  node.node_dir, account, params=params,
+                                  log_file=log_file, log_writer=log_writer)
+        baker = start()
+        if wait_ready:
+            self._wait_daemon_ready(baker, f'baker {proto} of node {node_id}')
+        else:
+            time.sleep(0.1)
+            assert baker.poll() is None, 'seems baker failed at startup'
         self.bakers[proto][node_id] = baker
+        self._supervise(f'baker {proto} {node_id}', self.bakers[proto],
+                        node_id, start)
 
     def add_endorser(self,
                      node_id: int,
                      account: str,
                      proto: str,
                      endorsement_delay: float = 0.,
-                     branch: str = "") -> None:
+                     branch: str = "",
+                     signer: RemoteSigner = None,
+                     wait_ready: bool = False) -> None:
         """
         Add an endorser associated to a node.
 
@@ -373,6 +668,12 @@ class Sandbox:
                          use. E.g. 'alpha` for `tezos-endorser-alpha`.
             params (list): additional parameters
             branch (str): see branch parameter for `add_node()`
+            signer (RemoteSigner): if set, the endorser signs with the keys
+                                   of this signer, over HTTP
+            wait_ready (bool): wait (up to `endorser.READY_TIMEOUT`) until
+                               the endorser is ready
+                               (otherwise, only check that it didn't exit
+                               at startup)
         """
         assert node_id in self.nodes, f'No node running with id={node_id}'
         if proto not in self.endorsers:
@@ -389,28 +690,42 @@ class Sandbox:
         rpc_node = node.rpc_port
 
         log_file = None
-        if self.log_dir:
+        log_writer = self._log_writer(f'endorser {proto} {node_id}')
+        if self.log_dir and log_writer is None:
             log_file = (f'{self.log_dir}/endorser-{proto}_{node_id}_#'
                         f'{self.counter}.txt')
             self.logs.append(log_file)
             self.counter += 1
         params = (['run'] + account_param +
                   ['--endorsement-delay', str(endorsement_delay)])
-        endorser = Endorser(endorser_path, rpc_node, client.base_dir,
-                            params=params, log_file=log_file)
-        time.sleep(0.1)
-        assert endorser.poll() is None, 'seems endorser failed at startup'
+        base_dir = client.base_dir
+        if signer is not None:
+            base_dir = self._remote_signer_base_dir(client, signer, branch)
+        start = functools.partial(Endorser, endorser_path, rpc_node,
+                                  base_dir, params=params, log_file=log_file,
+                                  log_writer=log_writer)
+        endorser = start()
+        if wait_ready:
+            self._wait_daemon_ready(endorser,
+                                    f'endorser {proto} of node {node_id}')
+        else:
+            time.sleep(0.1)
+            assert endorser.poll() is None, 'seems endorser failed at startup'
         self.endorsers[proto][node_id] = endorser
+        self._supervise(f'endorser {proto} {node_id}', self.endorsers[proto],
+                        node_id, start)
 
     def rm_baker(self, node_id: int, proto: str) -> None:
         """Kill baker for given node_id and proto"""
         baker = self.bakers[proto][node_id]
+        self.supervisor.unwatch(f'baker {proto} {node_id}')
         del self.bakers[proto][node_id]
         baker.terminate_or_kill()
 
     def rm_endorser(self, node_id: int, proto: str) -> None:
         """Kill endorser for given node_id and proto"""
         endorser = self.bakers[proto][node_id]
+        self.supervisor.unwatch(f'endorser {proto} {node_id}')
         del self.endorsers[proto][node_id]
         endorser.terminate_or_kill()
 
@@ -419,17 +734,24 @@ class Sandbox:
         error_msg = f"Client {client_id} wasn't registered"
         assert client_id in self.clients, error_msg
         self.clients[client_id].cleanup()
+        if self.storage is not None:
+            self.storage.remove(self.clients[client_id].base_dir)
         del self.clients[client_id]
 
     def rm_node(self, node_id: int) -> None:
         """Kill/cleanup node for given node_id. Also delete corresponding
            client if was created."""
         node = self.nodes[node_id]
+        self.supervisor.unwatch(f'node {node_id}')
         del self.nodes[node_id]
+        self._proxied_peers.pop(node_id, None)
+        self._trusting.discard(node_id)
         if node_id in self.clients:
             self.rm_client(node_id)
         node.terminate_or_kill()
         node.cleanup()
+        if self.storage is not None:
+            self.storage.remove(node.node_dir)
 
     def client(self, node_id: int) -> Client:
         """ Returns client for node node_id """
@@ -448,6 +770,19 @@ class Sandbox:
            (no particular order)."""
         return list(self.clients.values())
 
+    def ready_latencies(self) -> Dict[str, List[float]]:
+        """Time (sec) nodes, bakers and endorsers took to become ready"""
+        latencies = {'node': [node.ready_latency
+                              for node in self.nodes.values()],
+                     'baker': [baker.ready_latency
+                               for bakers in self.bakers.values()
+                               for baker in bakers.values()],
+                     'endorser': [endorser.ready_latency
+                                  for endorsers in self.endorsers.values()
+                                  for endorser in endorsers.values()]}
+        return {kind: [latency for latency in values if latency is not None]
+                for kind, values in latencies.items()}
+
     def all_nodes(self) -> List[Node]:
         """ Returns the list of all active nodes (no particular order)."""
         return list(self.nodes.values())
@@ -455,19 +790,65 @@ class Sandbox:
     def __exit__(self, *exc):
         self.cleanup()
 
-    def cleanup(self):
-        """Kill all daemons and cleanup temp dirs."""
-        for node in self.nodes.values():
-            node.terminate_or_kill()
-            node.cleanup()
-        for proto in self.bakers:
-            for baker in self.bakers[proto].values():
-                baker.terminate_or_kill()
-        for proto in self.endorsers:
-            for endorser in self.endorsers[proto].values():
-                endorser.terminate_or_kill()
-        for client in self.clients.values():
-            client.cleanup()
+    def _processes(self) -> Dict[str, subprocess.Popen]:
+        """Processes of nodes and daemons, by name"""
+        processes = {}  # type: Dict[str, subprocess.Popen]
+        for node_id, node in self.nodes.items():
+            if node.process is not None:
+                processes[f'node {node_id}'] = node.process
+        for proto, bakers in self.bakers.items():
+            for node_id, baker in bakers.items():
+                processes[f'baker {proto} {node_id}'] = baker
+        for proto, endorsers in self.endorsers.items():
+            for node_id, endorser in endorsers.items():
+                processes[f'endorser {proto} {node_id}'] = endorser
+        return processes
+
+    def _monitored(self) -> Targets:
+        with self._lock:
+            processes = self._processes()
+            node_dirs = {f'node {node_id}': node.node_dir
+                         for node_id, node in self.nodes.items()}
+        return {name: (process.pid, node_dirs.get(name))
+                for name, process in processes.items()
+                if process.poll() is None}
+
+    def cleanup(self, timeout: float = TERM_TIMEOUT) -> None:
+        """Kill all daemons and cleanup temp dirs.
+
+        All processes are terminated at once, and killed if still running
+        after `timeout` seconds. Temp dirs are then removed concurrently.
+        The durations of both steps are stored in `teardown_report`."""
+        self.supervisor.stop()
+        if self.monitor is not None:
+            self.monitor.stop()
+        stop = teardown.stop_all(self._processes(), timeout)
+        if self.proxy is not None:
+            self.proxy.stop()
+        if self.log_store is not None:
+            self.log_store.flush()
+        start = time.time()
+        removals = ([node.cleanup for node in self.nodes.values()] +
+                    [client.cleanup for client in self.clients.values()] +
+                    [functools.partial(shutil.rmtree, base_dir,
+                                       ignore_errors=True)
+                     for base_dir in self.daemon_dirs])
+        if self.storage is not None:
+            removals += [functools.partial(self.storage.remove, path)
+                         for path in self._dirs()]
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            for removal in [executor.submit(remove) for remove in removals]:
+                removal.result()
+        if self.ports is not None and self._ports_base is not None:
+            self.ports.release(self._ports_base)
+            self._ports_base = None
+        self.teardown_report = TeardownReport(stop.stopped, stop.killed,
+                                              stop.duration,
+                                              time.time() - start)
+
+    def _dirs(self) -> List[str]:
+        return ([node.node_dir for node in self.nodes.values()] +
+                [client.base_dir for client in self.clients.values()])
 
     def are_daemons_alive(self) -> bool:
         """ Returns True iff all started daemons/nodes are still alive.
@@ -522,7 +903,8 @@ class SandboxMultiBranch(Sandbox):
                  p2p: int = 19730,
                  num_peers: int = 45,
                  log_dir: str = None,
-                 singleprocess: bool = False):
+                 singleprocess: bool = False,
+                 ports: PortAllocator = None):
         """Same semantics as Sandbox class, plus a `branch_map` parameter"""
         super().__init__(binaries_path,
                          identities,
@@ -530,7 +912,8 @@ class SandboxMultiBranch(Sandbox):
                          p2p,
                          num_peers,
                          log_dir,
-                         singleprocess)
+                         singleprocess,
+                         ports=ports)
         self._branch_map = branch_map
         for branch in list(branch_map.values()):
             error_msg = f'{binaries_path}/{branch} not a dir'
@@ -541,21 +924,26 @@ class SandboxMultiBranch(Sandbox):
                   account: str,
                   proto: str,
                   params: List[str] = None,
-                  branch: str = "") -> None:
+                  branch: str = "",
+                  signer: RemoteSigner = None,
+                  wait_ready: bool = False) -> None:
         """branch is overridden by branch_map"""
         branch = self._branch_map[node_id]
-        super().add_baker(node_id, account, proto, params, branch)
+        super().add_baker(node_id, account, proto, params, branch, signer,
+                          wait_ready)
 
     def add_endorser(self,
                      node_id: int,
                      account: str,
                      proto: str,
                      endorsement_delay: float = 0.,
-                     branch: str = "") -> None:
+                     branch: str = "",
+                     signer: RemoteSigner = None,
+                     wait_ready: bool = False) -> None:
         """branchs is overridden by branch_map"""
         branch = self._branch_map[node_id]
         super().add_endorser(node_id, account, proto, endorsement_delay,
-                             branch)
+                             branch, signer, wait_ready)
 
     def add_node(self,
                  node_id: int,
@@ -570,9 +958,10 @@ class SandboxMultiBranch(Sandbox):
                  reconstruct: bool = False,
                  branch: str = "",
                  node_config: dict = None,
-                 client_factory: Callable = Client) -> None:
+                 client_factory: Callable = Client,
+                 clone_from: str = None) -> None:
         assert not branch
         branch = self._branch_map[node_id]
         super().add_node(node_id, node_dir, peers, params, log_levels, private,
                          config_client, use_tls, snapshot, reconstruct,
-                         branch, node_config, client_factory)
+                         branch, node_config, client_factory, clone_from)
@@ -0,0 +1,247 @@
+"""Record sandbox scenarios, and replay them as fast as possible.
+
+Exploratory scenarios wait a lot (sleeps, retries) for the network to make
+progress. A `Recorder` wraps a sandbox and writes the timed sequence of
+actions done through it to a trace file:
+
+- sandbox methods (`add_node`, `add_baker`, `rm_node`...),
+- client methods (`bake`, `transfer`, `rpc`...), with the head level of
+  the node of the client when the method was called,
+- node methods (`run`, `terminate`, `kill`...).
+
+`replay` runs the actions of a trace on another sandbox. Instead of
+reproducing waits, each client action is run as soon as the node of the
+client reached the head level recorded for this action, and restarted nodes
+are waited until they answer RPCs. Queries (`get_*`, `rpc('get', ...)`...)
+are skipped by default, as they don't change the network.
+
+Traces are gzipped JSON lines, one action per line. Arguments of recorded
+actions must be JSON values.
+
+Typical use.
+
+    with Recorder(sandbox, 'many_nodes.trace.gz') as recorder:
+        recorder.sandbox.add_node(0, params=constants.NODE_PARAMS)
+        utils.activate_alpha(recorder.sandbox.client(0))
+        ...
+    # later, on a new sandbox
+    print(replay('many_nodes.trace.gz', sandbox))
+"""
+import gzip
+import json
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import requests
+
+from daemons import readiness
+from tools import backoff
+from .sandbox import Sandbox
+
+TRACE_VERSION = 1
+
+# Client methods which don't change the network
+QUERY_PREFIXES = ('get_', 'show_', 'list_', 'check_')
+QUERIES = {'typecheck', 'typecheck_data', 'run_script', 'hash', 'pack',
+           'p2p_stat', 'mempool_is_empty', 'bootstrapped', 'is_bootstrapped',
+           'sync_state', 'wait_for_inclusion', 'expand_macros',
+           'environment_protocol', 'check_node_listening'}
+
+# Methods never recorded
+NOT_RECORDED = {'cleanup', 'poll', 'wait_ready'}
+
+# Time given to a node to reach the level of an action when replaying
+LEVEL_TIMEOUT = 120.
+
+
+def is_query(method: str, args: List[Any]) -> bool:
+    """True iff client method `method` called with `args` is read-only"""
+    if method == 'rpc':
+        return bool(args) and args[0] == 'get'
+    return method in QUERIES or method.startswith(QUERY_PREFIXES)
+
+
+def head_level(sandbox: Sandbox, node_id: int) -> Optional[int]:
+    """Head level of node `node_id`, None if it doesn't answer"""
+    node = sandbox.nodes.get(node_id)
+    if node is None:
+        return None
+    scheme = 'https' if node.use_tls else 'http'
+    try:
+        res = requests.get(f'{scheme}://127.0.0.1:{node.rpc_port}'
+                           '/chains/main/blocks/head/header',
+                           timeout=readiness.PROBE_TIMEOUT, verify=False)
+        res.raise_for_status()
+        return int(res.json()['level'])
+    except (requests.RequestException, KeyError, ValueError):
+        return None
+
+
+class _Proxy:
+    """Forward method calls to `target`, through the recorder"""
+
+    def __init__(self, recorder: 'Recorder', target: Any, kind: str,
+                 node_id: int = None):
+        self._recorder = recorder
+        self._target = target
+        self._kind = kind
+        self._node_id = node_id
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name.startswith('_') or name in NOT_RECORDED or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._recorder.call(self._kind, self._node_id, name,
+                                       attr, args, kwargs)
+        return call
+
+
+class _SandboxProxy(_Proxy):
+    """Clients and nodes returned by the sandbox are recorded too"""
+
+    def client(self, node_id: int) -> _Proxy:
+        return _Proxy(self._recorder, self._target.client(node_id),
+                      'client', node_id)
+
+    def node(self, node_id: int) -> _Proxy:
+        return _Proxy(self._recorder, self._target.node(node_id), 'node',
+                      node_id)
+
+    def all_clients(self) -> List[_Proxy]:
+        return [self.client(node_id)
+                for node_id in sorted(self._target.clients)]
+
+
+class Recorder:
+    """Record actions done through `recorder.sandbox` to a trace file.
+
+    The trace is written by `close()`, the recorder is a context manager.
+    """
+
+    def __init__(self, sandbox: Sandbox, path: str):
+        """
+        Args:
+            sandbox (Sandbox): the recorded sandbox
+            path (str): trace file
+        """
+        self.sandbox = _SandboxProxy(self, sandbox, 'sandbox')
+        self.path = path
+        self.entries = []  # type: List[Dict[str, Any]]
+        self._sandbox = sandbox
+        self._start = time.time()
+
+    def call(self,
+             kind: str,
+             node_id: Optional[int],
+             name: str,
+             method: Callable,
+             args: tuple,
+             kwargs: dict) -> Any:
+        entry = {'kind': kind, 'method': name, 'args': list(args),
+                 'kwargs': kwargs}  # type: Dict[str, Any]
+        # fails early if the action can't be written to the trace
+        json.dumps(entry)
+        if node_id is not None:
+            entry['node'] = node_id
+        if kind == 'client' and node_id is not None:
+            entry['level'] = head_level(self._sandbox, node_id)
+        start = time.time()
+        entry['t'] = round(start - self._start, 3)
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            entry['error'] = True
+            raise
+        finally:
+            entry['duration'] = round(time.time() - start, 3)
+            self.entries.append(entry)
+
+    def close(self) -> None:
+        with gzip.open(self.path, 'wt') as file:
+            file.write(json.dumps({'version': TRACE_VERSION,
+                                   'actions': len(self.entries)}) + '\n')
+            for entry in self.entries:
+                file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path: str) -> List[Dict[str, Any]]:
+    """Actions of trace `path`"""
+    with gzip.open(path, 'rt') as file:
+        header = json.loads(next(file))
+        assert header['version'] == TRACE_VERSION, \
+            f'unsupported trace version {header["version"]}'
+        return [json.loads(line) for line in file]
+
+
+class ReplayReport(NamedTuple):
+    """Outcome of `replay`"""
+    actions: int
+    skipped: int
+    duration: float
+    recorded_duration: float
+
+
+def _wait_level(sandbox: Sandbox, node_id: int, level: int) -> None:
+    node = sandbox.node(node_id)
+    reached = backoff.wait_until(
+        lambda: (head_level(sandbox, node_id) or 0) >= level,
+        lambda: node.poll() is None, LEVEL_TIMEOUT)
+    assert reached, f'node {node_id} did not reach level {level}'
+
+
+def replay(path: str,
+           sandbox: Sandbox,
+           speed: float = None,
+           queries: bool = False) -> ReplayReport:
+    """Run the actions of trace `path` on `sandbox`.
+
+    Args:
+        path (str): trace file, written by a `Recorder`
+        sandbox (Sandbox): sandbox with no node
+        speed (float): if set, actions are run at their recorded time,
+                       divided by `speed`, instead of as soon as possible
+        queries (bool): also run queries
+    Returns:
+        The number of run and skipped actions, the duration of the replay,
+        and the duration of the recorded scenario.
+    """
+    entries = load(path)
+    start = time.time()
+    skipped = 0
+    for entry in entries:
+        # set for client and node actions
+        node_id = entry.get('node', -1)  # type: int
+        if (entry['kind'] == 'client' and not queries and
+                is_query(entry['method'], entry['args'])):
+            skipped += 1
+            continue
+        if speed is not None:
+            time.sleep(max(start + entry['t'] / speed - time.time(), 0))
+        if entry['kind'] == 'sandbox':
+            target = sandbox  # type: Any
+        elif entry['kind'] == 'client':
+            if entry.get('level'):
+                _wait_level(sandbox, node_id, entry['level'])
+            target = sandbox.client(node_id)
+        else:
+            target = sandbox.node(node_id)
+        try:
+            getattr(target, entry['method'])(*entry['args'],
+                                             **entry['kwargs'])
+        except Exception:  # pylint: disable=broad-except
+            if not entry.get('error'):
+                raise
+        if entry['kind'] == 'node' and entry['method'] == 'run':
+            assert target.wait_ready(), f'node {node_id} not ready'
+    recorded = (entries[-1]['t'] + entries[-1]['duration']
+                if entries else 0.)
+    return ReplayReport(len(entries) - skipped, skipped,
+                        time.time() - start, recorded)
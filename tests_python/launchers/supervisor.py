@@ -0,0 +1,255 @@
+"""Watch sandbox processes, report their death at once, restart them.
+
+A `Supervisor` thread waits on all watched processes (with process file
+descriptors on Linux, by polling elsewhere), and publishes a
+`ProcessEvent` to its subscribers as soon as one exits:
+
+- `stop`: the process was stopped on purpose (e.g. `node.terminate()`),
+- `exit`: the process died, `restarting` tells whether it is restarted,
+- `restart`: the process was restarted, after a `RestartPolicy` backoff,
+- `restart_failed`: the restart function raised an exception.
+
+A watched process is given by a callback returning its current `Popen`
+object, so that processes started again (e.g. `node.run()` after
+`node.terminate()`) are followed. `ledger()` gives the uptime, exit codes
+and number of restarts of each watched process.
+
+Typical use.
+
+    supervisor = Supervisor()
+    supervisor.subscribe(print)
+    supervisor.watch('node 0', lambda: node.process,
+                     restart=node.run, stopped=lambda: node.stopped,
+                     policy=RestartPolicy(max_restarts=3))
+    ...
+    supervisor.stop()
+"""
+import os
+import selectors
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Time between two polls of processes when pidfds aren't available
+POLL_INTERVAL = 0.2
+
+
+class RestartPolicy(NamedTuple):
+    """A process is restarted at most `max_restarts` times, after a delay
+    of `backoff * factor ** n` seconds (at most `max_backoff`) for the n-th
+    restart"""
+    max_restarts: int = 3
+    backoff: float = 1.
+    factor: float = 2.
+    max_backoff: float = 30.
+
+    def delay(self, restarts: int) -> float:
+        return min(self.backoff * self.factor ** restarts, self.max_backoff)
+
+
+class ProcessEvent(NamedTuple):
+    """Death or restart of a watched process"""
+    kind: str
+    name: str
+    time: float
+    pid: Optional[int] = None
+    returncode: Optional[int] = None
+    restarting: bool = False
+
+
+class _Watched:
+
+    def __init__(self,
+                 current: Callable[[], Optional[subprocess.Popen]],
+                 restart: Optional[Callable[[], None]],
+                 policy: Optional[RestartPolicy],
+                 stopped: Optional[Callable[[], bool]]):
+        self.current = current
+        self.restart = restart
+        self.policy = policy
+        self.stopped = stopped
+        # last process seen, and whether its exit was handled
+        self.process = None  # type: Optional[subprocess.Popen]
+        self.handled = False
+        self.started_at = None  # type: Optional[float]
+        self.uptime = 0.
+        self.returncodes = []  # type: List[int]
+        self.restarts = 0
+        self.restart_due = None  # type: Optional[float]
+
+
+class Supervisor:
+    """Thread watching processes, see module documentation."""
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.events = []  # type: List[ProcessEvent]
+        self._watched = {}  # type: Dict[str, _Watched]
+        self._subscribers = []  # type: List[Callable[[ProcessEvent], None]]
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._wake_read, self._wake_write = os.pipe()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self,
+              name: str,
+              current: Callable[[], Optional[subprocess.Popen]],
+              restart: Callable[[], None] = None,
+              policy: RestartPolicy = None,
+              stopped: Callable[[], bool] = None) -> None:
+        """Watch a process.
+
+        Args:
+            name (str): name of the process in events and ledger
+            current (Callable): returns the current process (None if not
+                                started)
+            restart (Callable): starts the process again, so that
+                                `current` returns the new process
+            policy (RestartPolicy): if set (and `restart` too), the process
+                                    is restarted when it dies
+            stopped (Callable): returns True if the process was stopped on
+                                purpose
+        """
+        with self._lock:
+            self._watched[name] = _Watched(current, restart, policy, stopped)
+        self._wake()
+
+    def unwatch(self, name: str) -> None:
+        """Stop watching `name`, e.g. before stopping it"""
+        with self._lock:
+            self._watched.pop(name, None)
+        self._wake()
+
+    def subscribe(self, callback: Callable[[ProcessEvent], None]) -> None:
+        """`callback` is called (in the supervisor thread) on each event"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def ledger(self) -> Dict[str, Dict[str, object]]:
+        """Uptime (sec), exit codes and restarts of each watched process"""
+        now = time.time()
+        with self._lock:
+            return {name: {'uptime': watched.uptime + (
+                now - watched.started_at if watched.started_at else 0.),
+                           'returncodes': list(watched.returncodes),
+                           'restarts': watched.restarts}
+                    for name, watched in self._watched.items()}
+
+    def failures(self) -> List[ProcessEvent]:
+        """Unexpected deaths, not followed by a restart"""
+        with self._lock:
+            return [event for event in self.events
+                    if event.kind == 'exit' and not event.restarting]
+
+    def _wake(self) -> None:
+        os.write(self._wake_write, b'.')
+
+    def _publish(self, event: ProcessEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event)
+
+    def _check(self, name: str, watched: _Watched, now: float) -> None:
+        process = watched.current()
+        if process is not watched.process:
+            # (re)started, by us or by the owner of the process
+            watched.process = process
+            watched.handled = False
+            watched.started_at = now if process is not None else None
+        if (process is None or watched.handled or
+                process.poll() is None):
+            return
+        watched.handled = True
+        if watched.started_at is not None:
+            watched.uptime += now - watched.started_at
+            watched.started_at = None
+        watched.returncodes.append(process.returncode)
+        if watched.stopped is not None and watched.stopped():
+            self._publish(ProcessEvent('stop', name, now, process.pid,
+                                       process.returncode))
+            return
+        restarting = (watched.restart is not None and
+                      watched.policy is not None and
+                      watched.restarts < watched.policy.max_restarts)
+        if restarting:
+            assert watched.policy is not None
+            watched.restart_due = now + watched.policy.delay(
+                watched.restarts)
+        self._publish(ProcessEvent('exit', name, now, process.pid,
+                                   process.returncode, restarting))
+
+    def _restart(self, name: str, watched: _Watched, now: float) -> None:
+        watched.restart_due = None
+        watched.restarts += 1
+        assert watched.restart is not None
+        try:
+            watched.restart()
+        except Exception:  # pylint: disable=broad-except
+            self._publish(ProcessEvent('restart_failed', name, now))
+            return
+        process = watched.current()
+        self._publish(ProcessEvent('restart', name, now,
+                                   process.pid if process else None))
+
+    def _wait(self, timeout: float) -> None:
+        """Wait until a watched process exits, `watch`/`unwatch` is called,
+        or for `timeout` seconds"""
+        selector = selectors.DefaultSelector()
+        pidfds = []  # type: List[int]
+        try:
+            selector.register(self._wake_read, selectors.EVENT_READ)
+            if hasattr(os, 'pidfd_open'):
+                with self._lock:
+                    processes = [watched.process
+                                 for watched in self._watched.values()
+                                 if watched.process is not None and
+                                 not watched.handled]
+                for process in processes:
+                    try:
+                        pidfd = os.pidfd_open(process.pid)  # type: ignore
+                    except OSError:
+                        # already reaped, or no pidfd support
+                        timeout = min(timeout, self.poll_interval)
+                        continue
+                    pidfds.append(pidfd)
+                    selector.register(pidfd, selectors.EVENT_READ)
+            else:
+                timeout = min(timeout, self.poll_interval)
+            for key, _ in selector.select(timeout):
+                if key.fd == self._wake_read:
+                    os.read(self._wake_read, 4096)
+        finally:
+            selector.close()
+            for pidfd in pidfds:
+                os.close(pidfd)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                watched = dict(self._watched)
+            for name, entry in watched.items():
+                if entry.restart_due is not None:
+                    if entry.restart_due > now:
+                        continue
+                    self._restart(name, entry, now)
+                self._check(name, entry, time.time())
+            dues = [entry.restart_due for entry in watched.values()
+                    if entry.restart_due is not None]
+            # processes started by their owner aren't known yet
+            timeout = 1.
+            if dues:
+                timeout = min(timeout, max(min(dues) - time.time(), 0))
+            self._wait(timeout)
+
+    def stop(self) -> None:
+        """Stop watching all processes"""
+        self._stop.set()
+        self._wake()
+        self._thread.join()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
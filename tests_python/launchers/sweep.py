@@ -0,0 +1,298 @@
+"""Sweeps of node configurations, each in its own sandbox, in parallel.
+
+Node flags (`--connections`, `--max-latency`, `--bootstrap-threshold`,
+`--history-mode`...) are tuned by running the same scenario under many
+configurations. A `Sweep` runs a scenario once per configuration of a
+parameter grid (the cartesian product of the values of each parameter),
+in isolated sandboxes (ports from a `PortAllocator`, own temp dirs and
+logs), as many at once as the CPU budget allows.
+
+Parameters of the grid are
+
+- node flags, named without dashes (`max_latency` for `--max-latency`),
+  booleans being flags given iff true,
+- `singleprocess`: given to the `Sandbox`,
+- `node_config`: dict merged in the configuration file of nodes.
+
+The scenario is called with a `Run`, whose `add_node` adds nodes with the
+parameters of the configuration, and returns its own metrics (e.g. the
+number of blocks baked). Each run also measures
+
+- `duration` of the scenario, and `<metric>_per_sec` for `THROUGHPUTS`,
+- block propagation delays and validation times, from the logs (see
+  `tools.log_events`),
+- CPU usage, peak memory and writes of all processes (see
+  `launchers.resource_monitor`).
+
+A failing run doesn't stop the sweep, its error is reported instead of
+its metrics.
+
+Typical use.
+
+    def bake(run: Run) -> Dict[str, float]:
+        run.add_node(0)
+        utils.activate_alpha(run.sandbox.client(0))
+        ...
+        return {'blocks': 10}
+
+    grid = {'connections': [10, 100], 'singleprocess': [False, True]}
+    results = Sweep(bake, grid, cpus=8).run()
+    print(table(results))
+"""
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent import futures
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from daemons.log_store import LogStore
+from tools import constants, log_events, paths
+from .port_allocator import PortAllocator
+from .sandbox import Sandbox
+
+Configuration = Dict[str, Any]
+
+# Parameters of a configuration which aren't node flags
+SANDBOX_PARAMS = ('singleprocess', 'node_config')
+
+# Metrics of scenarios turned into rates
+THROUGHPUTS = ('blocks', 'operations', 'transfers')
+
+# Default CPUs used by one run
+CPUS_PER_RUN = 2.
+
+# Max number of nodes of a run
+NUM_PEERS = 20
+
+MONITOR_INTERVAL = 0.5
+
+
+def configurations(grid: Dict[str, List[Any]]) -> List[Configuration]:
+    """Cartesian product of the values of each parameter of `grid`"""
+    names = sorted(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def node_params(config: Configuration) -> List[str]:
+    """Node flags of a configuration"""
+    params = []  # type: List[str]
+    for name, value in sorted(config.items()):
+        if name in SANDBOX_PARAMS:
+            continue
+        flag = '--' + name.replace('_', '-')
+        if isinstance(value, bool):
+            if value:
+                params.append(flag)
+        else:
+            params += [flag, str(value)]
+    return params
+
+
+def describe(config: Configuration) -> str:
+    """Short description of a configuration"""
+    return ' '.join(f'{key}={value}' for key, value in sorted(config.items()))
+
+
+class Run:
+    """A scenario under one configuration"""
+
+    def __init__(self, sandbox: Sandbox, config: Configuration):
+        self.sandbox = sandbox
+        self.config = config
+
+    def params(self, params: List[str] = None) -> List[str]:
+        """`params` and flags of the configuration, which replace the same
+        flags of `params`"""
+        config_params = node_params(self.config)
+        flags = {param for param in config_params if param.startswith('--')}
+        result = []  # type: List[str]
+        skip = False
+        for param in params or []:
+            if param.startswith('--'):
+                skip = param in flags
+            if not skip:
+                result.append(param)
+        return result + config_params
+
+    def add_node(self, node_id: int, params: List[str] = None,
+                 **kwargs) -> None:
+        """`Sandbox.add_node` with the configuration, see `params`. Logged
+        events include the ones of `tools.log_events`."""
+        log_levels = dict(log_events.LOG_LEVELS,
+                          **kwargs.pop('log_levels', {}))
+        node_config = self.config.get('node_config')
+        if node_config is not None:
+            kwargs['node_config'] = dict(kwargs.get('node_config') or {},
+                                         **node_config)
+        self.sandbox.add_node(node_id, params=self.params(params),
+                              log_levels=log_levels, **kwargs)
+
+
+Scenario = Callable[[Run], Dict[str, float]]
+
+
+class RunResult(NamedTuple):
+    """Metrics of a scenario under `config`, or why it failed"""
+    config: Configuration
+    metrics: Dict[str, float]
+    error: Optional[str] = None
+
+
+def _resources(sandbox: Sandbox, since: float) -> Dict[str, float]:
+    """Resources used by all processes of `sandbox` since `since`"""
+    if sandbox.monitor is None:
+        return {}
+    summaries = sandbox.monitor.summary(since=since).values()
+    return {'cpu_percent': sum(summary.get('cpu_percent', 0.)
+                               for summary in summaries),
+            'rss_peak': sum(summary.get('rss_peak', 0.)
+                            for summary in summaries),
+            'write_bytes': sum(summary.get('write_bytes_peak', 0.)
+                               for summary in summaries)}
+
+
+def _latencies(store: LogStore, since: float) -> Dict[str, float]:
+    """Block propagation delays and validation times since `since`"""
+    events = log_events.from_store(store, since=since)
+    metrics = {}  # type: Dict[str, float]
+    delays = list(events.propagation_delays().values())
+    if delays:
+        metrics['propagation_mean'] = sum(delays) / len(delays)
+        metrics['propagation_max'] = max(delays)
+    durations = [duration for duration in
+                 events.select('block_validated').column('duration')
+                 if duration is not None]
+    if durations:
+        metrics['validation_mean'] = sum(durations) / len(durations)
+    return metrics
+
+
+class Sweep:
+    """Run a scenario under configurations, see module documentation."""
+
+    def __init__(self,
+                 scenario: Scenario,
+                 grid: Dict[str, List[Any]],
+                 cpus: float = None,
+                 cpus_per_run: float = CPUS_PER_RUN,
+                 ports: PortAllocator = None,
+                 binaries_path: str = paths.TEZOS_HOME,
+                 monitor_interval: float = MONITOR_INTERVAL):
+        """
+        Args:
+            scenario (Callable): called with the `Run` of a configuration,
+                                 returns its metrics
+            grid (dict): values of each parameter
+            cpus (float): CPU budget, by default all CPUs
+            cpus_per_run (float): CPUs used by one run, e.g. the number of
+                                  nodes and daemons it runs
+            ports (PortAllocator): allocator of the ports of sandboxes
+            binaries_path (str): see `Sandbox`
+            monitor_interval (float): sampling period of resources
+        """
+        if cpus is None:
+            cpus = os.cpu_count() or 1
+        self.scenario = scenario
+        self.configs = configurations(grid)
+        self.workers = max(1, int(cpus // cpus_per_run))
+        self.ports = PortAllocator() if ports is None else ports
+        self.binaries_path = binaries_path
+        self.monitor_interval = monitor_interval
+
+    def run_one(self, config: Configuration) -> RunResult:
+        """Run the scenario under `config`, in a new sandbox"""
+        log_dir = tempfile.mkdtemp(prefix='tezos-sweep.')
+        store = LogStore(log_dir, compression=None)
+        try:
+            with Sandbox(self.binaries_path, constants.IDENTITIES,
+                         num_peers=NUM_PEERS, ports=self.ports,
+                         singleprocess=config.get('singleprocess', False),
+                         monitor_interval=self.monitor_interval,
+                         log_store=store) as sandbox:
+                start = time.time()
+                metrics = dict(self.scenario(Run(sandbox, config)))
+                duration = time.time() - start
+                metrics['duration'] = duration
+                for metric in THROUGHPUTS:
+                    if metric in metrics and duration:
+                        metrics[f'{metric}_per_sec'] = (metrics[metric] /
+                                                        duration)
+                metrics.update(_resources(sandbox, start))
+            metrics.update(_latencies(store, start))
+            return RunResult(config, metrics)
+        except Exception:  # pylint: disable=broad-except
+            return RunResult(config, {}, traceback.format_exc(limit=3))
+        finally:
+            store.close()
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+    def run(self,
+            callback: Callable[[RunResult], Any] = None) -> List[RunResult]:
+        """Run all configurations, `workers` at a time. Returns results in
+        the order of configurations, `callback` is called with each result
+        as soon as available."""
+        results = {}  # type: Dict[int, RunResult]
+        with futures.ThreadPoolExecutor(self.workers) as executor:
+            pending = {executor.submit(self.run_one, config): index
+                       for index, config in enumerate(self.configs)}
+            for future in futures.as_completed(pending):
+                results[pending[future]] = future.result()
+                if callback is not None:
+                    callback(future.result())
+        return [results[index] for index in range(len(self.configs))]
+
+
+def _columns(results: List[RunResult]) -> List[str]:
+    columns = []  # type: List[str]
+    for result in results:
+        columns += [metric for metric in result.metrics
+                    if metric not in columns]
+    return columns
+
+
+def table(results: List[RunResult], metrics: List[str] = None) -> str:
+    """Text table comparing `metrics` (by default all) of results, one row
+    per configuration"""
+    columns = _columns(results) if metrics is None else metrics
+    rows = [['configuration'] + columns]
+    # errors of failed rows, by index, which don't widen the columns
+    errors = {}  # type: Dict[int, str]
+    for result in results:
+        if result.error is not None:
+            error = result.error.strip().splitlines()[-1]
+            errors[len(rows)] = f'failed: {error}'
+            rows.append([describe(result.config)])
+            continue
+        rows.append([describe(result.config)] +
+                    [f'{result.metrics[metric]:.6g}'
+                     if metric in result.metrics else '-'
+                     for metric in columns])
+    widths = [max(len(row[index]) for row in rows if index < len(row))
+              for index in range(len(rows[0]))]
+    lines = []
+    for index, row in enumerate(rows):
+        cells = [cell.ljust(width) for cell, width in zip(row, widths)]
+        if index in errors:
+            cells.append(errors[index])
+        lines.append('  '.join(cells).rstrip())
+    return '\n'.join(lines)
+
+
+def to_csv(results: List[RunResult], path: str) -> None:
+    """Write one row per configuration: parameters, metrics and error"""
+    parameters = sorted({key for result in results for key in result.config})
+    columns = _columns(results)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(parameters + columns + ['error'])
+        for result in results:
+            writer.writerow([result.config.get(key, '')
+                             for key in parameters] +
+                            [result.metrics.get(metric, '')
+                             for metric in columns] +
+                            [result.error or ''])
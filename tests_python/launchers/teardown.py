@@ -0,0 +1,112 @@
+"""Stop many processes at once, within a single deadline.
+
+Stopping processes one by one with `terminate_or_kill` waits up to
+`TERM_TIMEOUT` seconds per process. `stop_all` sends SIGTERM to all
+processes first, waits for all of them together, and sends SIGKILL to the
+processes still running at the (shared) deadline.
+
+On Linux, processes are waited on with process file descriptors
+(`os.pidfd_open`) and a selector, so that `stop_all` returns as soon as the
+last process exits. Elsewhere, processes are polled with an exponential
+backoff.
+
+Typical use.
+
+    report = stop_all({'node 0': node.process, 'baker 0': baker},
+                      timeout=10)
+    print(report.killed)
+"""
+import os
+import selectors
+import subprocess
+import time
+from typing import Dict, List, NamedTuple
+
+# Delays between two polls when pidfds aren't available
+_INITIAL_DELAY = 0.01
+_MAX_DELAY = 0.2
+
+
+class StopReport(NamedTuple):
+    """Outcome of `stop_all`"""
+    stopped: int
+    killed: List[str]
+    duration: float
+
+
+def _wait_pidfds(processes: Dict[str, subprocess.Popen],
+                 deadline: float) -> None:
+    selector = selectors.DefaultSelector()
+    try:
+        for name, process in processes.items():
+            try:
+                fd = os.pidfd_open(process.pid)  # type: ignore
+            except ProcessLookupError:
+                continue
+            selector.register(fd, selectors.EVENT_READ, name)
+        while selector.get_map():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            for key, _ in selector.select(remaining):
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                # reaps the process
+                processes[key.data].poll()
+    finally:
+        for key in list(selector.get_map().values()):
+            os.close(key.fd)
+        selector.close()
+
+
+def _wait_polling(processes: Dict[str, subprocess.Popen],
+                  deadline: float) -> None:
+    delay = _INITIAL_DELAY
+    while any(process.poll() is None for process in processes.values()):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(delay, remaining))
+        delay = min(2 * delay, _MAX_DELAY)
+
+
+def wait_all(processes: Dict[str, subprocess.Popen], timeout: float) -> None:
+    """Wait until all `processes` exited, or for `timeout` seconds"""
+    deadline = time.time() + timeout
+    running = {name: process for name, process in processes.items()
+               if process.poll() is None}
+    if hasattr(os, 'pidfd_open'):
+        try:
+            _wait_pidfds(running, deadline)
+            return
+        except OSError:
+            # e.g. kernel older than 5.3
+            pass
+    _wait_polling(running, deadline)
+
+
+def stop_all(processes: Dict[str, subprocess.Popen],
+             timeout: float) -> StopReport:
+    """Terminate all `processes` (SIGTERM), and kill them (SIGKILL) if
+    they are still running after `timeout` seconds.
+
+    Args:
+        processes (dict): processes, by name (used in the report)
+        timeout (float): time (sec) given to all processes to terminate
+    Returns:
+        The number of stopped processes, the names of the killed ones, and
+        the time spent.
+    """
+    start = time.time()
+    running = {name: process for name, process in processes.items()
+               if process.poll() is None}
+    for process in running.values():
+        process.terminate()
+    wait_all(running, timeout)
+    killed = [name for name, process in running.items()
+              if process.poll() is None]
+    for name in killed:
+        running[name].kill()
+    for name in killed:
+        running[name].wait()
+    return StopReport(len(running), killed, time.time() - start)
@@ -0,0 +1,138 @@
+"""Network topologies of sandbox nodes.
+
+By default, every node of a `Sandbox` is given all other nodes as trusted
+peers, which makes a full mesh. A topology maps each node id to its
+neighbors instead (it is undirected: a node is a neighbor of each of its
+neighbors). Use `Sandbox.add_topology` to add the nodes of a topology, each
+node being given its neighbors as peers and a connection limit matching
+its degree.
+
+Typical use.
+
+    sandbox.add_topology(topology.k_regular(range(100), 4, seed=1),
+                         params=constants.NODE_PARAMS)
+"""
+import random
+from typing import Dict, Iterable, List, Set
+
+Topology = Dict[int, List[int]]
+
+
+def _from_edges(node_ids: List[int], edges: Set[frozenset]) -> Topology:
+    neighbors = {}  # type: Dict[int, Set[int]]
+    for node_id in node_ids:
+        neighbors[node_id] = set()
+    for edge in edges:
+        first, second = tuple(edge)
+        neighbors[first].add(second)
+        neighbors[second].add(first)
+    return {node_id: sorted(peers) for node_id, peers in neighbors.items()}
+
+
+def line(node_ids: Iterable[int]) -> Topology:
+    """Each node is connected to the previous and the next one"""
+    ids = list(node_ids)
+    return _from_edges(ids, {frozenset(pair) for pair in zip(ids, ids[1:])})
+
+
+def ring(node_ids: Iterable[int]) -> Topology:
+    """A line whose ends are connected"""
+    ids = list(node_ids)
+    edges = {frozenset(pair) for pair in zip(ids, ids[1:] + ids[:1])
+             if pair[0] != pair[1]}
+    return _from_edges(ids, edges)
+
+
+def star(node_ids: Iterable[int], center: int = None) -> Topology:
+    """All nodes are connected to `center` (by default, the first node)"""
+    ids = list(node_ids)
+    if center is None:
+        center = ids[0]
+    assert center in ids, f'{center} not in topology'
+    return _from_edges(ids, {frozenset((center, node_id))
+                             for node_id in ids if node_id != center})
+
+
+def k_regular(node_ids: Iterable[int],
+              degree: int,
+              seed: int = None) -> Topology:
+    """Random connected graph where each node has `degree` neighbors.
+
+    Built from a ring (which makes it connected), plus random perfect
+    matchings until all nodes have `degree` neighbors. `degree` must be
+    even if the number of nodes is odd.
+    """
+    ids = list(node_ids)
+    assert 2 <= degree < len(ids), f'invalid degree {degree}'
+    assert (len(ids) * degree) % 2 == 0, 'odd number of nodes and degree'
+    rand = random.Random(seed)
+    for _ in range(1000):
+        edges = {frozenset(pair) for pair in zip(ids, ids[1:] + ids[:1])}
+        for _ in range(degree - 2):
+            free = [node_id for node_id in ids
+                    if sum(node_id in edge for edge in edges) < degree]
+            rand.shuffle(free)
+            for first, second in zip(free[::2], free[1::2]):
+                edges.add(frozenset((first, second)))
+        topology = _from_edges(ids, edges)
+        if all(len(peers) == degree for peers in topology.values()):
+            return topology
+    assert False, f'no {degree}-regular graph found'
+
+
+def clustered(node_ids: Iterable[int],
+              num_clusters: int,
+              bridges: int = 1,
+              seed: int = None) -> Topology:
+    """Clusters of fully connected nodes. Clusters make a ring, two
+    consecutive clusters being connected by `bridges` random edges."""
+    ids = list(node_ids)
+    assert 1 <= num_clusters <= len(ids)
+    clusters = [ids[index::num_clusters] for index in range(num_clusters)]
+    edges = {frozenset((first, second))
+             for cluster in clusters
+             for first in cluster for second in cluster if first != second}
+    rand = random.Random(seed)
+    if num_clusters > 1:
+        pairs = list(zip(clusters, clusters[1:] + clusters[:1]))
+        if num_clusters == 2:
+            pairs = pairs[:1]
+        for first, second in pairs:
+            for _ in range(bridges):
+                edges.add(frozenset((rand.choice(first),
+                                     rand.choice(second))))
+    return _from_edges(ids, edges)
+
+
+def is_connected(topology: Topology) -> bool:
+    """True iff all nodes are reachable from any node"""
+    if not topology:
+        return True
+    start = next(iter(topology))
+    seen = {start}
+    todo = [start]
+    while todo:
+        for peer in topology[todo.pop()]:
+            if peer not in seen:
+                seen.add(peer)
+                todo.append(peer)
+    return len(seen) == len(topology)
+
+
+def diameter(topology: Topology) -> int:
+    """Max number of hops between two nodes, for a connected topology"""
+    assert is_connected(topology)
+    result = 0
+    for start in topology:
+        distances = {start: 0}
+        frontier = [start]
+        while frontier:
+            new_frontier = []
+            for node_id in frontier:
+                for peer in topology[node_id]:
+                    if peer not in distances:
+                        distances[peer] = distances[node_id] + 1
+                        new_frontier.append(peer)
+            frontier = new_frontier
+        result = max(result, max(distances.values()))
+    return result
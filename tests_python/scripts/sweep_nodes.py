@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+from launchers.sweep import Run, Sweep, table, to_csv
+from tools import utils
+
+BAKE_ARGS = ['--minimal-timestamp']
+
+# Base parameters of nodes, overridden by the sweep parameters
+NODE_PARAMS = ['--connections', '100', '--bootstrap-threshold', '0']
+
+
+def bake(run: Run, blocks: int, nodes: int) -> Dict[str, float]:
+    """Node 0 bakes `blocks` blocks, validated by all nodes"""
+    for node_id in range(nodes):
+        run.add_node(node_id, params=NODE_PARAMS)
+    client = run.sandbox.client(0)
+    utils.activate_alpha(client)
+    for _ in range(blocks):
+        client.bake('baker1', BAKE_ARGS)
+    for node_id in range(nodes):
+        assert utils.check_level(run.sandbox.client(node_id), blocks + 1)
+    return {'blocks': blocks}
+
+
+def bootstrap(run: Run, blocks: int, nodes: int) -> Dict[str, float]:
+    """Node 0 bakes `blocks` blocks, then `nodes - 1` nodes bootstrap from
+    it. Measures the bootstrap only, whose rate isn't over the duration
+    of the whole scenario."""
+    run.add_node(0, params=NODE_PARAMS)
+    client = run.sandbox.client(0)
+    utils.activate_alpha(client)
+    for _ in range(blocks):
+        client.bake('baker1', BAKE_ARGS)
+    start = time.time()
+    for node_id in range(1, nodes):
+        run.add_node(node_id, params=NODE_PARAMS, config_client=False)
+    for node_id in range(1, nodes):
+        run.sandbox.client(node_id).bootstrapped()
+        assert utils.check_level(run.sandbox.client(node_id), blocks + 1)
+    duration = time.time() - start
+    return {'bootstrap_duration': duration,
+            'bootstrap_blocks_per_sec': blocks * (nodes - 1) / duration}
+
+
+SCENARIOS = {'bake': bake, 'bootstrap': bootstrap}
+
+# grid parameter -> option, type of values
+GRID_OPTIONS = {'connections': int,
+                'max_latency': int,
+                'bootstrap_threshold': int,
+                'history_mode': str}
+
+DESCRIPTION = '''
+Run a scenario in sandboxes, once per configuration of the nodes (all
+combinations of the given values), several sandboxes at once within the
+CPU budget, and print a table comparing the metrics of configurations.
+'''
+
+
+def _values(kind: Callable[[str], Any]) -> Callable[[str], List[Any]]:
+    return lambda values: [kind(value) for value in values.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument('scenario', choices=sorted(SCENARIOS),
+                        help='scenario run under each configuration')
+    for parameter, kind in GRID_OPTIONS.items():
+        option = '--' + parameter.replace('_', '-')
+        parser.add_argument(option, dest=parameter, metavar='VALUES',
+                            help=f'comma-separated values of {option}',
+                            type=_values(kind))
+    parser.add_argument('--singleprocess', choices=['no', 'yes', 'both'],
+                        default='no',
+                        help='run nodes with --singleprocess')
+    parser.add_argument('--blocks', type=int, default=20,
+                        help='blocks baked by the scenario, default=20')
+    parser.add_argument('--nodes', type=int, default=2,
+                        help='nodes of the scenario, default=2')
+    parser.add_argument('--cpus', type=float,
+                        help='CPU budget, default=all CPUs')
+    parser.add_argument('--csv', metavar='FILE',
+                        help='also write results to FILE')
+    args = parser.parse_args()
+
+    grid = {parameter: getattr(args, parameter)
+            for parameter in GRID_OPTIONS
+            if getattr(args, parameter) is not None}
+    grid['singleprocess'] = {'no': [False], 'yes': [True],
+                             'both': [False, True]}[args.singleprocess]
+    scenario = SCENARIOS[args.scenario]
+    sweep = Sweep(lambda run: scenario(run, args.blocks, args.nodes), grid,
+                  cpus=args.cpus, cpus_per_run=args.nodes)
+    print(f'{len(sweep.configs)} configurations, {sweep.workers} at once')
+    results = sweep.run(callback=lambda result: print(
+        f'done: {result.config}' + (' (failed)' if result.error else '')))
+    print(table(results))
+    if args.csv:
+        to_csv(results, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,21 @@ in the test function, and the yielded values is then accessible with this
 parameter.
 """
 import os
+import re
 import tempfile
+import time
 from typing import Optional, Iterator, List
 import pytest
 from pytest_regtest import register_converter_pre, deregister_converter_pre, \
     _std_conversion
+from daemons.identity_pool import IdentityPool
+from launchers.chain_cache import ChainCache
+from launchers.mockup_pool import MockupPool
+from launchers.port_allocator import PortAllocator
+from launchers.ram_storage import RamStorage
 from launchers.sandbox import Sandbox, SandboxMultiBranch
-from tools import constants, paths, utils
+from launchers.supervisor import ProcessEvent
+from tools import constants, durations, paths, utils
 from tools.client_regression import ClientRegression
 from client.client import Client
 from client.client_output import CreateMockupResult
@@ -27,10 +35,23 @@ def sanity_check(request) -> None:
         pytest.exit(1)
 
 
+def _worker_id(config) -> Optional[str]:
+    """Id of the pytest-xdist worker, None if not run by a worker"""
+    workerinput = getattr(config, 'workerinput', None)
+    return None if workerinput is None else workerinput['workerid']
+
+
 @pytest.fixture(scope="session")
 def log_dir(request) -> Iterator[str]:
-    """Retrieve user-provided logging directory on the command line."""
-    yield request.config.getoption("--log-dir")
+    """Retrieve user-provided logging directory on the command line.
+
+    With pytest-xdist, each worker logs in its own subdirectory."""
+    log_dir = request.config.getoption("--log-dir")
+    worker = _worker_id(request.config)
+    if log_dir is not None and worker is not None:
+        log_dir = os.path.join(log_dir, worker)
+        os.makedirs(log_dir, exist_ok=True)
+    yield log_dir
 
 
 @pytest.fixture(scope="session")
@@ -62,6 +83,53 @@ def pytest_runtest_setup(item) -> None:
             pytest.xfail("previous test failed (%s)" % previousfailed.name)
 
 
+_DURATIONS = durations.DurationRecorder()
+
+
+def pytest_runtest_logreport(report) -> None:
+    # with pytest-xdist, the controller receives the reports of workers
+    _DURATIONS.add(report.nodeid, report.duration)
+
+
+def _storage_mode(config) -> str:
+    return 'disk' if config.getoption('--ram-storage') is None else 'ram'
+
+
+def pytest_sessionfinish(session) -> None:
+    if _worker_id(session.config) is None and hasattr(session.config,
+                                                      'cache'):
+        _DURATIONS.save(session.config.cache)
+        _DURATIONS.save(session.config.cache,
+                        durations.storage_key(_storage_mode(session.config)))
+
+
+def pytest_terminal_summary(terminalreporter, config) -> None:
+    """Compare the durations of test classes with the last run using
+    the other storage mode (see `--ram-storage`)"""
+    if not hasattr(config, 'cache'):
+        return
+    mode = _storage_mode(config)
+    other = 'disk' if mode == 'ram' else 'ram'
+    scopes, duration, other_duration = durations.compare(
+        _DURATIONS.durations,
+        durations.load(config.cache, durations.storage_key(other)))
+    if scopes:
+        terminalreporter.write_line(
+            f'{scopes} test classes took {duration:.1f}s with storage on '
+            f'{mode}, {other_duration:.1f}s on {other} (last run)')
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    """With `-n N --dist loadscope`, test classes are given to workers by
+    decreasing recorded duration, see `tools.xdist_scheduling`."""
+    if config.getoption('dist') != 'loadscope':
+        return None
+    # pylint: disable=import-outside-toplevel
+    from tools.xdist_scheduling import make_scheduler
+    return make_scheduler(config, log)
+
+
 def pytest_addoption(parser) -> None:
     parser.addoption(
         "--log-dir", action="store", help="specify log directory"
@@ -70,6 +138,16 @@ def pytest_addoption(parser) -> None:
         "--singleprocess", action='store_true', default=False,
         help="the node validates blocks using only one process,\
         useful for debugging")
+    parser.addoption(
+        "--monitor-resources", action="store", type=float, default=None,
+        metavar="INTERVAL",
+        help="sample resources used by sandbox processes every INTERVAL\
+        seconds, saved for each test in LOG_DIR/resources")
+    parser.addoption(
+        "--ram-storage", action="store", type=float, default=None,
+        metavar="MIB",
+        help="create node and client dirs in RAM (/dev/shm), using at most\
+        MIB MiB, and on disk beyond")
 
 
 DEAD_DAEMONS_WARN = '''
@@ -78,8 +156,54 @@ You can investigate daemon logs by running this test using the
 `--log-dir=LOG_DIR` option.'''
 
 
+def _abort_retries(event: ProcessEvent) -> None:
+    """A test waiting for a dead process fails at once"""
+    if event.kind == 'exit' and not event.restarting:
+        print(f'# {event.name} died, exit code {event.returncode}')
+        utils.RETRIES_ABORTED.set()
+
+
+@pytest.fixture(scope="session")
+def identity_pool() -> Iterator[IdentityPool]:
+    """Node identities generated in advance, shared by test sessions."""
+    pool = IdentityPool()
+    yield pool
+    pool.stop()
+
+
+@pytest.fixture(scope="session")
+def chain_cache() -> Iterator[ChainCache]:
+    """Chains baked from genesis, shared by test sessions."""
+    yield ChainCache()
+
+
+@pytest.fixture(scope="session")
+def port_allocator() -> Iterator[PortAllocator]:
+    """Ports of sandboxes, not used by other sandboxes of the host."""
+    allocator = PortAllocator()
+    yield allocator
+    allocator.release_all()
+
+
+@pytest.fixture(scope="session")
+def storage(request) -> Iterator[Optional[RamStorage]]:
+    """With `--ram-storage`, RAM budget shared by sandboxes."""
+    budget = request.config.getoption("--ram-storage")
+    if budget is None:
+        yield None
+        return
+    storage = RamStorage(int(budget * 1024 ** 2))
+    yield storage
+    print(f'# {storage.report()}')
+
+
 @pytest.fixture(scope="class")
-def sandbox(log_dir: Optional[str], singleprocess: bool) -> Iterator[Sandbox]:
+def sandbox(request,
+            log_dir: Optional[str],
+            singleprocess: bool,
+            identity_pool: IdentityPool,
+            port_allocator: PortAllocator,
+            storage: Optional[RamStorage]) -> Iterator[Sandbox]:
     """Sandboxed network of nodes.
 
     Nodes, bakers and endorsers are added/removed dynamically."""
@@ -88,11 +212,36 @@ def sandbox(log_dir: Optional[str], singleprocess: bool) -> Iterator[Sandbox]:
     with Sandbox(paths.TEZOS_HOME,
                  constants.IDENTITIES,
                  log_dir=log_dir,
-                 singleprocess=singleprocess) as sandbox:
+                 singleprocess=singleprocess,
+                 identity_pool=identity_pool,
+                 ports=port_allocator,
+                 monitor_interval=request.config.getoption(
+                     "--monitor-resources"),
+                 storage=storage) as sandbox:
+        utils.RETRIES_ABORTED.clear()
+        sandbox.supervisor.subscribe(_abort_retries)
         yield sandbox
         assert sandbox.are_daemons_alive(), DEAD_DAEMONS_WARN
 
 
+@pytest.fixture(autouse=True)
+def resources(request, log_dir: Optional[str]) -> Iterator[None]:
+    """With `--monitor-resources`, save the resources used by sandbox
+    processes during each test using a sandbox."""
+    start = time.time()
+    yield
+    if log_dir is None or 'sandbox' not in request.fixturenames:
+        return
+    sandbox = request.getfixturevalue('sandbox')
+    if sandbox.monitor is None:
+        return
+    resources_dir = os.path.join(log_dir, 'resources')
+    os.makedirs(resources_dir, exist_ok=True)
+    name = re.sub(r'[^\w.-]', '_', request.node.nodeid)
+    sandbox.monitor.export(os.path.join(resources_dir, f'{name}.json'),
+                           since=start)
+
+
 @pytest.fixture(scope="class")
 def client(sandbox: Sandbox) -> Iterator[Client]:
     """One node with protocol alpha."""
@@ -161,9 +310,8 @@ def clients(sandbox: Sandbox, request) -> Iterator[List[Client]]:
     """
     assert request.param is not None
     num_nodes = request.param
-    for i in range(num_nodes):
-        # Large number may increases peers connection time
-        sandbox.add_node(i, params=constants.NODE_PARAMS)
+    # Large number may increases peers connection time
+    sandbox.add_nodes(list(range(num_nodes)), params=constants.NODE_PARAMS)
     utils.activate_alpha(sandbox.client(0))
     for i in range(1, num_nodes):
         utils.remember_baker_contracts(sandbox.client(i))
@@ -175,7 +323,8 @@ def clients(sandbox: Sandbox, request) -> Iterator[List[Client]]:
 
 
 @pytest.fixture(scope="class")
-def sandbox_multibranch(log_dir, request) -> Iterator[SandboxMultiBranch]:
+def sandbox_multibranch(log_dir, request,
+                        port_allocator) -> Iterator[SandboxMultiBranch]:
     """Multi-branch sandbox fixture. Parameterized by map of branches.
 
     This fixture is identical to `sandbox` except that each node_id is
@@ -206,7 +355,8 @@ def sandbox_multibranch(log_dir, request) -> Iterator[SandboxMultiBranch]:
                             constants.IDENTITIES,
                             num_peers=num_peers,
                             log_dir=log_dir,
-                            branch_map=branch_map) as sandbox:
+                            branch_map=branch_map,
+                            ports=port_allocator) as sandbox:
         yield sandbox
         # this assertion checks that daemons (baker, endorser, node...) didn't
         # fail unexpected.
@@ -243,6 +393,18 @@ def simple_client():
     client.cleanup()
 
 
+@pytest.fixture(scope="session")
+def mockup_pool() -> Iterator[MockupPool]:
+    """Pool of processes running scripts with mockup clients of protocol
+    alpha, one base dir per process.
+
+    Use this instead of the `client` fixture for tests that only call
+    `run_script`: no node is started, and cases given to `run_many` run
+    in parallel."""
+    with MockupPool(_wrap_path(CLIENT), _wrap_path(CLIENT_ADMIN)) as pool:
+        yield pool
+
+
 @pytest.fixture(params=constants.MOCKUP_PROTOCOLS)
 def mockup_client(request, sandbox: Sandbox) -> Iterator[Client]:
     """
@@ -46,12 +46,20 @@ class TestAllDaemonsWithOperations:
         utils.synchronize(sandbox.all_clients())
         for i in range(1, NUM_NODES):
             utils.remember_baker_contracts(sandbox.client(i))
-        sandbox.add_baker(0, 'baker5', proto=constants.ALPHA_DAEMON)
-        sandbox.add_baker(1, 'baker4', proto=constants.ALPHA_DAEMON)
+        sandbox.add_baker(0, 'baker5', proto=constants.ALPHA_DAEMON,
+                          wait_ready=True)
+        sandbox.add_baker(1, 'baker4', proto=constants.ALPHA_DAEMON,
+                          wait_ready=True)
         sandbox.add_endorser(0, account='baker1', endorsement_delay=1,
-                             proto=constants.ALPHA_DAEMON)
+                             proto=constants.ALPHA_DAEMON, wait_ready=True)
         sandbox.add_endorser(1, account='baker2', endorsement_delay=1,
-                             proto=constants.ALPHA_DAEMON)
+                             proto=constants.ALPHA_DAEMON, wait_ready=True)
+
+    def test_ready_latencies(self, sandbox: Sandbox):
+        latencies = sandbox.ready_latencies()
+        assert len(latencies['node']) == NUM_NODES
+        assert len(latencies['baker']) == 2
+        assert len(latencies['endorser']) == 2
 
     def test_wait_for_alpha(self, sandbox: Sandbox):
         clients = sandbox.all_clients()
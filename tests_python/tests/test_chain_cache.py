@@ -0,0 +1,36 @@
+import pytest
+
+from launchers.chain_cache import ChainCache
+from launchers.sandbox import Sandbox
+from tools import constants, utils
+
+LEVEL = 5
+
+
+@pytest.fixture(scope="class")
+def cache(tmp_path_factory) -> ChainCache:
+    """An empty cache"""
+    return ChainCache(str(tmp_path_factory.mktemp('chain-cache')))
+
+
+@pytest.mark.multinode
+@pytest.mark.incremental
+class TestChainCache:
+    """A chain baked once is cloned in the next nodes"""
+
+    def test_miss(self, sandbox: Sandbox, cache: ChainCache):
+        assert not cache.add_node(sandbox, 0, LEVEL,
+                                  params=constants.NODE_PARAMS)
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert utils.check_level(sandbox.client(0), LEVEL)
+
+    def test_hit(self, sandbox: Sandbox, cache: ChainCache):
+        assert cache.add_node(sandbox, 1, LEVEL, params=constants.NODE_PARAMS)
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert (sandbox.client(1).get_head()['hash'] ==
+                sandbox.client(0).get_head()['hash'])
+
+    def test_bake_on_clone(self, sandbox: Sandbox):
+        sandbox.client(1).bake('baker1', ['--minimal-timestamp'])
+        for client in sandbox.all_clients():
+            assert utils.check_level(client, LEVEL + 1)
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from daemons import clone
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+def _read(path: str) -> str:
+    with open(path) as file:
+        return file.read()
+
+
+@pytest.fixture
+def source(tmpdir) -> str:
+    """A stopped node dir"""
+    path = str(tmpdir.mkdir('source'))
+    _write(os.path.join(path, 'store', 'data.mdb'), 'store')
+    _write(os.path.join(path, 'context', 'pack', 'store.pack'), 'context')
+    _write(os.path.join(path, 'extra', 'file'), 'extra')
+    for name in ['identity.json', 'config.json', 'version.json', 'lock']:
+        _write(os.path.join(path, name), 'source')
+    return path
+
+
+@pytest.fixture
+def dest(tmpdir) -> str:
+    """A node dir after `init_id` and `init_config`"""
+    path = str(tmpdir.mkdir('dest'))
+    for name in ['identity.json', 'config.json', 'version.json']:
+        _write(os.path.join(path, name), 'dest')
+    return path
+
+
+class TestClone:
+    """Clone node dirs, with reflinks or hardlinks"""
+
+    @pytest.mark.parametrize('reflink', [True, False])
+    def test_clone_dir(self, source: str, dest: str, reflink: bool):
+        method = clone.clone_dir(source, dest, reflink=reflink)
+        if not reflink:
+            assert method == clone.HARDLINK
+        assert _read(os.path.join(dest, 'store', 'data.mdb')) == 'store'
+        assert _read(os.path.join(dest, 'context', 'pack',
+                                  'store.pack')) == 'context'
+        assert _read(os.path.join(dest, 'extra', 'file')) == 'extra'
+        # files of the destination node are kept
+        for name in ['identity.json', 'config.json', 'version.json']:
+            assert _read(os.path.join(dest, name)) == 'dest'
+        assert not os.path.exists(os.path.join(dest, 'lock'))
+
+    def test_copy_up(self, source: str, dest: str):
+        clone.clone_dir(source, dest, reflink=False)
+
+        def linked(rel_path: str) -> bool:
+            return os.path.samefile(os.path.join(source, rel_path),
+                                    os.path.join(dest, rel_path))
+        # files written in place by the node are copied, at any depth
+        assert not linked(os.path.join('store', 'data.mdb'))
+        assert not linked(os.path.join('context', 'pack', 'store.pack'))
+        assert linked(os.path.join('extra', 'file'))
+        with open(os.path.join(dest, 'store', 'data.mdb'), 'w') as file:
+            file.write('written by the clone')
+        assert _read(os.path.join(source, 'store', 'data.mdb')) == 'store'
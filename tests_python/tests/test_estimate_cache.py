@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from client.estimate_cache import EstimateCache
+from tools.paths import CONTRACT_PATH
+
+BAKE_ARGS = ['--minimal-timestamp']
+
+
+@pytest.mark.contract
+class TestEstimateCache:
+    """Repeated operations reuse limits estimated by the first one"""
+
+    def test_setup(self, client, session):
+        session['cache'] = EstimateCache()
+        client.estimate_cache = session['cache']
+
+    def test_transfers(self, client, session):
+        for _ in range(3):
+            client.transfer(1, 'bootstrap1', 'bootstrap2')
+            client.bake('baker1', BAKE_ARGS)
+        assert session['cache'].misses == 1
+        assert session['cache'].hits == 2
+
+    def test_calls(self, client, session):
+        contract = os.path.join(CONTRACT_PATH, 'opcodes', 'noop.tz')
+        client.originate('noop', 0, 'bootstrap1', contract,
+                         ['--init', 'Unit', '--burn-cap', '10'])
+        client.bake('baker1', BAKE_ARGS)
+        hits = session['cache'].hits
+        for _ in range(3):
+            client.transfer(0, 'bootstrap1', 'noop', ['--arg', 'Unit'])
+            client.bake('baker1', BAKE_ARGS)
+        assert session['cache'].hits == hits + 2
+
+    def test_explicit_limits(self, client, session):
+        hits = session['cache'].hits
+        misses = session['cache'].misses
+        client.transfer(1, 'bootstrap1', 'bootstrap2',
+                        ['--gas-limit', '10400'])
+        client.bake('baker1', BAKE_ARGS)
+        assert session['cache'].hits == hits
+        assert session['cache'].misses == misses
+
+    def test_teardown(self, client):
+        client.estimate_cache = None
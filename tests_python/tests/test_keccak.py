@@ -7,6 +7,7 @@ import pytest
 
 from Crypto.Hash import keccak
 
+from client.script_runner import ScriptCase
 from tools.paths import OPCODES_CONTRACT_PATH
 
 RANDOM_ITERATIONS = 100
@@ -15,13 +16,17 @@ RANDOM_ITERATIONS = 100
 @pytest.mark.contract
 class TestKeccak:
 
-    def test_keccak(self, client):
+    def test_keccak(self, mockup_pool):
 
         contract = path.join(OPCODES_CONTRACT_PATH, 'keccak.tz')
 
+        cases = []
+        expected = []
         for _ in range(RANDOM_ITERATIONS):
             rand_bytes = getrandbits(256).to_bytes(32, byteorder='little')
             keccak_hash = keccak.new(digest_bits=256).update(rand_bytes)
             arg = f'0x{rand_bytes.hex()}'
-            result = client.run_script(contract, 'None', arg)
-            assert result.storage == f'(Some 0x{keccak_hash.hexdigest()})'
+            cases.append(ScriptCase(contract, 'None', arg))
+            expected.append(f'(Some 0x{keccak_hash.hexdigest()})')
+        for result, storage in zip(mockup_pool.run_many(cases), expected):
+            assert result.storage == storage
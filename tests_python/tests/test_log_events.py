@@ -0,0 +1,35 @@
+import pytest
+from launchers.sandbox import Sandbox
+from tools import constants, log_events, utils
+
+
+@pytest.mark.multinode
+@pytest.mark.incremental
+class TestLogEvents:
+    """Events extracted from node logs describe the propagation of a
+    block"""
+
+    def test_init(self, sandbox: Sandbox):
+        if not sandbox.log_dir:
+            pytest.skip()
+        for node_id in range(2):
+            sandbox.add_node(node_id, params=constants.NODE_PARAMS,
+                             log_levels=log_events.LOG_LEVELS)
+        utils.activate_alpha(sandbox.client(0))
+
+    def test_bake(self, sandbox: Sandbox, session: dict):
+        sandbox.client(0).bake('baker1', ['--minimal-timestamp'])
+        session['head'] = sandbox.client(0).get_head()['hash']
+        assert utils.check_level(sandbox.client(1), 2)
+
+    def test_events(self, sandbox: Sandbox, session: dict):
+        table = log_events.from_files(sandbox.logs)
+        head = session['head']
+        validated = table.select('block_validated', hash=head)
+        assert len(validated) == 2
+        assert all(duration is not None and duration >= 0
+                   for duration in validated.column('duration'))
+        switched = table.select('head_switched', hash=head)
+        assert switched.column('level') == [2, 2]
+        assert len(table.select('peer_connected')) >= 2
+        assert head in table.propagation_delays()
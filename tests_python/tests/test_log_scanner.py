@@ -0,0 +1,61 @@
+import os
+
+from tools.log_scanner import LogScanner
+
+PATTERNS = {'error': r'\[error\]', 'fatal': 'Fatal'}
+
+
+def _write(path: str, text: str, mode: str = 'a') -> None:
+    with open(path, mode) as file:
+        file.write(text)
+
+
+class TestLogScanner:
+    """Incremental scans of growing, truncated and rewritten logs"""
+
+    def test_offsets(self, tmpdir):
+        log = os.path.join(str(tmpdir), 'node0_0.txt')
+        _write(log, 'cmd\n[error] a\nok\n')
+        scanner = LogScanner(PATTERNS)
+        assert scanner.scan([log]) == {'error': 1, 'fatal': 0}
+        # scanned lines aren't counted again
+        assert scanner.scan([log]) == {'error': 1, 'fatal': 0}
+        _write(log, 'Fatal [error] b\n')
+        assert scanner.scan([log]) == {'error': 2, 'fatal': 1}
+        assert [match.line for match in scanner.matches([log], 'error')] == [
+            '[error] a', 'Fatal [error] b']
+
+    def test_partial_line(self, tmpdir):
+        log = os.path.join(str(tmpdir), 'node0_0.txt')
+        _write(log, 'cmd\n[err')
+        scanner = LogScanner(PATTERNS)
+        assert scanner.scan([log])['error'] == 0
+        _write(log, 'or] a')
+        assert scanner.scan([log])['error'] == 0
+        _write(log, '\n')
+        assert scanner.scan([log])['error'] == 1
+        assert scanner.matches([log], 'error')[0].line == '[error] a'
+
+    def test_truncation(self, tmpdir):
+        log = os.path.join(str(tmpdir), 'node0_0.txt')
+        _write(log, 'cmd\n[error] a\n[error] b\n')
+        scanner = LogScanner(PATTERNS)
+        assert scanner.scan([log])['error'] == 2
+        _write(log, 'cmd\nFatal\n', 'w')
+        assert scanner.scan([log]) == {'error': 0, 'fatal': 1}
+
+    def test_rewrite(self, tmpdir):
+        log = os.path.join(str(tmpdir), 'node0_0.txt')
+        _write(log, 'cmd\n[error] a\n')
+        scanner = LogScanner(PATTERNS)
+        assert scanner.scan([log])['error'] == 1
+        inode = os.stat(log).st_ino
+        # a restarted process overwrites its log, with the same header
+        _write(log, 'cmd\nstarted again\nFatal\n', 'w')
+        assert os.stat(log).st_ino == inode
+        assert scanner.scan([log]) == {'error': 0, 'fatal': 1}
+        assert not scanner.matches([log], 'error')
+
+    def test_missing_log(self, tmpdir):
+        log = os.path.join(str(tmpdir), 'missing.txt')
+        assert LogScanner(['error']).scan([log]) == {'error': 0}
@@ -0,0 +1,111 @@
+import os
+import time
+from typing import Iterator
+
+import pytest
+
+from daemons.log_store import LogStore
+from launchers.port_allocator import PortAllocator
+from launchers.sandbox import Sandbox
+from tools import constants, paths, utils
+
+
+@pytest.fixture(scope="class")
+def store(tmp_path_factory) -> Iterator[LogStore]:
+    store = LogStore(str(tmp_path_factory.mktemp('store')),
+                     segment_size=64 * 1024)
+    yield store
+    store.close()
+
+
+@pytest.fixture(scope="class")
+def sandbox(store: LogStore,
+            port_allocator: PortAllocator) -> Iterator[Sandbox]:
+    """Sandbox whose outputs go to `store`"""
+    with Sandbox(paths.TEZOS_HOME, constants.IDENTITIES,
+                 ports=port_allocator, log_store=store) as sandbox:
+        yield sandbox
+
+
+@pytest.mark.baker
+@pytest.mark.incremental
+class TestLogStore:
+    """Outputs of nodes and daemons go to a single store"""
+
+    def test_init(self, sandbox: Sandbox, session: dict):
+        session['start'] = time.time()
+        for node_id in range(2):
+            sandbox.add_node(node_id, params=constants.NODE_PARAMS)
+        utils.activate_alpha(sandbox.client(0))
+        sandbox.add_baker(0, 'baker1', proto=constants.ALPHA_DAEMON)
+
+    def test_sources(self, store: LogStore):
+        assert sorted(store.sources()) == [
+            f'baker {constants.ALPHA_DAEMON} 0', 'node 0', 'node 1']
+
+    def test_query(self, store: LogStore, session: dict):
+        baker = f'baker {constants.ALPHA_DAEMON} 0'
+        started = list(store.query(baker, pattern='Baker started'))
+        assert len(started) == 1
+        assert started[0].time >= session['start']
+        assert not list(store.query(baker, since=time.time() + 60))
+        assert all(record.source == 'node 1'
+                   for record in store.query('node 1'))
+
+    def test_check_logs(self, sandbox: Sandbox, store: LogStore):
+        # outputs don't go to log files
+        assert not sandbox.logs
+        assert utils.check_logs(store, 'Uncaught')
+        assert not utils.check_logs(store, 'Baker started')
+
+
+def _fill(store: LogStore, lines: int, source: str = 'node 0') -> None:
+    for index in range(lines):
+        store.append(source, f'line {index}')
+
+
+class TestLogStoreFiles:
+    """Segments are compressed in the background, and recovered when an
+    unclosed store is reopened"""
+
+    def test_reopen(self, tmp_path):
+        store = LogStore(str(tmp_path), segment_size=256)
+        _fill(store, 100)
+        # closed segments are queryable while being compressed
+        assert len(list(store.query('node 0'))) == 100
+        store.close()
+        assert all(name == 'index.json' or name.endswith('.log.gz')
+                   for name in os.listdir(tmp_path))
+        store = LogStore(str(tmp_path))
+        assert len(list(store.query('node 0'))) == 100
+        store.close()
+
+    def test_recover(self, tmp_path):
+        store = LogStore(str(tmp_path), segment_size=256, compression=None)
+        _fill(store, 100)
+        store.append('node 1', 'last line')
+        store.flush()
+        # the store isn't closed: its current segment isn't indexed
+        orphans = {name for name in os.listdir(tmp_path)
+                   if name.startswith('segment-')}
+        reopened = LogStore(str(tmp_path), segment_size=256,
+                            compression=None)
+        _fill(reopened, 10, 'node 2')
+        # no segment file is overwritten
+        assert orphans <= set(os.listdir(tmp_path))
+        assert len(list(reopened.query('node 0'))) == 100
+        assert [record.line for record in reopened.query('node 1')] == [
+            'last line']
+        assert len(list(reopened.query('node 2'))) == 10
+        reopened.close()
+
+    def test_max_segments(self, tmp_path):
+        store = LogStore(str(tmp_path), segment_size=256, max_segments=2)
+        _fill(store, 100)
+        store.close()
+        segments = [name for name in os.listdir(tmp_path)
+                    if name.startswith('segment-')]
+        assert len(segments) == 2
+        store = LogStore(str(tmp_path))
+        assert list(store.query())
+        store.close()
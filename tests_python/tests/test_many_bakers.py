@@ -16,8 +16,7 @@ class TestManyBakers:
     """Run 5 bakers and num nodes, wait and check logs"""
 
     def test_init(self, sandbox: Sandbox):
-        for i in range(10):
-            sandbox.add_node(i, params=constants.NODE_PARAMS)
+        sandbox.add_nodes(list(range(10)), params=constants.NODE_PARAMS)
         utils.activate_alpha(sandbox.client(0))
         utils.synchronize(sandbox.all_clients())
         for i in range(1, 10):
@@ -1,6 +1,8 @@
 import time
 import pytest
 from tools import utils, constants
+from client.client import Client
+from launchers.chain_cache import ChainCache
 from launchers.sandbox import Sandbox
 
 
@@ -12,21 +14,24 @@ GROUP1 = [0]
 GROUP2 = [3, 4]
 
 
+def bake_and_endorse(client: Client) -> None:
+    client.bake('baker1', BAKE_ARGS)
+    client.endorse('baker2')
+
+
 @pytest.mark.multinode
 @pytest.mark.incremental
 @pytest.mark.snapshot
 @pytest.mark.slow
 class TestMultiNodeSnapshot:
 
-    def test_init(self, sandbox: Sandbox):
-        for i in GROUP1:
+    def test_init(self, sandbox: Sandbox, chain_cache: ChainCache):
+        # bakes up to LEVEL_A, or reuses the chain of a previous run
+        chain_cache.add_node(sandbox, GROUP1[0], LEVEL_A, params=PARAMS,
+                             bake=bake_and_endorse,
+                             recipe='bake_and_endorse')
+        for i in GROUP1[1:]:
             sandbox.add_node(i, params=PARAMS)
-        utils.activate_alpha(sandbox.client(GROUP1[0]))
-
-    def test_bake_group1_level_a(self, sandbox: Sandbox):
-        for _ in range(LEVEL_A - 1):
-            sandbox.client(GROUP1[0]).bake('baker1', BAKE_ARGS)
-            sandbox.client(GROUP1[0]).endorse('baker2')
 
     def test_group1_level_a(self, sandbox: Sandbox, session: dict):
         for i in GROUP1:
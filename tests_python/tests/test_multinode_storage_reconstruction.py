@@ -1,8 +1,8 @@
 import time
-from datetime import datetime, timedelta
 
 import pytest
 
+from launchers.chain_cache import ChainCache
 from launchers.sandbox import Sandbox
 from tools import constants, utils
 
@@ -17,17 +17,15 @@ BATCH = 16
 @pytest.mark.slow
 class TestMultiNodeStorageReconstruction:
 
-    def test_init(self, sandbox: Sandbox):
-        sandbox.add_node(0, params=PARAMS)
+    def test_init(self, sandbox: Sandbox, chain_cache: ChainCache):
         # Allow fast `bake for` by activating the protocol in the past
-        last_hour_date_time = datetime.utcnow() - timedelta(hours=1)
-        timestamp = last_hour_date_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-        utils.activate_alpha(sandbox.client(0), timestamp=timestamp)
+        # bakes up to level BATCH, or reuses the chain of a previous run
+        chain_cache.add_node(
+            sandbox, 0, BATCH, params=PARAMS, activation_offset=3600,
+            bake=lambda client: client.bake('baker1', BAKE_ARGS),
+            recipe=' '.join(['baker1'] + BAKE_ARGS))
 
     def test_bake_node0_level_a(self, sandbox: Sandbox, session: dict):
-        for _ in range(BATCH - 1):
-            sandbox.client(0).bake('baker1', BAKE_ARGS)
-            # time.sleep(2)
         session['head_hash'] = sandbox.client(0).get_head()['hash']
         session['head_level'] = sandbox.client(0).get_head()['header']['level']
 
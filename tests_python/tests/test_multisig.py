@@ -1,7 +1,7 @@
 import pytest
 
 from client.client import Client
-from tools import utils
+from tools import multisig, utils
 
 BAKE_ARGS = ['--max-priority', '512', '--minimal-timestamp']
 
@@ -185,3 +185,69 @@ class TestMultisigFromAddress:
                                     'bootstrap1',
                                     [sig0, sig2])
         client.bake('baker1', BAKE_ARGS)
+
+
+@pytest.mark.incremental
+class TestMultisigLocalSignatures:
+    """Same scenario, signing locally with `tools.multisig`"""
+
+    def test_deploy_multisig(self, client: Client, session: dict):
+        session['keys'] = ['foo', 'bar', 'boo']
+        sigs = [None, 'secp256k1', 'ed25519']
+        for key, sig in zip(session['keys'], sigs):
+            args = [] if sig is None else ['--sig', sig]
+            client.gen_key(key, args)
+        client.deploy_msig('msig', 100, 'bootstrap1', 2, session['keys'],
+                           ['--burn-cap', '100'])
+        client.bake('baker1', BAKE_ARGS)
+        session['msig'] = multisig.Multisig(client, 'msig')
+
+    def test_bytes_to_sign(self, client: Client, session: dict):
+        msig = session['msig']
+        keys = session['keys']
+        expected = client.msig_prepare_transfer('msig', 10, 'bootstrap2',
+                                                ['--bytes-only'])
+        action = multisig.transfer_action(10, msig.resolve('bootstrap2'))
+        assert '0x' + msig.bytes_to_sign(action).hex() == expected
+        expected = client.msig_prepare_set_delegate('msig', 'baker5',
+                                                    ['--bytes-only'])
+        action = multisig.delegate_action(msig.resolve('baker5'))
+        assert '0x' + msig.bytes_to_sign(action).hex() == expected
+        expected = client.msig_prepare_setting_threshold('msig', 2,
+                                                         [keys[0], keys[2]],
+                                                         ['--bytes-only'])
+        action = multisig.keys_action(2, [msig.public_key(keys[0]),
+                                          msig.public_key(keys[2])])
+        assert '0x' + msig.bytes_to_sign(action).hex() == expected
+
+    def test_signatures(self, client: Client, session: dict):
+        msig = session['msig']
+        to_sign = msig.bytes_to_sign(
+            multisig.transfer_action(10, msig.resolve('bootstrap2')))
+        for key, signature in zip(session['keys'],
+                                  msig.signer.sign_all(to_sign,
+                                                       session['keys'])):
+            client.run(['check', 'that', '0x' + to_sign.hex(), 'was',
+                        'signed', 'by', key, 'to', 'produce', signature])
+
+    def test_transfer(self, client: Client, session: dict):
+        session['msig'].transfer(10, 'bootstrap2', 'bootstrap1',
+                                 session['keys'][:2])
+        client.bake('baker1', BAKE_ARGS)
+
+    def test_delegate_change(self, client: Client, session: dict):
+        session['msig'].set_delegate('baker5', 'bootstrap1',
+                                     session['keys'][1:])
+        client.bake('baker1', BAKE_ARGS)
+
+    def test_delegate_withdraw(self, client: Client, session: dict):
+        session['msig'].withdraw_delegate('bootstrap1', session['keys'])
+        client.bake('baker1', BAKE_ARGS)
+
+    def test_change_keys_and_threshold(self, client: Client, session: dict):
+        keys = session['keys']
+        session['msig'].set_keys(2, [keys[0], keys[2]], 'bootstrap1',
+                                 [keys[0], keys[2]])
+        client.bake('baker1', BAKE_ARGS)
+        storage = session['msig'].storage()
+        assert storage['args'][0]['int'] == '4'
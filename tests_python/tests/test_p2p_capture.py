@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+from typing import Iterator
+
+import pytest
+
+from launchers.p2p_capture import Capture, Recording, replay
+from launchers.p2p_proxy import LinkConditions
+from launchers.port_allocator import PortAllocator
+from launchers.sandbox import Sandbox
+from tools import constants, paths, utils
+
+LEVEL = 10
+PARAMS = constants.NODE_PARAMS
+
+
+def _sandbox(port_allocator: PortAllocator) -> Sandbox:
+    return Sandbox(paths.TEZOS_HOME, constants.IDENTITIES,
+                   ports=port_allocator, link_conditions=LinkConditions())
+
+
+@pytest.fixture(scope="class")
+def sandbox(port_allocator: PortAllocator) -> Iterator[Sandbox]:
+    """Sandbox whose P2P traffic is recorded"""
+    with _sandbox(port_allocator) as sandbox:
+        yield sandbox
+
+
+@pytest.fixture(scope="class")
+def directory() -> Iterator[str]:
+    """Directory of the recording, removed after the tests"""
+    path = tempfile.mkdtemp(prefix='tezos-capture.')
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.mark.multinode
+@pytest.mark.incremental
+class TestP2pCapture:
+    """Record the bootstrap of node 1 from node 0, and replay it"""
+
+    def test_init(self, sandbox: Sandbox):
+        sandbox.add_node(0, params=PARAMS)
+        client = sandbox.client(0)
+        utils.activate_alpha(client)
+        for _ in range(LEVEL - 1):
+            client.bake('baker1', ['--minimal-timestamp'])
+
+    def test_capture(self, sandbox: Sandbox, directory: str):
+        assert sandbox.proxy is not None
+        capture = Capture(directory, dests=[1])
+        sandbox.proxy.capture = capture
+        sandbox.add_node(1, params=PARAMS)
+        sandbox.client(1).bootstrapped()
+        assert utils.check_level(sandbox.client(1), LEVEL)
+        capture.save_peers(sandbox, [0])
+        capture.close()
+
+    def test_recording(self, directory: str):
+        recording = Recording(directory)
+        assert recording.peers() == [0]
+        assert recording.levels == {0: LEVEL, 1: LEVEL}
+        assert recording.received(1) > 0
+        assert recording.received(0) == 0
+
+    def test_replay(self, directory: str, port_allocator: PortAllocator):
+        with _sandbox(port_allocator) as sandbox:
+            report = replay(sandbox, directory, 1, params=PARAMS)
+            assert report.level == LEVEL
+            assert report.received
@@ -0,0 +1,107 @@
+import socket
+import threading
+import time
+from typing import Iterator
+
+import pytest
+
+from launchers.p2p_proxy import CHUNK_SIZE, LinkConditions, ProxyNetwork
+from launchers.port_allocator import PortAllocator
+from launchers.sandbox import Sandbox
+from tools import constants, paths, utils
+
+LATENCY = 0.5
+
+# bytes sent through a single proxy
+PAYLOAD = 8 * CHUNK_SIZE
+
+# bytes/sec
+BANDWIDTH = 1e5
+
+
+@pytest.fixture(scope="class")
+def sandbox(port_allocator: PortAllocator) -> Iterator[Sandbox]:
+    """Sandbox whose nodes connect through proxies"""
+    with Sandbox(paths.TEZOS_HOME, constants.IDENTITIES,
+                 ports=port_allocator,
+                 link_conditions=LinkConditions(latency=LATENCY)) as sandbox:
+        yield sandbox
+
+
+@pytest.fixture(scope="class")
+def proxy(sandbox: Sandbox) -> ProxyNetwork:
+    assert sandbox.proxy is not None
+    return sandbox.proxy
+
+
+@pytest.mark.incremental
+class TestP2pProxy:
+    """Blocks propagate through proxies, under their link conditions"""
+
+    def test_init(self, sandbox: Sandbox, proxy: ProxyNetwork):
+        sandbox.add_node(0, params=constants.NODE_PARAMS)
+        sandbox.add_node(1, params=constants.NODE_PARAMS)
+        utils.activate_alpha(sandbox.client(0))
+        assert utils.check_level(sandbox.client(1), 1)
+        # private nodes accept the connections of their proxied peers
+        assert proxy.connections > 0
+
+    def test_propagation(self, sandbox: Sandbox, proxy: ProxyNetwork):
+        start = time.time()
+        sandbox.client(0).bake('baker1', ['--minimal-timestamp'])
+        assert utils.check_level(sandbox.client(1), 2)
+        # at least a round trip to advertise the head and fetch the block
+        assert time.time() - start >= 2 * LATENCY
+        assert proxy.bytes[(0, 1)] > 0
+        assert proxy.bytes[(1, 0)] > 0
+
+    def test_bandwidth(self, sandbox: Sandbox, proxy: ProxyNetwork):
+        proxy.set_default(LinkConditions(bandwidth=BANDWIDTH))
+        before = dict(proxy.bytes)
+        start = time.time()
+        sandbox.client(0).bake('baker1', ['--minimal-timestamp'])
+        assert utils.check_level(sandbox.client(1), 3)
+        elapsed = time.time() - start
+        assert proxy.bytes[(0, 1)] > before[(0, 1)]
+        for direction, count in proxy.bytes.items():
+            # a proxy reads at most one chunk ahead of the cap
+            forwarded = count - before.get(direction, 0)
+            assert forwarded <= BANDWIDTH * elapsed + CHUNK_SIZE, direction
+
+
+def _sink() -> socket.socket:
+    """Listening socket reading connections until they are closed"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+
+    def serve():
+        connection, _ = server.accept()
+        while connection.recv(CHUNK_SIZE):
+            pass
+        connection.close()
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+class TestLinkConditions:
+    """Bytes sent through a single proxy, without nodes"""
+
+    def test_bandwidth(self):
+        server = _sink()
+        proxy = ProxyNetwork(LinkConditions(bandwidth=BANDWIDTH))
+        try:
+            port = proxy.add_link(0, 1, server.getsockname()[1])
+            start = time.time()
+            with socket.create_connection(('127.0.0.1', port)) as client:
+                client.sendall(b'\0' * PAYLOAD)
+                client.shutdown(socket.SHUT_WR)
+                # closed by the proxy once all bytes were delivered
+                client.settimeout(10)
+                assert client.recv(1) == b''
+            elapsed = time.time() - start
+            assert proxy.bytes[(0, 1)] == PAYLOAD
+            assert elapsed >= PAYLOAD / BANDWIDTH
+        finally:
+            proxy.stop()
+            server.close()
@@ -0,0 +1,60 @@
+import pytest
+import requests
+
+from launchers.remote_signer import RemoteSigner
+from launchers.sandbox import Sandbox
+from tools import constants, multisig, utils
+
+BOOTSTRAP1 = constants.IDENTITIES['bootstrap1']
+
+
+@utils.retry(timeout=0.5, attempts=40)
+def check_signed_blocks(signer: RemoteSigner, count: int) -> bool:
+    return signer.latency_stats('block')['count'] >= count
+
+
+@pytest.fixture(scope="class")
+def signer():
+    with RemoteSigner(constants.IDENTITIES, delay=0.05) as res:
+        yield res
+
+
+@pytest.mark.baker
+@pytest.mark.incremental
+class TestRemoteSigner:
+    """Bake and endorse through a local remote signer"""
+
+    def test_protocol(self, signer: RemoteSigner):
+        pkh = BOOTSTRAP1['identity']
+        url = f'http://localhost:{signer.port}/keys/{pkh}'
+        assert requests.get(url).json() == \
+            {'public_key': BOOTSTRAP1['public']}
+        data = bytes([3]) + b'remote signer'
+        res = requests.post(url, json=data.hex()).json()
+        assert res['signature'] == \
+            multisig.local_sign(data, BOOTSTRAP1['secret'])
+        assert signer.latency_stats('generic')['count'] == 1
+        assert signer.latency_stats()['median'] >= signer.delay
+
+    def test_consensus_key(self, signer: RemoteSigner):
+        public = constants.IDENTITIES['baker1_key']['public']
+        pkh = multisig.public_key_hash(public)
+        assert signer.aliases[pkh] == 'baker1_key'
+        url = f'http://localhost:{signer.port}/keys/{pkh}'
+        assert requests.get(url).json() == {'public_key': public}
+
+    def test_init(self, sandbox: Sandbox, signer: RemoteSigner):
+        sandbox.add_node(0, params=constants.NODE_PARAMS)
+        utils.activate_alpha(sandbox.client(0))
+        sandbox.add_baker(0, 'baker1', proto=constants.ALPHA_DAEMON,
+                          signer=signer)
+        sandbox.add_endorser(0, 'baker1', proto=constants.ALPHA_DAEMON,
+                             signer=signer)
+
+    def test_wait(self, signer: RemoteSigner):
+        assert check_signed_blocks(signer, 2)
+
+    def test_progress(self, sandbox: Sandbox, signer: RemoteSigner):
+        assert sandbox.client(0).get_level() >= 3
+        assert signer.latency_stats('block')['count'] >= 2
+        assert sandbox.are_daemons_alive()
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from launchers import resource_monitor
+from launchers.resource_monitor import ResourceMonitor, Series
+
+# samples are taken explicitly, not by the background thread
+INTERVAL = 3600.
+
+
+def _series(cpu_values) -> Series:
+    series = Series()
+    for timestamp, cpu in enumerate(cpu_values):
+        series.append(float(timestamp), {'cpu': cpu, 'rss': 10. * cpu})
+    return series
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self'),
+                    reason='requires /proc')
+class TestResourceMonitor:
+    """Sample the resources of the test process"""
+
+    def test_read_process(self):
+        sample = resource_monitor.read_process(os.getpid())
+        assert sample is not None
+        assert sample['rss'] > 0
+        assert sample['threads'] >= 1
+        assert sample['fds'] >= 3
+        assert sample['cpu'] >= 0
+
+    def test_read_missing_process(self):
+        # pids are below 2^22 on Linux
+        assert resource_monitor.read_process(2 ** 22 + 1) is None
+
+    def test_monitor(self, tmpdir):
+        data_dir = str(tmpdir)
+        with open(os.path.join(data_dir, 'data'), 'wb') as file:
+            file.write(b'\0' * 8192)
+        monitor = ResourceMonitor(
+            lambda: {'test': (os.getpid(), data_dir)}, interval=INTERVAL)
+        try:
+            monitor.sample()
+            monitor.sample()
+        finally:
+            monitor.stop()
+        assert len(monitor.series['test'].times) == 2
+        summary = monitor.summary()['test']
+        assert summary['samples'] == 2
+        assert summary['rss_peak'] > 0
+        assert summary['dir_size_peak'] >= 8192
+        path = os.path.join(data_dir, 'resources.json')
+        monitor.export(path)
+        assert os.path.getsize(path) > 0
+
+
+class TestSeries:
+    """Windows and summaries of series"""
+
+    def test_window(self):
+        series = _series([0., 1., 2., 3.])
+        window = series.window(since=1., until=2.)
+        assert list(window.times) == [1., 2.]
+        assert list(window.values['cpu']) == [1., 2.]
+        assert list(series.window(since=2.).times) == [2., 3.]
+
+    def test_summary(self):
+        summary = _series([0., 1., 2., 4.]).summary()
+        assert summary['samples'] == 4
+        assert summary['cpu_peak'] == 4.
+        assert summary['rss_mean'] == 17.5
+        # 4 sec of CPU in 3 sec
+        assert summary['cpu_percent'] == pytest.approx(400 / 3)
+        assert Series().summary() == {'samples': 0}
@@ -2,6 +2,7 @@ import json
 import re
 import pytest
 from tools import utils, paths
+from tools.sapling_workload import SaplingWorkload
 from tools.utils import assert_run_failure
 
 
@@ -609,3 +610,50 @@ class TestSaplingShieldedTez:
             key_name=key_name,
             contract_name=contract_name).balance
         assert balance == expected_balance
+
+
+@pytest.mark.contract
+@pytest.mark.slow
+@pytest.mark.incremental
+class TestSaplingWorkload:
+    """Concurrent shielded transactions with `tools.sapling_workload`"""
+
+    @pytest.fixture(scope="class")
+    def client(self, sandbox, node):
+        client = sandbox.get_new_client(node)
+        utils.remember_baker_contracts(client)
+        return client
+
+    def test_setup(self, sandbox, node, client, session):
+        contract_path = \
+            f'{paths.TEZOS_HOME}/src/lib_sapling/test/sapling_contract.tz'
+        origination = client.originate(
+            contract_name="sapling_workload", amount=0, sender="bootstrap1",
+            contract=contract_path, args=["--init", "{}", "--burn-cap", "3.0"])
+        client.bake("baker1", ["--minimal-timestamp"])
+
+        def make_client():
+            shard = sandbox.get_new_client(node)
+            utils.remember_baker_contracts(shard)
+            return shard
+        session['workload'] = SaplingWorkload(
+            make_client, "sapling_workload", origination.contract,
+            num_shards=3, fee_payers=['bootstrap2', 'bootstrap3'],
+            baker="baker1")
+
+    def test_fund(self, session):
+        latencies = session['workload'].fund(10.0)
+        assert len(latencies) == 3
+
+    def test_rounds(self, session):
+        workload = session['workload']
+        rounds = [workload.run_round(1.0) for _ in range(2)]
+        for sapling_round in rounds:
+            assert sapling_round.transactions == 3
+            assert len(sapling_round.inclusion_latencies) == 3
+            assert sapling_round.proofs_per_second > 0
+        assert rounds[0].pool_size >= 3
+        assert rounds[1].pool_size > rounds[0].pool_size
+
+    def test_cleanup(self, session):
+        session['workload'].cleanup()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from launchers import scenario
+from launchers.port_allocator import PortAllocator
+from launchers.sandbox import Sandbox
+from tools import constants, paths, utils
+
+
+@pytest.fixture(scope="class")
+def trace_dir():
+    """Temp dir of the recorded trace, removed after the tests"""
+    path = tempfile.mkdtemp(prefix='tezos-scenario.')
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.mark.multinode
+@pytest.mark.incremental
+class TestScenarioReplay:
+    """Record a scenario with waits, and replay it on a new sandbox"""
+
+    def test_record(self, sandbox: Sandbox, session: dict, trace_dir: str):
+        trace = os.path.join(trace_dir, 'scenario.trace.gz')
+        with scenario.Recorder(sandbox, trace) as recorder:
+            recorded = recorder.sandbox
+            recorded.add_node(0, params=constants.NODE_PARAMS)
+            utils.activate_alpha(recorded.client(0))
+            recorded.add_node(1, params=constants.NODE_PARAMS)
+            utils.remember_baker_contracts(recorded.client(1))
+            for _ in range(3):
+                recorded.client(0).bake('baker1', ['--minimal-timestamp'])
+            assert utils.check_level(recorded.client(1), 4)
+            recorded.node(1).terminate_or_kill()
+            recorded.node(1).run()
+            recorded.client(1).bake('baker2', ['--minimal-timestamp'])
+        session['trace'] = trace
+        session['level'] = sandbox.client(0).get_level()
+
+    def test_replay(self, session: dict, port_allocator: PortAllocator):
+        with Sandbox(paths.TEZOS_HOME, constants.IDENTITIES,
+                     ports=port_allocator) as sandbox:
+            report = scenario.replay(session['trace'], sandbox)
+            assert report.skipped > 0
+            assert utils.check_level(sandbox.client(0), session['level'])
@@ -0,0 +1,67 @@
+import subprocess
+from os import path
+
+import pytest
+
+from client.script_runner import RunCodeError, ScriptCase, ScriptRunner
+from tools.paths import (CONTRACT_PATH, MINI_SCENARIOS_CONTRACT_PATH,
+                         OPCODES_CONTRACT_PATH)
+
+CASES = [
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'cons.tz'),
+               '{ -5 ; 10 }', '99'),
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'reverse.tz'),
+               '{""}', '{ "c" ; "b" ; "a" }'),
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'slice.tz'),
+               'Some "Foo"', 'Pair 0 2'),
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'balance.tz'),
+               '111', 'Unit', balance=0.5),
+    # uses macros, run by the client
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'compare.tz'),
+               'Unit', 'Unit'),
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'update_big_map.tz'),
+               '(Pair { Elt "1" "one" ; Elt "2" "two" } Unit)',
+               '{ Elt "1" (Some "two") }', trace_stack=True),
+    ScriptCase(path.join(MINI_SCENARIOS_CONTRACT_PATH, 'big_map_magic.tz'),
+               '(Left (Pair { Elt "1" "one" } { Elt "2" "two" }))',
+               '(Left Unit)', trace_stack=True),
+    # emits an internal operation, printed by the client
+    ScriptCase(path.join(OPCODES_CONTRACT_PATH, 'set_delegate.tz'),
+               'Unit', 'None'),
+    # not parsed by tools.micheline, run by the client
+    ScriptCase(path.join(CONTRACT_PATH, 'entrypoints',
+                         'delegatable_target.tz'),
+               'Pair "tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx" (Pair "" 0)',
+               'Right (Left "x")'),
+]
+
+
+def _trace(output: str) -> str:
+    return output.split('\ntrace\n', 1)[1] if '\ntrace\n' in output else ''
+
+
+@pytest.mark.contract
+class TestScriptRunner:
+    """Check that running scripts through RPCs matches `run script`"""
+
+    def test_run_many(self, client):
+        with ScriptRunner(client) as runner:
+            results = runner.run_many(CASES * 4)
+        for case, result in zip(CASES * 4, results):
+            expected = client.run_script(*case)
+            assert result.storage == expected.storage
+            assert result.big_map_diff == expected.big_map_diff
+            assert (result.internal_operations ==
+                    expected.internal_operations)
+            assert _trace(result.client_output) == _trace(
+                expected.client_output)
+
+    def test_failwith(self, client):
+        contract = path.join(OPCODES_CONTRACT_PATH, 'failwith_big_map.tz')
+        case = ScriptCase(contract, '{}', '{ Elt 0 0 }')
+        with ScriptRunner(client) as runner:
+            [result] = runner.run_many([case], return_exceptions=True)
+        assert isinstance(result, RunCodeError)
+        # same exception type as `Client.run_script`
+        with pytest.raises(subprocess.CalledProcessError):
+            client.run_script(*case)
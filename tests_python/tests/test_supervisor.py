@@ -0,0 +1,92 @@
+import os
+import signal
+import threading
+from typing import Iterator, Optional
+
+import pytest
+
+from launchers.port_allocator import PortAllocator
+from launchers.sandbox import Sandbox
+from launchers.supervisor import ProcessEvent, RestartPolicy, Supervisor
+from tools import constants, paths, utils
+
+# Max time (sec) for the supervisor to publish expected events
+EVENT_TIMEOUT = 10.
+
+
+class EventWaiter:
+    """Wait for the events published by a supervisor"""
+
+    def __init__(self, supervisor: Supervisor):
+        self.supervisor = supervisor
+        self._condition = threading.Condition()
+        supervisor.subscribe(self._notify)
+
+    def _notify(self, _event: ProcessEvent) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, count: int, timeout: float = EVENT_TIMEOUT) -> bool:
+        """Wait until `count` events were published, False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: len(self.supervisor.events) >= count, timeout)
+
+
+@pytest.fixture(scope="class")
+def sandbox(log_dir: Optional[str],
+            port_allocator: PortAllocator) -> Iterator[Sandbox]:
+    """Sandbox whose dead daemons are restarted once"""
+    with Sandbox(paths.TEZOS_HOME, constants.IDENTITIES,
+                 log_dir=log_dir,
+                 ports=port_allocator,
+                 restart_policy=RestartPolicy(max_restarts=1,
+                                              backoff=0.5)) as sandbox:
+        yield sandbox
+
+
+@pytest.fixture(scope="class")
+def events(sandbox: Sandbox) -> EventWaiter:
+    return EventWaiter(sandbox.supervisor)
+
+
+@pytest.mark.baker
+@pytest.mark.incremental
+class TestSupervisor:
+    """Crashed daemons are reported at once, and restarted"""
+
+    def test_init(self, sandbox: Sandbox):
+        sandbox.add_node(0, params=constants.NODE_PARAMS)
+        utils.activate_alpha(sandbox.client(0))
+        sandbox.add_baker(0, 'baker1', proto=constants.ALPHA_DAEMON)
+
+    def test_restart(self, sandbox: Sandbox, events: EventWaiter):
+        baker = sandbox.baker(0, constants.ALPHA_DAEMON)
+        os.kill(baker.pid, signal.SIGKILL)
+        assert events.wait(2)
+        # the restarted baker appends to the log of the crashed one, both
+        # command lines are there
+        if sandbox.log_dir:
+            assert utils.check_logs_counts(sandbox.logs,
+                                           'run with local node') == 2
+        kinds = [(event.kind, event.name) for event in
+                 sandbox.supervisor.events]
+        name = f'baker {constants.ALPHA_DAEMON} 0'
+        assert kinds == [('exit', name), ('restart', name)]
+        assert sandbox.baker(0, constants.ALPHA_DAEMON) is not baker
+        ledger = sandbox.supervisor.ledger()
+        assert ledger[name]['restarts'] == 1
+        assert ledger[name]['returncodes'] == [-signal.SIGKILL]
+
+    def test_failure(self, sandbox: Sandbox, events: EventWaiter):
+        baker = sandbox.baker(0, constants.ALPHA_DAEMON)
+        os.kill(baker.pid, signal.SIGKILL)
+        assert events.wait(3)
+        failures = sandbox.supervisor.failures()
+        assert len(failures) == 1
+        assert not sandbox.are_daemons_alive()
+
+    def test_stop(self, sandbox: Sandbox, events: EventWaiter):
+        sandbox.node(0).terminate_or_kill()
+        assert events.wait(4)
+        assert sandbox.supervisor.events[-1].kind == 'stop'
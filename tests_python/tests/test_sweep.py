@@ -0,0 +1,59 @@
+from typing import Any, Dict, List
+
+from launchers.sweep import Run, RunResult, configurations, node_params, table
+
+
+class TestSweep:
+    """Configurations of a grid, their node flags, and the table of
+    results"""
+
+    def test_configurations(self):
+        grid = {'singleprocess': [False, True],
+                'connections': [10, 100]}  # type: Dict[str, List[Any]]
+        assert configurations(grid) == [
+            {'connections': 10, 'singleprocess': False},
+            {'connections': 10, 'singleprocess': True},
+            {'connections': 100, 'singleprocess': False},
+            {'connections': 100, 'singleprocess': True}]
+        assert configurations({}) == [{}]
+
+    def test_node_params(self):
+        config = {'max_latency': 5, 'private_mode': True,
+                  'disable_mempool': False, 'singleprocess': True,
+                  'node_config': {'p2p': {}}, 'history_mode': 'archive'}
+        # sorted, booleans given iff true, sandbox parameters skipped
+        assert node_params(config) == ['--history-mode', 'archive',
+                                       '--max-latency', '5',
+                                       '--private-mode']
+
+    def test_run_params(self):
+        # params doesn't use the sandbox
+        run = Run(None, {'connections': 10,  # type: ignore
+                         'private_mode': True})
+        params = ['--connections', '500', '--bootstrap-threshold', '0',
+                  '--private-mode']
+        # overridden flags are removed with their values
+        assert run.params(params) == ['--bootstrap-threshold', '0',
+                                      '--connections', '10',
+                                      '--private-mode']
+        assert run.params() == ['--connections', '10', '--private-mode']
+
+    def test_table(self):
+        results = [RunResult({'connections': 10},
+                             {'duration': 1.5, 'blocks': 10}),
+                   RunResult({'connections': 100}, {'duration': 12.25}),
+                   RunResult({'connections': 1000}, {},
+                             'Traceback\n  ...\nAssertionError: level\n')]
+        assert table(results).splitlines() == [
+            'configuration     duration  blocks',
+            'connections=10    1.5       10',
+            'connections=100   12.25     -',
+            'connections=1000  failed: AssertionError: level']
+        assert table(results, ['blocks']).splitlines()[0] == (
+            'configuration     blocks')
+
+    def test_table_without_metrics(self):
+        results = [RunResult({'connections': 10}, {}, 'Error: timeout')]
+        assert table(results).splitlines() == [
+            'configuration',
+            'connections=10  failed: Error: timeout']
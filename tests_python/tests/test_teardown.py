@@ -0,0 +1,89 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator
+
+import pytest
+
+from launchers import teardown
+
+TIMEOUT = 1.
+
+# ignores SIGTERM, and says so once its handler is installed
+STUBBORN = ('import signal, time\n'
+            'signal.signal(signal.SIGTERM, signal.SIG_IGN)\n'
+            'print("ready", flush=True)\n'
+            'time.sleep(60)\n')
+
+
+def _sleep() -> subprocess.Popen:
+    return subprocess.Popen(['sleep', '60'])
+
+
+def _stubborn() -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, '-c', STUBBORN],
+                               stdout=subprocess.PIPE)
+    assert process.stdout is not None
+    assert process.stdout.readline() == b'ready\n'
+    return process
+
+
+@pytest.fixture(params=['pidfd', 'polling'])
+def wait_mode(request, monkeypatch) -> str:
+    """Run with pidfds (where available) and with polling"""
+    if request.param == 'pidfd':
+        if not hasattr(os, 'pidfd_open'):
+            pytest.skip('pidfds not available')
+    else:
+        monkeypatch.delattr(os, 'pidfd_open', raising=False)
+    return request.param
+
+
+@pytest.fixture
+def processes() -> Iterator[Dict[str, subprocess.Popen]]:
+    """Processes to stop, killed if the test didn't"""
+    processes = {}  # type: Dict[str, subprocess.Popen]
+    yield processes
+    for process in processes.values():
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if process.stdout is not None:
+            process.stdout.close()
+
+
+class TestStopAll:
+    """Processes are terminated together, and killed at the deadline"""
+
+    def test_terminate(self, wait_mode: str,
+                       processes: Dict[str, subprocess.Popen]):
+        for index in range(3):
+            processes[f'sleep {index}'] = _sleep()
+        report = teardown.stop_all(processes, TIMEOUT)
+        assert report.stopped == 3
+        assert not report.killed
+        # returns as soon as the processes exit
+        assert report.duration < TIMEOUT
+        assert all(process.returncode == -signal.SIGTERM
+                   for process in processes.values())
+
+    def test_kill_after_timeout(self, wait_mode: str,
+                                processes: Dict[str, subprocess.Popen]):
+        processes['sleep'] = _sleep()
+        processes['stubborn'] = _stubborn()
+        report = teardown.stop_all(processes, TIMEOUT)
+        assert report.stopped == 2
+        assert report.killed == ['stubborn']
+        assert report.duration >= TIMEOUT
+        assert processes['sleep'].returncode == -signal.SIGTERM
+        assert processes['stubborn'].returncode == -signal.SIGKILL
+
+    def test_exited(self, processes: Dict[str, subprocess.Popen]):
+        processes['exited'] = subprocess.Popen(['true'])
+        processes['exited'].wait()
+        start = time.time()
+        report = teardown.stop_all(processes, TIMEOUT)
+        assert (report.stopped, report.killed) == (0, [])
+        assert time.time() - start < TIMEOUT
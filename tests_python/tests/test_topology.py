@@ -0,0 +1,40 @@
+import pytest
+from launchers import topology
+from launchers.sandbox import Sandbox
+from tools import constants, utils
+
+
+NUM_NODES = 12
+TOPOLOGY = topology.clustered(range(NUM_NODES), num_clusters=3, seed=0)
+
+
+@utils.retry(timeout=1., attempts=20)
+def check_connected_to(sandbox: Sandbox, node_id: int) -> bool:
+    expected = {f'127.0.0.1:{sandbox.p2p + peer}'
+                for peer in TOPOLOGY[node_id]}
+    points = sandbox.client(node_id).p2p_stat().points
+    connected = {point for point, stat in points.items()
+                 if stat.is_connected}
+    assert connected <= expected, f'node {node_id} has unexpected peers'
+    return connected == expected
+
+
+@pytest.mark.multinode
+@pytest.mark.incremental
+class TestClusteredTopology:
+    """Nodes only connect to their neighbors, and blocks propagate through
+    the bridges between clusters."""
+
+    def test_init(self, sandbox: Sandbox):
+        sandbox.add_topology(TOPOLOGY, params=constants.NODE_PARAMS)
+        utils.activate_alpha(sandbox.client(0))
+
+    def test_connections(self, sandbox: Sandbox):
+        for node_id in TOPOLOGY:
+            assert check_connected_to(sandbox, node_id)
+
+    def test_propagation(self, sandbox: Sandbox):
+        sandbox.client(0).bake('baker1', ['--minimal-timestamp'])
+        level = sandbox.client(0).get_level()
+        for client in sandbox.all_clients():
+            assert utils.check_level_greater_than(client, level)
@@ -0,0 +1,46 @@
+"""Poll a condition with an exponential backoff, instead of fixed sleeps.
+
+Checks start `INITIAL_DELAY` apart, and the delay doubles up to
+`MAX_DELAY`, so that callers block about as long as needed.
+
+Typical use.
+
+    probe = readiness.http_probe('http://127.0.0.1:18730/network/version')
+    if wait_until(probe, lambda: process.poll() is None, timeout=10):
+        print('ready')
+"""
+import time
+from typing import Callable
+
+INITIAL_DELAY = 0.01
+MAX_DELAY = 0.5
+
+
+def wait_until(probe: Callable[[], bool],
+               alive: Callable[[], bool],
+               timeout: float,
+               initial_delay: float = INITIAL_DELAY,
+               max_delay: float = MAX_DELAY) -> bool:
+    """Call `probe` until it returns True, with an exponential backoff.
+
+    Args:
+        probe (Callable): returns True when ready
+        alive (Callable): returns False if the process exited
+        timeout (float): max time (sec) before giving up
+        initial_delay (float): delay (sec) after the first failed probe
+        max_delay (float): max delay (sec) between two probes
+    Returns:
+        True if ready, False if the process exited or on timeout.
+    """
+    deadline = time.time() + timeout
+    delay = initial_delay
+    while True:
+        if probe():
+            return True
+        if not alive():
+            return False
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(2 * delay, max_delay)
@@ -0,0 +1,57 @@
+"""Recorded durations of test scopes, used to balance parallel runs.
+
+A scope is a test class (its tests share a class-scoped sandbox and may be
+`incremental`), or a test module for tests outside classes. Durations
+(setup, call and teardown of all tests of a scope) are stored in the
+pytest cache, so that `pytest-xdist` workers can be given the longest
+scopes first (see `tools.xdist_scheduling`). Durations are also stored
+by storage mode (see `storage_key`), to compare runs with nodes in RAM
+and on disk.
+"""
+from typing import Dict, Tuple
+
+# Key of the durations in the pytest cache
+CACHE_KEY = 'tezos/scope_durations'
+
+
+def storage_key(mode: str) -> str:
+    """Key of the durations of runs with storage `mode` ('ram' or
+    'disk')"""
+    return f'{CACHE_KEY}/{mode}'
+
+
+def scope_of(nodeid: str) -> str:
+    """Scope of a test, e.g. `tests/test_a.py::TestA` for
+    `tests/test_a.py::TestA::test_b[1]`"""
+    return nodeid.rsplit('::', 1)[0]
+
+
+class DurationRecorder:
+    """Sum durations of test reports by scope."""
+
+    def __init__(self):
+        self.durations = {}  # type: Dict[str, float]
+
+    def add(self, nodeid: str, duration: float) -> None:
+        scope = scope_of(nodeid)
+        self.durations[scope] = self.durations.get(scope, 0.) + duration
+
+    def save(self, cache, key: str = CACHE_KEY) -> None:
+        """Update the durations stored in pytest `cache` with the scopes
+        run in this session"""
+        durations = dict(cache.get(key, {}))
+        durations.update(self.durations)
+        cache.set(key, durations)
+
+
+def load(cache, key: str = CACHE_KEY) -> Dict[str, float]:
+    return dict(cache.get(key, {}))
+
+
+def compare(durations: Dict[str, float],
+            others: Dict[str, float]) -> Tuple[int, float, float]:
+    """Number of scopes in both `durations` and `others`, and total
+    duration of these scopes in each"""
+    common = set(durations) & set(others)
+    return (len(common), sum(durations[scope] for scope in common),
+            sum(others[scope] for scope in common))
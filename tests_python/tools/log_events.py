@@ -0,0 +1,281 @@
+"""Typed events extracted from the logs of nodes, bakers and endorsers.
+
+Nodes and daemons log with the template
+`Nov 12 10:11:12.123 - validator.block: <message>`. An `EventParser` turns
+the lines of a log into `Event`s, timestamped with the time of the line:
+
+- `block_validated`: a block was validated (`duration` is the validation
+  time), `validation_failed`: it was invalid,
+- `head_switched`: the node changed its head (`level`, `branch_switch`
+  in `detail`),
+- `operation_received`, `operation_injected`: an operation arrived in
+  or was injected into the mempool of the node,
+- `peer_connected`: a peer was authenticated (`hash` is its id,
+  `detail` its address),
+- `block_injected`, `endorsement_injected`: a baker or an endorser
+  injected a block or an endorsement.
+
+Some of these lines are only logged with `LOG_LEVELS`, to be given to
+`Sandbox.add_node(log_levels=...)`. No RPC is needed.
+
+Events are gathered in an `EventTable`, to select events and compute
+e.g. validation time histograms or block propagation timelines.
+
+Typical use.
+
+    sandbox.add_node(0, params=constants.NODE_PARAMS,
+                     log_levels=log_events.LOG_LEVELS)
+    ...
+    table = log_events.from_files(sandbox.logs)
+    print(table.select('block_validated').histogram([0.01, 0.1, 1]))
+    print(table.propagation_delays())
+"""
+import csv
+import os
+import re
+import time
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Pattern, Tuple)
+
+from daemons.log_store import LogStore
+
+# TEZOS_LOG rules logging all extracted events
+LOG_LEVELS = {'validator.block': 'notice',
+              'validator.chain': 'notice',
+              'prevalidator*': 'debug',
+              'p2p.connect_handler': 'debug'}
+
+KINDS = ('block_validated', 'validation_failed', 'head_switched',
+         'operation_received', 'operation_injected', 'peer_connected',
+         'block_injected', 'endorsement_injected')
+
+_HEADER = re.compile(r'^(\w{3} +\d{1,2} \d\d:\d\d:\d\d)(?:\.(\d{3}))? - '
+                     r'([\w.\-]+): (.*)$')
+
+_SPAN = re.compile(r'(\d+(?:\.\d+)?)(d|h|min|ms|us|ns|s)')
+_SPAN_UNITS = {'d': 86400., 'h': 3600., 'min': 60., 's': 1., 'ms': 1e-3,
+               'us': 1e-6, 'ns': 1e-9}
+
+_COMPLETED = re.compile(r'completed in (\S+)')
+
+
+class Event(NamedTuple):
+    """An event logged by `source`"""
+    time: float
+    source: str
+    kind: str
+    # block, operation or peer
+    hash: Optional[str] = None
+    level: Optional[int] = None
+    # validation time (sec) of `block_validated`
+    duration: Optional[float] = None
+    detail: Optional[str] = None
+
+
+def parse_span(span: str) -> Optional[float]:
+    """Seconds of a span printed by OCaml's `Ptime.Span.pp`, e.g.
+    `1min2s`, `3.5ms`"""
+    parts = _SPAN.findall(span)
+    if not parts or ''.join(value + unit for value, unit in parts) != span:
+        return None
+    return sum(float(value) * _SPAN_UNITS[unit] for value, unit in parts)
+
+
+def _matcher(section: str, pattern: str,
+             build: Callable[[re.Match], Tuple]
+             ) -> Tuple[str, Pattern, Callable[[re.Match], Tuple]]:
+    return section, re.compile(pattern), build
+
+
+# section prefix, message regexp, (kind, hash, level, detail) of event
+_MATCHERS = [
+    _matcher('validator.block', r'^Block (\w+) successfully validated',
+             lambda m: ('block_validated', m[1], None, None)),
+    _matcher('validator.block', r'^Validation of block (\w+) failed',
+             lambda m: ('validation_failed', m[1], None, None)),
+    _matcher('validator.chain',
+             r'^Update current head to (\w+) \(level (\d+),.*\), '
+             r'(same branch|changing branch)',
+             lambda m: ('head_switched', m[1], int(m[2]),
+                        'branch_switch' if m[3] == 'changing branch'
+                        else None)),
+    _matcher('prevalidator', r'^operation (\w+) arrived',
+             lambda m: ('operation_received', m[1], None, None)),
+    _matcher('prevalidator', r'^injecting operation (\w+)',
+             lambda m: ('operation_injected', m[1], None, None)),
+    _matcher('p2p.connect_handler',
+             r'^authenticate: (\S+) connected -> (\w+)',
+             lambda m: ('peer_connected', m[2], None, m[1])),
+    _matcher('', r'^Injected block (\w+) for (\S+) after \w+ '
+             r'\(level (\d+)',
+             lambda m: ('block_injected', m[1], int(m[3]), m[2])),
+    _matcher('', r"^Injected endorsement for block '(\w+)' "
+             r"\(level (\d+), contract (\S+)\) '(\w+)'",
+             lambda m: ('endorsement_injected', m[1], int(m[2]), m[4])),
+]
+
+
+class EventParser:
+    """Extract events from the lines of one log"""
+
+    def __init__(self, source: str, year: int = None):
+        """
+        Args:
+            source (str): name of the log, e.g. 'node 0'
+            year (int): year of the log lines (not logged), by default the
+                        current year
+        """
+        self.source = source
+        self.year = time.localtime().tm_year if year is None else year
+        self.events = []  # type: List[Event]
+        # validated block waiting for its validation time (next line)
+        self._pending = None  # type: Optional[Event]
+
+    def _time(self, date: str, millis: Optional[str]) -> float:
+        parsed = time.strptime(f'{self.year} {date}', '%Y %b %d %H:%M:%S')
+        return time.mktime(parsed) + (int(millis) / 1000 if millis else 0.)
+
+    def _flush(self) -> None:
+        if self._pending is not None:
+            self.events.append(self._pending)
+            self._pending = None
+
+    def feed(self, line: str, timestamp: float = None) -> None:
+        """Parse `line`. Lines without a header (e.g. the command line)
+        are skipped.
+
+        Args:
+            line (str): log line, without newline
+            timestamp (float): time of the line, if not given by its header
+        """
+        header = _HEADER.match(line)
+        if header is None:
+            return
+        date, millis, section, message = header.groups()
+        if self._pending is not None:
+            completed = _COMPLETED.search(message)
+            if section == 'validator.block' and completed:
+                self._pending = self._pending._replace(
+                    duration=parse_span(completed[1].rstrip(',')))
+                self._flush()
+                return
+            self._flush()
+        for prefix, pattern, build in _MATCHERS:
+            if not section.startswith(prefix):
+                continue
+            match = pattern.search(message)
+            if match is None:
+                continue
+            if timestamp is None:
+                timestamp = self._time(date, millis)
+            kind, hash_, level, detail = build(match)
+            event = Event(timestamp, self.source, kind, hash_, level, None,
+                          detail)
+            if kind == 'block_validated':
+                self._pending = event
+            else:
+                self.events.append(event)
+            return
+
+    def close(self) -> List[Event]:
+        """Events of all fed lines"""
+        self._flush()
+        return self.events
+
+
+class EventTable:
+    """Events of many logs, sorted by time"""
+
+    def __init__(self, events: Iterable[Event]):
+        self.events = sorted(events, key=lambda event: event.time)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def select(self,
+               kind: str = None,
+               source: str = None,
+               since: float = 0.,
+               until: float = None,
+               **fields) -> 'EventTable':
+        """Events of `kind`, from `source`, between `since` and `until`,
+        whose other `fields` (e.g. `hash`) have the given values"""
+        return EventTable(
+            event for event in self.events
+            if (kind is None or event.kind == kind) and
+            (source is None or event.source == source) and
+            since <= event.time and (until is None or event.time <= until) and
+            all(getattr(event, name) == value
+                for name, value in fields.items()))
+
+    def column(self, name: str) -> List:
+        return [getattr(event, name) for event in self.events]
+
+    def histogram(self, edges: List[float]) -> List[int]:
+        """Number of durations in each bin: below `edges[0]`, between two
+        consecutive edges, and above `edges[-1]`"""
+        counts = [0] * (len(edges) + 1)
+        for duration in self.column('duration'):
+            if duration is not None:
+                counts[sum(duration >= edge for edge in edges)] += 1
+        return counts
+
+    def propagation(self) -> Dict[str, Dict[str, float]]:
+        """For each validated block, the time it was first validated by
+        each source"""
+        result = {}  # type: Dict[str, Dict[str, float]]
+        for event in self.select('block_validated'):
+            assert event.hash is not None
+            result.setdefault(event.hash, {}).setdefault(event.source,
+                                                         event.time)
+        return result
+
+    def propagation_delays(self) -> Dict[str, float]:
+        """For each validated block, the time between its first and its
+        last validation"""
+        return {block: max(times.values()) - min(times.values())
+                for block, times in self.propagation().items()}
+
+    def to_csv(self, path: str) -> None:
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(Event._fields)
+            writer.writerows(self.events)
+
+
+def from_lines(lines: Iterable[str], source: str,
+               year: int = None) -> List[Event]:
+    parser = EventParser(source, year)
+    for line in lines:
+        parser.feed(line.rstrip('\n'))
+    return parser.close()
+
+
+def from_files(logs: List[str], year: int = None) -> EventTable:
+    """Events of log files (e.g. `sandbox.logs`), whose sources are the
+    names of the files"""
+    events = []  # type: List[Event]
+    for log in logs:
+        source = os.path.splitext(os.path.basename(log))[0]
+        with open(log, errors='replace') as file:
+            events.extend(from_lines(file, source, year))
+    return EventTable(events)
+
+
+def from_store(store: LogStore,
+               since: float = 0.,
+               until: float = None) -> EventTable:
+    """Events of all sources of a log store"""
+    parsers = {}  # type: Dict[str, EventParser]
+    for record in store.query(since=since, until=until):
+        parser = parsers.get(record.source)
+        if parser is None:
+            year = time.localtime(record.time).tm_year
+            parser = parsers[record.source] = EventParser(record.source,
+                                                          year)
+        parser.feed(record.line)
+    return EventTable(event for parser in parsers.values()
+                      for event in parser.close())
@@ -0,0 +1,146 @@
+"""Incremental scanning of growing logs for many patterns.
+
+Tests check the logs of all daemons for errors repeatedly, while the logs
+grow. A `LogScanner` remembers, for each log file, the offset up to which
+it was scanned, so that each `scan` only reads the bytes appended since
+the previous one (through `mmap`, without decoding lines).
+
+All patterns are compiled into a single alternation, searched once over
+the new bytes. Only the (rare) lines matched by the alternation are then
+checked against each pattern, to count the lines matching each pattern.
+
+A log file which is replaced, shrinks, or is rewritten in place (e.g.
+overwritten by a restarted node, or by the node of another sandbox using
+the same log dir) is scanned again from its start. Rewrites are detected
+by the last bytes scanned, which appends don't change. The first bytes
+would not do: logs start with the command line, which is the same when a
+process is restarted.
+
+Typical use.
+
+    scanner = LogScanner({'error': r'\\[error\\]', 'fatal': 'Fatal error'})
+    ...
+    counts = scanner.scan(sandbox.logs)
+    assert counts['error'] == 0, scanner.matches(sandbox.logs, 'error')
+"""
+import mmap
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Union
+
+# Number of bytes before the offset of a log compared at each scan
+FINGERPRINT_SIZE = 256
+
+
+class Match(NamedTuple):
+    """A line matching a pattern"""
+    log: str
+    line: str
+
+
+class _File:
+
+    def __init__(self, patterns: List[str]):
+        self.offset = 0
+        self.inode = None  # type: Optional[int]
+        # last bytes before `offset`
+        self.fingerprint = b''
+        self.counts = {name: 0 for name in patterns}
+        self.matches = {name: [] for name in patterns
+                        }  # type: Dict[str, List[Match]]
+
+
+class LogScanner:
+    """Count lines matching `patterns` in logs, see module documentation."""
+
+    def __init__(self, patterns: Union[List[str], Dict[str, str]]):
+        """
+        Args:
+            patterns (list or dict): regexps, possibly by name. Counts and
+                                     matches are given by name (by regexp
+                                     for a list).
+        """
+        if not isinstance(patterns, dict):
+            patterns = {pattern: pattern for pattern in patterns}
+        assert patterns, 'no pattern'
+        self.patterns = {name: re.compile(pattern.encode(), re.MULTILINE)
+                         for name, pattern in patterns.items()}
+        self.combined = re.compile(
+            b'|'.join(b'(?:' + pattern.encode() + b')'
+                      for pattern in patterns.values()), re.MULTILINE)
+        self._files = {}  # type: Dict[str, _File]
+
+    def _reset(self, log: str) -> _File:
+        state = _File(list(self.patterns))
+        self._files[log] = state
+        return state
+
+    def _scan_file(self, log: str) -> _File:
+        state = self._files.get(log) or self._reset(log)
+        try:
+            with open(log, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                if (stat.st_size < state.offset or
+                        state.inode not in (None, stat.st_ino) or
+                        not self._same_start(file, state)):
+                    state = self._reset(log)
+                state.inode = stat.st_ino
+                if stat.st_size == state.offset:
+                    return state
+                with mmap.mmap(file.fileno(), 0,
+                               access=mmap.ACCESS_READ) as buf:
+                    # the last line may be incomplete
+                    end = buf.rfind(b'\n', state.offset) + 1
+                    if end > state.offset:
+                        self._search(log, buf, state, end)
+                        state.offset = end
+                        state.fingerprint = buf[
+                            max(0, end - FINGERPRINT_SIZE):end]
+        except FileNotFoundError:
+            pass
+        return state
+
+    @staticmethod
+    def _same_start(file, state: _File) -> bool:
+        """True iff the bytes of `file` before the offset of `state` are
+        the ones scanned"""
+        if not state.offset:
+            return True
+        file.seek(state.offset - len(state.fingerprint))
+        return file.read(len(state.fingerprint)) == state.fingerprint
+
+    def _search(self, log: str, buf: mmap.mmap, state: _File,
+                end: int) -> None:
+        pos = state.offset
+        while pos < end:
+            found = self.combined.search(buf, pos, end)  # type: ignore
+            if found is None:
+                return
+            start = buf.rfind(b'\n', 0, found.start()) + 1
+            stop = buf.find(b'\n', found.start(), end)
+            line = buf[start:stop]
+            for name, pattern in self.patterns.items():
+                if pattern.search(line):
+                    state.counts[name] += 1
+                    state.matches[name].append(
+                        Match(log, line.decode(errors='replace')))
+            pos = stop + 1
+
+    def scan(self, logs: List[str]) -> Dict[str, int]:
+        """Scan the bytes appended to `logs` since the last scan.
+
+        Returns:
+            The number of lines of `logs` matching each pattern, since
+            their start.
+        """
+        counts = {name: 0 for name in self.patterns}
+        for log in logs:
+            state = self._scan_file(log)
+            for name, count in state.counts.items():
+                counts[name] += count
+        return counts
+
+    def matches(self, logs: List[str], name: str) -> List[Match]:
+        """Lines of `logs` matching pattern `name`, as of the last scan"""
+        return [match for log in logs if log in self._files
+                for match in self._files[log].matches[name]]
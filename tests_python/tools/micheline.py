@@ -0,0 +1,345 @@
+"""Conversion between Michelson concrete syntax and Micheline JSON.
+
+The node RPCs (`helpers/scripts/run_code`, ...) take and return Micheline
+expressions in their JSON form, whereas the tests manipulate Michelson
+in concrete syntax. This module provides a parser producing the JSON form
+of a Michelson expression, and a printer producing the same text as the
+client for a given JSON expression.
+
+Macros are not expanded. Use `contains_macros` to detect expressions that
+must be handled by the client.
+
+`pack` computes the same bytes as the PACK instruction (and as the client
+when it serializes data to be signed).
+"""
+import re
+import struct
+from typing import Any, List, Tuple
+
+# Primitives known to the protocol, in the order of their binary encoding.
+# Any other primitive is a macro
+PRIMITIVES = (
+    'parameter', 'storage', 'code', 'False', 'Elt', 'Left', 'None', 'Pair',
+    'Right', 'Some', 'True', 'Unit', 'PACK', 'UNPACK', 'BLAKE2B', 'SHA256',
+    'SHA512', 'ABS', 'ADD', 'AMOUNT', 'AND', 'BALANCE', 'CAR', 'CDR',
+    'CHECK_SIGNATURE', 'COMPARE', 'CONCAT', 'CONS', 'CREATE_ACCOUNT',
+    'CREATE_CONTRACT', 'IMPLICIT_ACCOUNT', 'DIP', 'DROP', 'DUP', 'EDIV',
+    'EMPTY_MAP', 'EMPTY_SET', 'EQ', 'EXEC', 'FAILWITH', 'GE', 'GET', 'GT',
+    'HASH_KEY', 'IF', 'IF_CONS', 'IF_LEFT', 'IF_NONE', 'INT', 'LAMBDA', 'LE',
+    'LEFT', 'LOOP', 'LSL', 'LSR', 'LT', 'MAP', 'MEM', 'MUL', 'NEG', 'NEQ',
+    'NIL', 'NONE', 'NOT', 'NOW', 'OR', 'PAIR', 'PUSH', 'RIGHT', 'SIZE', 'SOME',
+    'SOURCE', 'SENDER', 'SELF', 'STEPS_TO_QUOTA', 'SUB', 'SWAP',
+    'TRANSFER_TOKENS', 'SET_DELEGATE', 'UNIT', 'UPDATE', 'XOR', 'ITER',
+    'LOOP_LEFT', 'ADDRESS', 'CONTRACT', 'ISNAT', 'CAST', 'RENAME', 'bool',
+    'contract', 'int', 'key', 'key_hash', 'lambda', 'list', 'map', 'big_map',
+    'nat', 'option', 'or', 'pair', 'set', 'signature', 'string', 'bytes',
+    'mutez', 'timestamp', 'unit', 'operation', 'address', 'SLICE', 'DIG',
+    'DUG', 'EMPTY_BIG_MAP', 'APPLY', 'chain_id', 'CHAIN_ID', 'LEVEL',
+    'SELF_ADDRESS', 'never', 'NEVER', 'UNPAIR', 'VOTING_POWER',
+    'TOTAL_VOTING_POWER', 'KECCAK', 'SHA3', 'PAIRING_CHECK', 'bls12_381_g1',
+    'bls12_381_g2', 'bls12_381_fr', 'baker_hash', 'baker_operation',
+    'pvss_key', 'SUBMIT_PROPOSALS', 'SUBMIT_BALLOT', 'SET_BAKER_ACTIVE',
+    'TOGGLE_BAKER_DELEGATIONS', 'SET_BAKER_CONSENSUS_KEY',
+    'SET_BAKER_PVSS_KEY', 'sapling_state', 'sapling_transaction',
+    'SAPLING_EMPTY_STATE', 'SAPLING_VERIFY_UPDATE')
+
+_PRIM_CODES = {prim: code for code, prim in enumerate(PRIMITIVES)}
+
+# Expressions wider than this are printed on several lines by the client
+_MAX_WIDTH = 80
+
+_TOKEN = re.compile(r'''
+    (?P<skip>\s+|\#[^\n]*|/\*.*?\*/)
+  | (?P<bytes>0x[0-9a-fA-F]*)
+  | (?P<int>-?[0-9]+)
+  | (?P<string>"(?:\\.|[^"\\])*")
+  | (?P<annot>[@:%][\w.%@]*)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<punct>[(){};])
+''', re.VERBOSE | re.DOTALL)
+
+_ESCAPES = {'n': '\n', 'r': '\r', 'b': '\b', 't': '\t', '"': '"',
+            '\\': '\\'}
+
+
+class MichelineParseError(Exception):
+    """Raised when a Michelson expression couldn't be parsed."""
+
+    def __init__(self, source: str, position: int):
+        super().__init__(f'parse error at position {position}')
+        self.source = source
+        self.position = position
+
+
+def _tokenize(source: str) -> List[Tuple[str, str, int]]:
+    tokens = []
+    pos = 0
+    while pos < len(source):
+        match = _TOKEN.match(source, pos)
+        if match is None:
+            raise MichelineParseError(source, pos)
+        kind = match.lastgroup
+        assert kind is not None
+        if kind != 'skip':
+            tokens.append((kind, match.group(kind), pos))
+        pos = match.end()
+    return tokens
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)),
+                  literal[1:-1])
+
+
+class _Parser:
+
+    def __init__(self, source: str):
+        self._source = source
+        self._tokens = _tokenize(source)
+        self._pos = 0
+
+    def _peek(self) -> Tuple[str, str]:
+        if self._pos == len(self._tokens):
+            return ('eof', '')
+        kind, value, _ = self._tokens[self._pos]
+        return kind, value
+
+    def _fail(self):
+        if self._pos == len(self._tokens):
+            raise MichelineParseError(self._source, len(self._source))
+        raise MichelineParseError(self._source, self._tokens[self._pos][2])
+
+    def _expect(self, punct: str) -> None:
+        if self._peek() != ('punct', punct):
+            self._fail()
+        self._pos += 1
+
+    def _starts_arg(self) -> bool:
+        kind, value = self._peek()
+        return (kind in {'int', 'string', 'bytes', 'ident'} or
+                (kind == 'punct' and value in {'(', '{'}))
+
+    def expr(self, with_args: bool = True) -> Any:
+        kind, value = self._peek()
+        if kind == 'int':
+            self._pos += 1
+            return {'int': value}
+        if kind == 'string':
+            self._pos += 1
+            return {'string': _unescape(value)}
+        if kind == 'bytes':
+            self._pos += 1
+            return {'bytes': value[2:].lower()}
+        if (kind, value) == ('punct', '('):
+            self._pos += 1
+            res = self.expr()
+            self._expect(')')
+            return res
+        if (kind, value) == ('punct', '{'):
+            return self.seq()
+        if kind != 'ident':
+            self._fail()
+        self._pos += 1
+        prim = {'prim': value}  # type: dict
+        annots = []
+        while self._peek()[0] == 'annot':
+            annots.append(self._peek()[1])
+            self._pos += 1
+        args = []
+        while with_args and self._starts_arg():
+            args.append(self.expr(with_args=False))
+        if args:
+            prim['args'] = args
+        if annots:
+            prim['annots'] = annots
+        return prim
+
+    def items(self, closing: str) -> List[Any]:
+        items = []
+        while self._peek() not in {('punct', closing), ('eof', '')}:
+            items.append(self.expr())
+            if self._peek() != ('punct', ';'):
+                break
+            self._pos += 1
+        return items
+
+    def seq(self) -> List[Any]:
+        self._expect('{')
+        items = self.items('}')
+        self._expect('}')
+        return items
+
+    def end(self) -> None:
+        if self._peek()[0] != 'eof':
+            self._fail()
+
+
+def parse_expression(source: str) -> Any:
+    """Parse a Michelson expression (e.g. data or a type)"""
+    parser = _Parser(source)
+    res = parser.expr()
+    parser.end()
+    return res
+
+
+def parse_toplevel(source: str) -> List[Any]:
+    """Parse a Michelson script, the toplevel braces are optional"""
+    parser = _Parser(source)
+    if parser._peek() == ('punct', '{'):  # pylint: disable=protected-access
+        res = parser.seq()
+    else:
+        res = parser.items('')
+    parser.end()
+    return res
+
+
+def contains_macros(expr: Any) -> bool:
+    """True iff `expr` uses a primitive unknown to the protocol"""
+    if isinstance(expr, list):
+        return any(contains_macros(item) for item in expr)
+    if 'prim' not in expr:
+        return False
+    args = expr.get('args', [])
+    if expr['prim'] not in _PRIM_CODES or (expr['prim'] == 'DUP' and args):
+        return True
+    return contains_macros(args)
+
+
+def _zarith(value: int) -> bytes:
+    res = bytearray()
+    abs_value = abs(value)
+    byte = abs_value & 0x3f
+    if value < 0:
+        byte |= 0x40
+    abs_value >>= 6
+    while abs_value:
+        res.append(byte | 0x80)
+        byte = abs_value & 0x7f
+        abs_value >>= 7
+    res.append(byte)
+    return bytes(res)
+
+
+def _sized(data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + data
+
+
+def _encode(expr: Any) -> bytes:
+    if isinstance(expr, list):
+        return b'\x02' + _sized(b''.join(_encode(item) for item in expr))
+    if 'int' in expr:
+        return b'\x00' + _zarith(int(expr['int']))
+    if 'string' in expr:
+        return b'\x01' + _sized(expr['string'].encode())
+    if 'bytes' in expr:
+        return b'\x0a' + _sized(bytes.fromhex(expr['bytes']))
+    assert expr['prim'] in _PRIM_CODES, f'unknown primitive {expr["prim"]}'
+    prim = bytes([_PRIM_CODES[expr['prim']]])
+    args = expr.get('args', [])
+    annots = expr.get('annots', [])
+    if len(args) > 2:
+        return (b'\x09' + prim +
+                _sized(b''.join(_encode(arg) for arg in args)) +
+                _sized(' '.join(annots).encode()))
+    tag = bytes([3 + 2 * len(args) + (1 if annots else 0)])
+    res = tag + prim + b''.join(_encode(arg) for arg in args)
+    if annots:
+        res += _sized(' '.join(annots).encode())
+    return res
+
+
+def pack(expr: Any) -> bytes:
+    """Binary encoding of `expr` prefixed by 0x05, as done by PACK.
+
+    `expr` must not contain macros."""
+    return b'\x05' + _encode(expr)
+
+
+def _print_string(value: str) -> str:
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r')
+               .replace('\b', '\\b').replace('\t', '\\t'))
+    return f'"{escaped}"'
+
+
+def _size(expr: Any) -> int:
+    """Width of `expr` on a single line, as computed by the client"""
+    if isinstance(expr, list):
+        return 4 + sum(3 + _size(item) for item in expr)
+    if 'int' in expr:
+        return len(expr['int'])
+    if 'string' in expr:
+        return len(expr['string'].encode())
+    if 'bytes' in expr:
+        return len(expr['bytes']) + 2
+    annots = expr.get('annots', [])
+    size = len(expr['prim']) + (len(' '.join(annots)) + 2 if annots else 0)
+    return size + sum(1 + _size(arg) for arg in expr.get('args', []))
+
+
+def _column(text: str, col: int) -> int:
+    if '\n' in text:
+        return len(text.rsplit('\n', 1)[1])
+    return col + len(text)
+
+
+def _print_unwrapped(expr: Any, col: int) -> str:
+    if isinstance(expr, list):
+        if not expr:
+            return '{}'
+        text = '{ '
+        sep = ' ; ' if _size(expr) < _MAX_WIDTH else ' ;\n' + ' ' * (col + 2)
+        for i, item in enumerate(expr):
+            if i > 0:
+                text += sep
+            text += _print_unwrapped(item, _column(text, col))
+        return text + ' }'
+    if 'int' in expr:
+        return expr['int']
+    if 'string' in expr:
+        return _print_string(expr['string'])
+    if 'bytes' in expr:
+        return '0x' + expr['bytes']
+    name = ' '.join([expr['prim']] + expr.get('annots', []))
+    args = expr.get('args', [])
+    if not args:
+        return name
+    if _size(expr) < _MAX_WIDTH:
+        text = name
+        for arg in args:
+            text += ' '
+            text += _print(arg, _column(text, col))
+        return text
+    if len(name) <= 4:
+        text = name + ' '
+        sep = '\n' + ' ' * (col + len(text))
+    else:
+        text = name
+        sep = '\n' + ' ' * (col + 2)
+    for i, arg in enumerate(args):
+        if i > 0 or len(name) > 4:
+            text += sep
+        text += _print(arg, _column(text, col))
+    return text
+
+
+def _print(expr: Any, col: int) -> str:
+    if isinstance(expr, dict) and ('args' in expr or 'annots' in expr):
+        return '(' + _print_unwrapped(expr, col + 1) + ')'
+    return _print_unwrapped(expr, col)
+
+
+def print_expr(expr: Any, col: int = 0) -> str:
+    """Print `expr` as the client does, applications are parenthesized.
+
+    Args:
+        expr: Micheline JSON expression
+        col (int): column at which the expression starts, used to indent
+                   expressions spanning several lines
+    """
+    return _print(expr, col)
+
+
+def print_expr_unwrapped(expr: Any, col: int = 0) -> str:
+    """Same as `print_expr` without parenthesis around applications"""
+    return _print_unwrapped(expr, col)
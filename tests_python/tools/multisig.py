@@ -0,0 +1,332 @@
+"""Local signature pipeline for the generic multisig contract.
+
+Each `Client.msig_prepare_*` or `Client.msig_sign_*` call spawns the
+client, which reads the contract storage again. This module computes the
+bytes to sign in Python (as in `client_proto_multisig.ml`), signs them with
+all the keys at once, and assembles the signature list. An N-of-M action
+then costs a single client call, the one injecting the operation.
+
+Typical use.
+
+    msig = Multisig(client, 'msig')
+    msig.transfer(10, 'bootstrap2', 'bootstrap1', ['foo', 'bar'])
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import base58check
+import ed25519
+import pyblake2
+import requests
+from py_ecc import secp256k1
+
+from client.client import Client
+from . import micheline
+
+# b58check prefixes of hashes, keys and signatures, by their readable
+# prefix
+_PREFIXES = {
+    'tz1': bytes([6, 161, 159]),
+    'tz2': bytes([6, 161, 161]),
+    'tz3': bytes([6, 161, 164]),
+    'KT1': bytes([2, 90, 121]),
+    'SG1': bytes([3, 56, 226]),
+    'Net': bytes([87, 82, 0]),
+    'edpk': bytes([13, 15, 37, 217]),
+    'sppk': bytes([3, 254, 226, 86]),
+    'p2pk': bytes([3, 178, 139, 127]),
+    'edsk': bytes([13, 15, 58, 7]),
+    'spsk': bytes([17, 162, 224, 201]),
+    'edsig': bytes([9, 245, 205, 134, 18]),
+    'spsig1': bytes([13, 115, 101, 19, 63]),
+}
+
+# tags of public key hashes (and public keys) in binary encodings
+_CURVE_TAGS = {'tz1': 0, 'tz2': 1, 'tz3': 2,
+               'edpk': 0, 'sppk': 1, 'p2pk': 2}
+
+
+def b58_decode(value: str) -> bytes:
+    """Payload of a b58check encoded hash, key or signature"""
+    decoded = base58check.b58decode(value)
+    payload, checksum = decoded[:-4], decoded[-4:]
+    assert hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] \
+        == checksum, f'invalid checksum in {value}'
+    for readable, prefix in _PREFIXES.items():
+        if value.startswith(readable) and payload.startswith(prefix):
+            return payload[len(prefix):]
+    # 64-bytes ed25519 secret keys
+    assert value.startswith('edsk'), f'unknown prefix in {value}'
+    return payload[4:]
+
+
+def b58_encode(readable: str, payload: bytes) -> str:
+    """b58check encoding of `payload`, starting with `readable`"""
+    data = _PREFIXES[readable] + payload
+    checksum = hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4]
+    return base58check.b58encode(data + checksum).decode()
+
+
+def public_key_hash(public_key: str) -> str:
+    """tz1/tz2/tz3 hash of a b58check public key"""
+    curve = _CURVE_TAGS[public_key[:4]]
+    blake_hash = pyblake2.blake2b(digest_size=20)
+    blake_hash.update(b58_decode(public_key))
+    return b58_encode(f'tz{curve + 1}', blake_hash.digest())
+
+
+def contract_bytes(address: str) -> bytes:
+    """Binary encoding of a contract address (`Contract.encoding`)"""
+    payload = b58_decode(address)
+    if address[:3] in {'tz1', 'tz2', 'tz3'}:
+        return bytes([0, _CURVE_TAGS[address[:3]]]) + payload
+    if address.startswith('KT1'):
+        return b'\x01' + payload + b'\x00'
+    assert address.startswith('SG1'), f'{address} is not a contract'
+    return b'\x02' + payload + b'\x00'
+
+
+def public_key_bytes(public_key: str) -> bytes:
+    """Binary encoding of a public key (`Signature.Public_key.encoding`)"""
+    return bytes([_CURVE_TAGS[public_key[:4]]]) + b58_decode(public_key)
+
+
+def transfer_action(amount: float, destination: str) -> Any:
+    """Action transferring `amount` tez to the `destination` address"""
+    amount_mutez = str(int(round(amount * 1000000)))
+    dest = contract_bytes(destination).hex()
+    return {'prim': 'Left',
+            'args': [{'prim': 'Pair',
+                      'args': [{'int': amount_mutez}, {'bytes': dest}]}]}
+
+
+def delegate_action(baker: Optional[str]) -> Any:
+    """Action setting the delegate to `baker` (a SG1 baker hash), or
+    withdrawing the delegate if None"""
+    if baker is None:
+        delegate = {'prim': 'None'}  # type: Any
+    else:
+        delegate = {'prim': 'Some',
+                    'args': [{'bytes': b58_decode(baker).hex()}]}
+    return {'prim': 'Right',
+            'args': [{'prim': 'Left', 'args': [delegate]}]}
+
+
+def keys_action(threshold: int, public_keys: List[str]) -> Any:
+    """Action setting the threshold and the public keys"""
+    keys = [{'bytes': public_key_bytes(key).hex()} for key in public_keys]
+    return {'prim': 'Right',
+            'args': [{'prim': 'Right',
+                      'args': [{'prim': 'Pair',
+                                'args': [{'int': str(threshold)}, keys]}]}]}
+
+
+def bytes_to_sign(chain_id: str,
+                  contract: str,
+                  counter: int,
+                  action: Any) -> bytes:
+    """Bytes signed by the keys of the multisig for `action`.
+
+    Same as `prepare multisig transaction ... --bytes-only`.
+
+    Args:
+        chain_id (str): b58check chain id
+        contract (str): KT1 address of the multisig contract
+        counter (int): current counter of the multisig contract
+        action: Micheline expression built by one of the `*_action`
+                functions
+    """
+    address = {'prim': 'Pair',
+               'args': [{'bytes': b58_decode(chain_id).hex()},
+                        {'bytes': contract_bytes(contract).hex()}]}
+    payload = {'prim': 'Pair', 'args': [{'int': str(counter)}, action]}
+    return micheline.pack({'prim': 'Pair', 'args': [address, payload]})
+
+
+def local_sign(data: bytes, secret_key: str) -> Optional[str]:
+    """b58check signature of `data` by `secret_key`, as `sign bytes` does.
+
+    Args:
+        data (bytes): signed data, including the watermark if any
+        secret_key (str): secret key locator, e.g. "unencrypted:edsk..."
+
+    Returns:
+        The signature, or None if the key isn't an unencrypted ed25519 or
+        secp256k1 key.
+    """
+    scheme, _, key = secret_key.partition(':')
+    if scheme != 'unencrypted':
+        return None
+    blake_hash = pyblake2.blake2b(digest_size=32)
+    blake_hash.update(data)
+    digest = blake_hash.digest()
+    if key.startswith('edsk'):
+        signing_key = ed25519.SigningKey(b58_decode(key))
+        return b58_encode('edsig', signing_key.sign(digest))
+    if key.startswith('spsk'):
+        _, r, s = secp256k1.ecdsa_raw_sign(digest, b58_decode(key))
+        return b58_encode('spsig1', r.to_bytes(32, 'big') +
+                          s.to_bytes(32, 'big'))
+    return None
+
+
+class BatchSigner:
+    """Sign with the keys known by a client, without spawning it.
+
+    Unencrypted ed25519 and secp256k1 keys are read once from the client
+    base dir. Other keys (p256, encrypted or remote) are used through
+    `Client.sign_bytes`.
+    """
+
+    def __init__(self, client: Client):
+        self._client = client
+        self._secret_keys = {}  # type: Dict[str, str]
+        path = os.path.join(client.base_dir, 'secret_keys')
+        if os.path.isfile(path):
+            with open(path) as stream:
+                for entry in json.load(stream):
+                    self._secret_keys[entry['name']] = entry['value']
+
+    def sign(self, data: bytes, key: str) -> str:
+        """b58check signature of `data` by the secret key of alias `key`"""
+        signature = local_sign(data, self._secret_keys.get(key, ''))
+        if signature is None:
+            return self._client.sign_bytes_of_string('0x' + data.hex(), key)
+        return signature
+
+    def sign_all(self, data: bytes, keys: List[str]) -> List[str]:
+        """Signatures of `data` by all `keys`, in the same order"""
+        return [self.sign(data, key) for key in keys]
+
+
+class Multisig:
+    """A generic multisig contract, driven with local signatures.
+
+    The methods taking `keys` sign the action with the secret keys of these
+    aliases, and make a single client call, injecting the operation.
+    """
+
+    def __init__(self, client: Client, contract: str):
+        """
+        Args:
+            client (Client): client knowing the keys and the contract,
+                             connected to a node
+            contract (str): alias or address of the multisig contract
+        """
+        assert client.endpoint is not None, \
+            'Multisig requires a client connected to a node'
+        self._client = client
+        self.contract = contract
+        self.signer = BatchSigner(client)
+        self.address = self.resolve(contract)
+        self._session = requests.Session()
+        self._chain_id = None  # type: Optional[str]
+
+    def resolve(self, name: str) -> str:
+        """Address of alias `name`, read from the client base dir if
+        possible"""
+        if name[:3] in {'tz1', 'tz2', 'tz3', 'KT1', 'SG1'}:
+            return name
+        for aliases in ['contracts', 'public_key_hashs']:
+            path = os.path.join(self._client.base_dir, aliases)
+            if os.path.isfile(path):
+                with open(path) as stream:
+                    for entry in json.load(stream):
+                        if entry['name'] == name:
+                            return entry['value']
+        return self._client.get_contract_address(name)
+
+    def public_key(self, name: str) -> str:
+        """Public key of alias `name`, read from the client base dir"""
+        if name[:4] in {'edpk', 'sppk', 'p2pk'}:
+            return name
+        path = os.path.join(self._client.base_dir, 'public_keys')
+        with open(path) as stream:
+            for entry in json.load(stream):
+                if entry['name'] == name:
+                    value = entry['value']
+                    if isinstance(value, dict):
+                        return value['key']
+                    return value.partition(':')[2]
+        raise KeyError(name)
+
+    def _get(self, path: str) -> Any:
+        res = self._session.get(f'{self._client.endpoint}/chains/main/{path}')
+        res.raise_for_status()
+        return res.json()
+
+    def chain_id(self) -> str:
+        if self._chain_id is None:
+            self._chain_id = self._get('chain_id')
+        assert self._chain_id is not None
+        return self._chain_id
+
+    def storage(self) -> Any:
+        return self._get(f'blocks/head/context/contracts/{self.address}/'
+                         'storage')
+
+    def counter(self) -> int:
+        """Current counter of the contract, read from its storage"""
+        return int(self.storage()['args'][0]['int'])
+
+    def bytes_to_sign(self, action: Any) -> bytes:
+        """Bytes to sign for `action` at the current counter"""
+        return bytes_to_sign(self.chain_id(), self.address, self.counter(),
+                             action)
+
+    def signatures(self, action: Any, keys: List[str]) -> List[str]:
+        """Signatures of `action` at the current counter by all `keys`"""
+        return self.signer.sign_all(self.bytes_to_sign(action), keys)
+
+    def transfer(self,
+                 amount: float,
+                 dest: str,
+                 src: str,
+                 keys: List[str],
+                 args: List[str] = None) -> str:
+        """Same as `Client.msig_transfer`, signed by `keys`.
+
+        `dest` is an address or an alias known by the client."""
+        action = transfer_action(amount, self.resolve(dest))
+        signatures = self.signatures(action, keys)
+        return self._client.msig_transfer(self.contract, amount, dest, src,
+                                          signatures, args)
+
+    def set_delegate(self,
+                     delegate: str,
+                     src: str,
+                     keys: List[str],
+                     args: List[str] = None) -> str:
+        """Same as `Client.msig_set_delegate`, signed by `keys`"""
+        action = delegate_action(self.resolve(delegate))
+        signatures = self.signatures(action, keys)
+        return self._client.msig_set_delegate(self.contract, delegate, src,
+                                              signatures, args)
+
+    def withdraw_delegate(self,
+                          src: str,
+                          keys: List[str],
+                          args: List[str] = None) -> str:
+        """Same as `Client.msig_withdrawing_delegate`, signed by `keys`"""
+        signatures = self.signatures(delegate_action(None), keys)
+        return self._client.msig_withdrawing_delegate(self.contract, src,
+                                                      signatures, args)
+
+    def set_keys(self,
+                 threshold: int,
+                 public_keys: List[str],
+                 src: str,
+                 keys: List[str]) -> str:
+        """Change the threshold and keys with `Client.msig_run_transaction`,
+        signed by `keys`.
+
+        `public_keys` are b58check public keys or aliases."""
+        action = keys_action(threshold,
+                             [self.public_key(key) for key in public_keys])
+        to_sign = self.bytes_to_sign(action)
+        signatures = self.signer.sign_all(to_sign, keys)
+        return self._client.msig_run_transaction(self.contract,
+                                                 '0x' + to_sign.hex(),
+                                                 src, signatures)
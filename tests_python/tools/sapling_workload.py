@@ -0,0 +1,219 @@
+"""Throughput of shielded transactions on a Sapling contract.
+
+Forging a shielded transaction runs the proof generation in the client,
+which takes most of the time of Sapling tests. `SaplingWorkload` forges
+many transactions concurrently: each Sapling key lives in its own client
+base dir (a shard), so that forges don't share a wallet. Forged
+transactions are then submitted in batches, one transaction per fee payer,
+and each round reports
+
+- the size of the shielded pool (number of commitments) before the round,
+- the number of proofs forged per second,
+- the latency of each forge,
+- the latency between the injection and the inclusion of each transaction.
+
+Typical use.
+
+    workload = SaplingWorkload(lambda: sandbox.get_new_client(node),
+                               'sapling', contract_address, num_shards=8,
+                               baker='baker1')
+    workload.fund(100)
+    for _ in range(10):
+        print(workload.run_round(1))
+    workload.cleanup()
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent import futures
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import requests
+
+from client.client import Client
+
+FEE_PAYERS = ['bootstrap1', 'bootstrap2', 'bootstrap3', 'bootstrap4',
+              'bootstrap5']
+BURN_CAP = ['--burn-cap', '3.0']
+
+
+class SaplingRound(NamedTuple):
+    """Measures of one round of shielded transactions"""
+    pool_size: int
+    transactions: int
+    proofs: int
+    forge_time: float
+    forge_latencies: List[float]
+    inclusion_latencies: List[float]
+
+    @property
+    def proofs_per_second(self) -> float:
+        return self.proofs / self.forge_time if self.forge_time else 0.
+
+
+class SaplingWorkload:
+    """Shielded transactions between `num_shards` Sapling keys.
+
+    Each shard is a client with its own base dir and Sapling key, created
+    by `make_client`. Shards are removed by `cleanup()`.
+    """
+
+    def __init__(self,
+                 make_client: Callable[[], Client],
+                 contract_name: str,
+                 contract_address: str,
+                 num_shards: int = 4,
+                 fee_payers: List[str] = None,
+                 baker: str = None,
+                 sapling_id: int = None):
+        """
+        Args:
+            make_client (Callable): returns a new client for the node, with
+                                    the sandbox identities
+            contract_name (str): alias of the Sapling contract in shards
+            contract_address (str): address of the Sapling contract
+            num_shards (int): number of Sapling keys, forging concurrently
+            fee_payers (list): implicit accounts paying the fees, a batch
+                               has at most one transaction per fee payer
+            baker (str): if set, a block is baked for this account after
+                         each batch, otherwise blocks are expected from
+                         baker daemons
+            sapling_id (int): id of the Sapling state, read from the
+                              contract storage if None (the storage must
+                              then be the Sapling state)
+        """
+        assert num_shards >= 1
+        self.contract_name = contract_name
+        self.contract_address = contract_address
+        self.fee_payers = FEE_PAYERS if fee_payers is None else fee_payers
+        self.baker = baker
+        self.tmpdir = tempfile.mkdtemp(prefix='tezos-sapling.')
+        self._executor = futures.ThreadPoolExecutor(max_workers=num_shards)
+        self.shards = list(self._executor.map(lambda _: make_client(),
+                                              range(num_shards)))
+        self.addresses = list(self._executor.map(self._init_shard,
+                                                 range(num_shards)))
+        self._session = requests.Session()
+        self._url = f'{self.shards[0].endpoint}/chains/main/blocks'
+        if sapling_id is None:
+            storage = self._get(f'head/context/contracts/{contract_address}'
+                                '/storage')
+            sapling_id = int(storage['int'])
+        self.sapling_id = sapling_id
+        self._pool_size = 0
+        self._checked_level = self._get('head/header')['level']
+
+    def _get(self, path: str, params: Dict[str, Any] = None) -> Any:
+        res = self._session.get(f'{self._url}/{path}', params=params)
+        res.raise_for_status()
+        return res.json()
+
+    def _init_shard(self, index: int) -> str:
+        client = self.shards[index]
+        key = f'shard{index}'
+        client.remember_contract(self.contract_name, self.contract_address,
+                                 force=True)
+        client.sapling_gen_key(key)
+        client.sapling_use_key_for_contract(key, self.contract_name)
+        return client.sapling_gen_address(key).address
+
+    def pool_size(self) -> int:
+        """Number of commitments in the shielded pool"""
+        diff = self._get(f'head/context/sapling/{self.sapling_id}/get_diff',
+                         {'offset_commitment': self._pool_size})
+        self._pool_size += len(diff['commitments_and_ciphertexts'])
+        return self._pool_size
+
+    def _wait_included(self,
+                       injected: Dict[str, float],
+                       timeout: float) -> Dict[str, float]:
+        """Inclusion latency of operations `injected` at given times"""
+        if self.baker is not None:
+            self.shards[0].bake(self.baker, ['--minimal-timestamp'])
+        latencies = {}  # type: Dict[str, float]
+        deadline = time.time() + timeout
+        while len(latencies) < len(injected):
+            assert time.time() < deadline, 'operations not included'
+            level = self._get('head/header')['level']
+            for checked in range(self._checked_level + 1, level + 1):
+                now = time.time()
+                for ops in self._get(f'{checked}/operation_hashes'):
+                    for op_hash in ops:
+                        if op_hash in injected:
+                            latencies[op_hash] = now - injected[op_hash]
+            self._checked_level = level
+            time.sleep(0.1)
+        return latencies
+
+    def _submit_batches(self,
+                        submit: Callable[[str, Any], Any],
+                        items: List[Any],
+                        timeout: float) -> List[float]:
+        """Call `submit(fee_payer, item)` on all items, by batches of one
+        item per fee payer, and return inclusion latencies"""
+        latencies = []  # type: List[float]
+        batch_size = len(self.fee_payers)
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            injected = {}  # type: Dict[str, float]
+            for result, injection in self._executor.map(
+                    lambda payer, item: (submit(payer, item), time.time()),
+                    self.fee_payers, batch):
+                injected[result.operation_hash] = injection
+            latencies += self._wait_included(injected, timeout).values()
+        return latencies
+
+    def fund(self, amount: float, timeout: float = 60.) -> List[float]:
+        """Shield `amount` tez to each shard, return inclusion latencies"""
+        def shield(fee_payer: str, index: int) -> Any:
+            return self.shards[index].sapling_shield(
+                amount, fee_payer, self.addresses[index], self.contract_name,
+                BURN_CAP)
+        return self._submit_batches(shield, list(range(len(self.shards))),
+                                    timeout)
+
+    def _forge(self, index: int, amount: float) -> Tuple[str, float, int]:
+        dest = self.addresses[(index + 1) % len(self.shards)]
+        file = os.path.join(self.tmpdir, f'shard{index}.json')
+        start = time.time()
+        self.shards[index].sapling_forge_transaction(
+            amount, f'shard{index}', dest, self.contract_name, file,
+            ['--json'])
+        latency = time.time() - start
+        with open(file) as stream:
+            transaction = json.load(stream)
+        proofs = len(transaction['inputs']) + len(transaction['outputs'])
+        return file, latency, proofs
+
+    def run_round(self, amount: float, timeout: float = 60.) -> SaplingRound:
+        """Each shard sends `amount` tez to the next one.
+
+        All transactions are forged concurrently, then submitted by
+        batches."""
+        pool_size = self.pool_size()
+        start = time.time()
+        forged = list(self._executor.map(lambda i: self._forge(i, amount),
+                                         range(len(self.shards))))
+        forge_time = time.time() - start
+
+        def submit(fee_payer: str, file: str) -> Any:
+            return self.shards[0].sapling_submit(
+                file, fee_payer, self.contract_name, BURN_CAP + ['--json'])
+        latencies = self._submit_batches(submit,
+                                         [file for file, _, _ in forged],
+                                         timeout)
+        return SaplingRound(pool_size, len(forged),
+                            sum(proofs for _, _, proofs in forged),
+                            forge_time,
+                            [latency for _, latency, _ in forged],
+                            latencies)
+
+    def cleanup(self) -> None:
+        """Remove shards and forged transactions"""
+        self._executor.shutdown()
+        self._session.close()
+        for client in self.shards:
+            client.cleanup()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
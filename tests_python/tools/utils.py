@@ -7,8 +7,9 @@ import json
 import os
 import re
 import subprocess
+import threading
 import time
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 import base58check
 import ed25519
@@ -18,8 +19,14 @@ import requests
 from client.client import Client
 from client.client_output import (BakeForResult, RunScriptResult,
                                   InvalidClientOutput)
+from daemons.log_store import LogStore
 
 from . import constants
+from .log_scanner import LogScanner, Match
+
+
+# Set when a sandbox process died, retries then fail at once
+RETRIES_ABORTED = threading.Event()
 
 
 def retry(timeout: float, attempts: float):  # pylint: disable=unused-argument
@@ -39,6 +46,9 @@ def retry(timeout: float, attempts: float):  # pylint: disable=unused-argument
                 if attempts == 0:
                     print("*** Failed after too many retries")
                     return False
+                if RETRIES_ABORTED.is_set():
+                    print("*** Not retrying, a sandbox process died")
+                    return False
                 print(f'*** Will retry after {timeout} seconds...')
                 time.sleep(timeout)
                 attempts -= 1
@@ -170,27 +180,42 @@ def operations_hash_from_block(block):
     return res
 
 
-def check_logs(logs: List[str], pattern: str) -> bool:
-    for file in logs:
-        with open(file, "r") as stream:
-            for line in stream:
-                if re.search(pattern, line):
-                    print('#', stream.name)
-                    print(line)
-                    return False
-    return True
-
-
-def check_logs_counts(logs: List[str], pattern: str) -> int:
-    count = 0
-    for file in logs:
-        with open(file, "r") as stream:
-            for line in stream:
-                if re.search(pattern, line):
-                    print('#', stream.name)
-                    print(line)
-                    count += 1
-    return count
+# Scanners of `check_logs`, by pattern, which remember where they stopped.
+# Log files rewritten by another sandbox are scanned again, see `LogScanner`.
+_LOG_SCANNERS = {}  # type: Dict[str, LogScanner]
+
+
+def _scan_logs(logs: Union[List[str], LogStore],
+               pattern: str) -> List[Match]:
+    if isinstance(logs, LogStore):
+        return [Match(record.source, record.line)
+                for record in logs.query(pattern=pattern)]
+    scanner = _LOG_SCANNERS.get(pattern)
+    if scanner is None:
+        scanner = _LOG_SCANNERS[pattern] = LogScanner([pattern])
+    scanner.scan(logs)
+    return scanner.matches(logs, pattern)
+
+
+def check_logs(logs: Union[List[str], LogStore], pattern: str) -> bool:
+    """True iff no line of `logs` matches `pattern`. `logs` are log
+    files, of which only the lines appended since the previous check are
+    read, or a log store (e.g. `sandbox.log_store`)."""
+    matches = _scan_logs(logs, pattern)
+    if matches:
+        print('#', matches[0].log)
+        print(matches[0].line)
+    return not matches
+
+
+def check_logs_counts(logs: Union[List[str], LogStore],
+                      pattern: str) -> int:
+    """Number of lines of `logs` matching `pattern`, see `check_logs`"""
+    matches = _scan_logs(logs, pattern)
+    for match in matches:
+        print('#', match.log)
+        print(match.line)
+    return len(matches)
 
 
 def activate_alpha(client, parameters=None, timestamp=None,
@@ -0,0 +1,82 @@
+"""Distribution of test classes on `pytest-xdist` workers.
+
+All tests of a class run on the same worker: they share a class-scoped
+sandbox, and `incremental` classes rely on the order of their tests. As
+with `--dist loadscope`, workers are given whole classes (or modules, for
+tests outside classes) when they are idle. Additionally
+
+- classes are handed out by decreasing recorded duration (see
+  `tools.durations`), so that long classes don't start last,
+- a worker is given a new class only when the last test of its current
+  class remains (workers hold back their last test until they get more
+  work), so that a class isn't queued behind a long one.
+
+Classes without recorded duration are considered as long as the median of
+recorded ones.
+
+`CostScheduling` overrides private members of `LoadScopeScheduling`
+(those of pytest-xdist 1.34.0). `make_scheduler` checks that they exist,
+and falls back to the stock `--dist loadscope` scheduling otherwise.
+
+This module imports `xdist`, it is only imported by the
+`pytest_xdist_make_scheduler` hook.
+"""
+import statistics
+
+from xdist.scheduler import LoadScopeScheduling
+
+from . import durations
+
+# Private members of `LoadScopeScheduling` used by `CostScheduling`
+_METHODS = ('_reschedule', '_pending_of', '_split_scope')
+_ATTRIBUTES = ('workqueue', 'assigned_work', 'registered_collections')
+
+
+class CostScheduling(LoadScopeScheduling):
+    """Load scope scheduling, longest recorded scopes first."""
+
+    def __init__(self, config, log=None):
+        super().__init__(config, log)
+        # the cache is disabled by `-p no:cacheprovider`
+        cache = getattr(config, 'cache', None)
+        self.durations = {} if cache is None else durations.load(cache)
+
+    def _reschedule(self, node):
+        if (not node.shutting_down and self.workqueue and
+                self._pending_of(self.assigned_work[node]) > 1):
+            return
+        super()._reschedule(node)
+
+    def schedule(self):
+        if self.collection is None and self.collection_is_completed:
+            self._order_workqueue()
+        super().schedule()
+
+    def _order_workqueue(self):
+        """Build the work queue (done by `schedule` otherwise), longest
+        scopes first"""
+        # if collections differ, `schedule` reports it and aborts
+        collection = next(iter(self.registered_collections.values()))
+        for nodeid in collection:
+            work_unit = self.workqueue.setdefault(self._split_scope(nodeid),
+                                                  {})
+            work_unit[nodeid] = False
+        known = [self.durations[scope] for scope in self.workqueue
+                 if scope in self.durations]
+        default = statistics.median(known) if known else 0.
+        ordered = sorted(self.workqueue.items(),
+                         key=lambda unit: -self.durations.get(unit[0],
+                                                              default))
+        self.workqueue.clear()
+        self.workqueue.update(ordered)
+
+
+def make_scheduler(config, log):
+    """A `CostScheduling`, or None (i.e. stock `--dist loadscope`) if
+    `LoadScopeScheduling` lacks the private members it relies on"""
+    if not all(hasattr(LoadScopeScheduling, name) for name in _METHODS):
+        return None
+    scheduler = CostScheduling(config, log)
+    if not all(hasattr(scheduler, name) for name in _ATTRIBUTES):
+        return None
+    return scheduler